@@ -0,0 +1,100 @@
+"""
+Throughput of the VLM output parser and the streaming Parquet builder.
+
+Generates synthetic outputs from process_output_df.SAMPLE_OUTPUT (varied variables,
+keywords and palettes), writes them as an annotate_images-style JSONL journal, and
+reports records per second for in-process parsing, the in-memory DataFrame path and
+stream_outputs_to_parquet at each worker count.
+
+    python benchmarks/bench_parser.py --records 50000 --workers 0 2 4 --output bench_parser.json
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from process_image_output.process_output_df import (
+    SAMPLE_OUTPUT, parse_llm_visualization_output, build_dataframe_from_outputs, stream_outputs_to_parquet,
+    open_parsed_dataset
+)
+
+WORDS = [
+    "revenue", "population", "temperature", "rainfall", "income", "age", "region", "country", "species",
+    "votes", "emissions", "sales", "growth", "share", "price", "distance", "duration", "score", "rank",
+]
+
+
+def make_output(rng: random.Random) -> str:
+    variables = " * ".join(
+        f"Variable {i + 1}: {' '.join(rng.sample(WORDS, 2))} → {rng.choice(['Continuous', 'Categorical', 'Ordinal'])}"
+        for i in range(rng.randint(2, 6))
+    )
+    keywords = " * ".join(rng.sample(WORDS, rng.randint(5, 15)))
+    text = SAMPLE_OUTPUT.replace("Palette type: Sequential", f"Palette type: {rng.choice(['Sequential', 'Diverging', 'Qualitative'])}")
+    text = text.replace("Background type: light", f"Background type: {rng.choice(['light', 'dark'])}")
+    sections = text.split("%%% Section_")
+    for i, part in enumerate(sections):
+        if part.startswith("2_Data_and_Variable_Types"):
+            sections[i] = f"2_Data_and_Variable_Types %%%\n{variables}\n"
+        elif part.startswith("17_Searchable_Keywords"):
+            sections[i] = f"17_Searchable_Keywords %%%\n{keywords}\n"
+    return "%%% Section_".join(sections)
+
+
+def rate(count, elapsed):
+    return round(count / max(elapsed, 1e-9), 1)
+
+
+def main(args):
+    rng = random.Random(args.seed)
+    outputs = [make_output(rng) for _ in range(min(args.records, 2000))]
+    results = {"records": args.records}
+
+    started = time.perf_counter()
+    for i in range(args.records):
+        parse_llm_visualization_output(outputs[i % len(outputs)])
+    results["parse_records_per_s"] = rate(args.records, time.perf_counter() - started)
+
+    started = time.perf_counter()
+    build_dataframe_from_outputs([outputs[i % len(outputs)] for i in range(args.records)])
+    results["dataframe_records_per_s"] = rate(args.records, time.perf_counter() - started)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        journal = os.path.join(tmp, "annotations.jsonl")
+        with open(journal, "w", encoding="utf-8") as f:
+            for i in range(args.records):
+                entry = {"image_url": f"https://example.com/{i}.png", "status": "ok", "output": outputs[i % len(outputs)]}
+                f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        results["journal_mb"] = round(os.path.getsize(journal) / 1e6, 1)
+
+        results["stream"] = {}
+        for workers in args.workers:
+            out_dir = os.path.join(tmp, f"parsed-{workers}")
+            stats = stream_outputs_to_parquet(journal, out_dir, chunk_size=args.chunk_size, workers=workers)
+            assert open_parsed_dataset(out_dir).count_rows() == args.records
+            stats["parquet_mb"] = round(sum(
+                os.path.getsize(os.path.join(out_dir, name)) for name in os.listdir(out_dir)
+            ) / 1e6, 1)
+            results["stream"][str(workers)] = stats
+            print(f"workers={workers}: {stats['records_per_s']} records/s over {stats['parts']} parts")
+
+    report = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(report)
+    print(report)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--records", type=int, default=20000)
+    parser.add_argument("--chunk-size", type=int, default=2000)
+    parser.add_argument("--workers", type=int, nargs="+", default=[0, os.cpu_count()], help="0 parses in process")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="write JSON results here (default: stdout)")
+    main(parser.parse_args())
@@ -0,0 +1,249 @@
+"""
+Micro-benchmarks for each on_message path, run against in-process fakes.
+
+The paths mirror the branches of chainlit_app.on_message (plain text, hybrid_search,
+long_context_retrieval, deconstruct_elements_tool, image URL and image upload) and
+call the same pipeline functions; only the Chainlit message sends are left out.
+
+    python benchmarks/bench_pipeline.py --requests 200 --concurrency 20 --output bench.json
+    python benchmarks/bench_pipeline.py --baseline bench.json --max-regression 0.15
+"""
+import os
+import io
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+import logging
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+import httpx
+from PIL import Image, ImageDraw
+
+from fakes import FakeAsyncOpenAI, FakeAsyncWeaviateClient, Latency
+from llm_utils import query_rewrite, query_rewrite_cache, rerank_results
+from rag.retriever import AsyncRetriever
+from rag.hydration import CANDIDATE_PROPERTIES
+from modules.toolcalling import detect_tools_and_execute
+from modules.image_utils import prepare_image_async, image_bytes_to_base64
+from modules.image_cache import ImageDescriptionCache
+from modules.http_fetcher import ImageFetcher
+from modules.gallery import build_card
+from modules.speculation import speculative_retrieve
+from modules.local_reranker import KEYWORDS_PROPERTY
+from process_images import analyze_image_with_llm
+from app_config import GALLERY_PAGE_SIZE, TWO_PHASE_RETRIEVAL
+from modules import tracing
+
+PATHS = ["text", "hybrid_search", "long_context_retrieval", "deconstruct_elements_tool", "image_url", "image_upload"]
+
+
+def make_chart_png(rng: random.Random, size=(1200, 800)) -> bytes:
+    image = Image.new("RGB", size, "white")
+    draw = ImageDraw.Draw(image)
+    for _ in range(rng.randint(5, 25)):
+        x = rng.randint(0, size[0] - 60)
+        y = rng.randint(0, size[1] - 60)
+        color = tuple(rng.randint(0, 255) for _ in range(3))
+        draw.rectangle([x, y, x + rng.randint(10, 60), size[1]], fill=color)
+    buffer = io.BytesIO()
+    image.save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+class Pipeline:
+    def __init__(self, args):
+        self.rng = random.Random(args.seed)
+        self.warm = args.warm
+        self.llm = FakeAsyncOpenAI(
+            latency={
+                "qwen-plus": Latency(mean=args.llm_latency, jitter=args.llm_latency / 5),
+                "kimi-k2-0711-preview": Latency(mean=args.llm_latency, jitter=args.llm_latency / 5),
+                "qwen-vl-plus": Latency(mean=args.vlm_latency, jitter=args.vlm_latency / 5),
+            },
+            description_words=args.description_words,
+            seed=args.seed
+        )
+        self.weaviate = FakeAsyncWeaviateClient(
+            latency=Latency(mean=args.weaviate_latency, jitter=args.weaviate_latency / 4),
+            n_objects=args.objects,
+            text_words=args.text_words,
+            seed=args.seed
+        )
+        self.retriever = AsyncRetriever(
+            client=self.weaviate,
+            collection_name="dviz_c_structured_v3",
+            return_properties=["image_url", "section_11_description", "post_title", "post_url", "image_description", "external_link", KEYWORDS_PROPERTY],
+            target_vector="section_11_description_vector",
+            candidate_properties=CANDIDATE_PROPERTIES if TWO_PHASE_RETRIEVAL else None
+        )
+        self.images = [make_chart_png(self.rng) for _ in range(args.images)]
+        self.image_cache = ImageDescriptionCache(os.path.join(tempfile.mkdtemp(), "images.sqlite"))
+        self.fetcher = ImageFetcher(cache_dir=tempfile.mkdtemp(), max_bytes=args.max_image_bytes)
+        fetch_latency = Latency(mean=args.fetch_latency, jitter=args.fetch_latency / 4)
+
+        async def serve_image(request):
+            await asyncio.sleep(fetch_latency.sample(self.rng))
+            index = int(request.url.path.rsplit("/", 1)[-1].split(".")[0])
+            return httpx.Response(200, content=self.images[index % len(self.images)])
+
+        self.fetcher._client = httpx.AsyncClient(transport=httpx.MockTransport(serve_image))
+
+    def query(self, i):
+        words = ["scatter plot", "dark background", "faceted", "sequential palette", "map of europe", "trend lines"]
+        base = f"{self.rng.choice(words)} with {self.rng.choice(words)}"
+        return base if self.warm else f"{base} #{i}"
+
+    async def render(self, results):
+        # Hydration and serialization work of the first gallery page
+        page = await self.retriever.hydrate(results[:GALLERY_PAGE_SIZE])
+        return sum(len(build_card(i, doc)[0]) for i, doc in enumerate(page, 1))
+
+    async def describe(self, raw_bytes):
+        prepared = await prepare_image_async(raw_bytes)
+        if self.warm:
+            cached = self.image_cache.get(prepared.phash, "bench")
+            if cached is not None:
+                return cached
+        description = await analyze_image_with_llm(self.llm, image_bytes_to_base64(prepared.data), "bench")
+        self.image_cache.set(prepared.phash, "bench", description)
+        return description
+
+    async def image_search(self, description, command):
+        results = await self.retriever.retrieve(description, limit=100)
+        reranked = await rerank_results(self.llm, description, results.objects, command=command)
+        return await self.render(reranked[:20])
+
+    async def run(self, path, i):
+        if path == "image_url":
+            raw_bytes = await self.fetcher.fetch(f"https://example.org/upload/{i % len(self.images)}.png")
+            return await self.image_search(await self.describe(raw_bytes), "image_url")
+        if path == "image_upload":
+            raw_bytes = self.images[i % len(self.images)]
+            return await self.image_search(await self.describe(raw_bytes), "image_upload")
+
+        user_query = self.query(i)
+        if path == "text":
+            _, objects = await speculative_retrieve(self.retriever, user_query, query_rewrite(self.llm, user_query), limit=10)
+            return await self.render(objects)
+        rewritten = await query_rewrite(self.llm, user_query)
+        if path == "hybrid_search":
+            results = await self.retriever.hybrid_retrieve(user_query, limit=100, alpha=0.5)
+            reranked = await rerank_results(self.llm, user_query, results.objects, command="hybrid_search")
+            return await self.render(reranked[:20])
+        if path == "long_context_retrieval":
+            results = await self.retriever.retrieve(rewritten, limit=150)
+            reranked = await rerank_results(self.llm, user_query, results.objects, rewritten, command="long_context_retrieval")
+            return await self.render(reranked)
+        if path == "deconstruct_elements_tool":
+            _, results = await detect_tools_and_execute(self.llm, user_query, self.weaviate)
+            reranked = await rerank_results(self.llm, user_query, results, rewritten, command="deconstruct_elements_tool")
+            return await self.render(reranked[:20])
+        raise ValueError(f"Unknown path: {path}")
+
+
+def percentile(values, q):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))] if ordered else 0.0
+
+
+async def bench_path(pipeline, path, n_requests, concurrency):
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+    errors = 0
+
+    async def one(i):
+        nonlocal errors
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                await pipeline.run(path, i)
+            except Exception as e:
+                errors += 1
+                logging.warning(f"{path} request {i} failed: {e}")
+            latencies.append(time.perf_counter() - start)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(n_requests)))
+    elapsed = time.perf_counter() - started
+    return {
+        "requests": n_requests,
+        "concurrency": concurrency,
+        "errors": errors,
+        "throughput_rps": round(n_requests / elapsed, 3),
+        "mean_s": round(sum(latencies) / len(latencies), 6),
+        "p50_s": round(percentile(latencies, 0.5), 6),
+        "p95_s": round(percentile(latencies, 0.95), 6),
+        "p99_s": round(percentile(latencies, 0.99), 6),
+    }
+
+
+def compare(results, baseline, max_regression):
+    """Paths whose p95 grew by more than ``max_regression`` relative to the baseline."""
+    regressions = []
+    for path, stats in results["paths"].items():
+        before = baseline.get("paths", {}).get(path)
+        if not before or not before.get("p95_s"):
+            continue
+        change = stats["p95_s"] / before["p95_s"] - 1.0
+        if change > max_regression:
+            regressions.append({"path": path, "baseline_p95_s": before["p95_s"], "p95_s": stats["p95_s"], "change": round(change, 4)})
+    return regressions
+
+
+async def main(args):
+    pipeline = Pipeline(args)
+    paths = args.paths or PATHS
+    results = {"config": vars(args), "paths": {}}
+    for path in paths:
+        if not args.warm:
+            query_rewrite_cache.clear()
+        results["paths"][path] = await bench_path(pipeline, path, args.requests, args.concurrency)
+        print(f"{path:28s} {json.dumps(results['paths'][path])}", file=sys.stderr)
+    results["stages"] = tracing.snapshot()["stages"]
+    await pipeline.fetcher.aclose()
+    return results
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--paths", nargs="*", choices=PATHS)
+    parser.add_argument("--requests", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--warm", action="store_true", help="repeat queries and images so caches can hit")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--llm-latency", type=float, default=0.4)
+    parser.add_argument("--vlm-latency", type=float, default=1.5)
+    parser.add_argument("--weaviate-latency", type=float, default=0.08)
+    parser.add_argument("--fetch-latency", type=float, default=0.05)
+    parser.add_argument("--objects", type=int, default=2000)
+    parser.add_argument("--text-words", type=int, default=120)
+    parser.add_argument("--description-words", type=int, default=80)
+    parser.add_argument("--images", type=int, default=20)
+    parser.add_argument("--max-image-bytes", type=int, default=15 * 1024 * 1024)
+    parser.add_argument("--output", help="write JSON results here (default: stdout)")
+    parser.add_argument("--baseline", help="JSON results of a previous run to compare against")
+    parser.add_argument("--max-regression", type=float, default=0.2, help="allowed relative p95 growth per path")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    logging.basicConfig(level=logging.WARNING)
+    results = asyncio.run(main(args))
+    if args.baseline:
+        with open(args.baseline) as f:
+            results["regressions"] = compare(results, json.load(f), args.max_regression)
+    payload = json.dumps(results, indent=2, default=str)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(payload)
+    else:
+        print(payload)
+    if results.get("regressions"):
+        print(f"p95 regressions: {results['regressions']}", file=sys.stderr)
+        sys.exit(1)
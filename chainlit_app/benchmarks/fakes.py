@@ -0,0 +1,170 @@
+"""
+In-process stand-ins for Weaviate and the OpenAI-compatible providers.
+
+Each fake sleeps for a configurable latency and returns payloads shaped like the
+real clients' responses, so the pipeline code runs unchanged without credentials.
+"""
+import re
+import json
+import uuid
+import random
+import asyncio
+from dataclasses import dataclass
+from types import SimpleNamespace
+
+
+@dataclass
+class Latency:
+    """Latency in seconds: ``mean`` plus uniform jitter, with an occasional slow tail."""
+    mean: float = 0.05
+    jitter: float = 0.01
+    tail_probability: float = 0.01
+    tail_factor: float = 5.0
+
+    def sample(self, rng: random.Random) -> float:
+        value = max(0.0, self.mean + rng.uniform(-self.jitter, self.jitter))
+        if rng.random() < self.tail_probability:
+            value *= self.tail_factor
+        return value
+
+
+WORDS = (
+    "scatter plot bar chart line time series dark light background sequential diverging palette "
+    "faceted small multiples grid annotation legend axis log scale map geographic europe trend "
+    "regression distribution histogram ranking categorical continuous sans-serif title subtitle"
+).split()
+
+
+def _text(rng, n_words):
+    return " ".join(rng.choice(WORDS) for _ in range(n_words))
+
+
+def _usage(prompt_chars, completion_chars):
+    prompt_tokens = prompt_chars // 4
+    completion_tokens = max(1, completion_chars // 4)
+    return SimpleNamespace(
+        prompt_tokens=prompt_tokens,
+        completion_tokens=completion_tokens,
+        total_tokens=prompt_tokens + completion_tokens
+    )
+
+
+def _completion(content=None, tool_calls=None, prompt_chars=0):
+    message = SimpleNamespace(content=content, tool_calls=tool_calls)
+    return SimpleNamespace(
+        choices=[SimpleNamespace(message=message)],
+        usage=_usage(prompt_chars, len(content or "") + len(json.dumps([t.function.arguments for t in tool_calls or []])))
+    )
+
+
+class _FakeCompletions:
+    def __init__(self, owner):
+        self.owner = owner
+
+    async def create(self, model=None, messages=None, tools=None, **kwargs):
+        owner = self.owner
+        owner.calls += 1
+        last = messages[-1]["content"]
+        prompt_chars = len(json.dumps(messages))
+        await asyncio.sleep(owner.latency_for(model).sample(owner.rng))
+
+        if tools:
+            field = owner.rng.choice(["plot_type", "layout", "background_type", "palette_type"])
+            tool_call = SimpleNamespace(function=SimpleNamespace(
+                name=f"search_{field}", arguments=json.dumps({"query": _text(owner.rng, 3)})
+            ))
+            return _completion(tool_calls=[tool_call], prompt_chars=prompt_chars)
+        if isinstance(last, list):  # image + text: VLM description
+            return _completion(_text(owner.rng, owner.description_words), prompt_chars=prompt_chars)
+        match = re.search(r"SEARCH RESULTS:\s*(\[.*?\])\s*INSTRUCTIONS", last, re.S)
+        if match:  # listwise rerank: keep a random relevant subset in random order
+            ids = [item["id"] for item in json.loads(match.group(1))]
+            owner.rng.shuffle(ids)
+            return _completion(json.dumps(ids[: max(1, len(ids) // 2)]), prompt_chars=prompt_chars)
+        return _completion(", ".join(owner.rng.sample(WORDS, 4)), prompt_chars=prompt_chars)
+
+
+class FakeAsyncOpenAI:
+    """Stands in for openai.AsyncOpenAI; ``latency`` may map model name -> Latency."""
+
+    def __init__(self, latency=None, description_words=80, seed=0):
+        self.latency = latency or Latency()
+        self.description_words = description_words
+        self.rng = random.Random(seed)
+        self.calls = 0
+        self.chat = SimpleNamespace(completions=_FakeCompletions(self))
+
+    def latency_for(self, model):
+        if isinstance(self.latency, dict):
+            return self.latency.get(model) or self.latency.get("default") or Latency()
+        return self.latency
+
+
+class FakeAsyncWeaviateClient:
+    """Stands in for rag.weaviate_client.AsyncWeaviateClient with synthetic result objects."""
+
+    def __init__(self, latency=None, n_objects=2000, text_words=120, seed=0):
+        self.latency = latency or Latency(mean=0.08, jitter=0.02)
+        self.rng = random.Random(seed)
+        self.calls = 0
+        self._objects = [
+            {
+                "uuid": uuid.UUID(int=self.rng.getrandbits(128)),
+                "properties": {
+                    "image_url": f"https://example.org/charts/{i}.png",
+                    "post_title": f"Chart {i}",
+                    "post_url": f"https://example.org/posts/{i}",
+                    "external_link": None,
+                    "section_11_description": _text(self.rng, text_words),
+                    "image_description": _text(self.rng, text_words // 2),
+                    "section_9_searchable_keywords": _text(self.rng, 15),
+                    "background_type": self.rng.choice(["dark", "light"]),
+                },
+            }
+            for i in range(n_objects)
+        ]
+        self._by_id = {str(obj["uuid"]): obj for obj in self._objects}
+
+    async def connect(self):
+        return self
+
+    async def close(self):
+        pass
+
+    @staticmethod
+    def _properties(obj, return_properties):
+        if return_properties is None:
+            return dict(obj["properties"])
+        return {name: obj["properties"].get(name) for name in return_properties}
+
+    async def _query(self, limit, score_field, return_properties=None):
+        self.calls += 1
+        await asyncio.sleep(self.latency.sample(self.rng))
+        picked = self.rng.sample(self._objects, min(limit, len(self._objects)))
+        objects = []
+        for rank, obj in enumerate(picked):
+            value = 0.2 + 0.6 * rank / max(1, len(picked))
+            metadata = SimpleNamespace(
+                distance=value if score_field == "distance" else None,
+                score=(1.0 - value) if score_field == "score" else None
+            )
+            objects.append(SimpleNamespace(uuid=obj["uuid"], properties=self._properties(obj, return_properties), metadata=metadata))
+        return SimpleNamespace(objects=objects)
+
+    async def query_near_text(self, query_text, limit=15, return_properties=None, **kwargs):
+        return await self._query(limit, "distance", return_properties)
+
+    async def query_near_vector(self, near_vector, limit=15, return_properties=None, **kwargs):
+        return await self._query(limit, "distance", return_properties)
+
+    async def query_hybrid(self, query_text, limit=15, return_properties=None, **kwargs):
+        return await self._query(limit, "score", return_properties)
+
+    async def fetch_objects_by_ids(self, uuids, collection_name=None, return_properties=None):
+        self.calls += 1
+        await asyncio.sleep(self.latency.sample(self.rng))
+        found = [self._by_id[str(u)] for u in uuids if str(u) in self._by_id]
+        return SimpleNamespace(objects=[
+            SimpleNamespace(uuid=obj["uuid"], properties=self._properties(obj, return_properties), metadata=None)
+            for obj in found
+        ])
@@ -1,4 +1,5 @@
 import os
+import json
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -14,6 +15,96 @@ WEAVIATE_CLOUD_URL = os.getenv("WEAVIATE_CLOUD_URL")
 WEAVIATE_CLUSTER_API_KEY = os.getenv("WEAVIATE_CLUSTER_API_KEY") 
 WEAVIATE_COLLECTION_NAME = "dviz_c_structured_v3"
 
+# Vector search backend: "weaviate" (Weaviate Cloud) or "local" (embedded index over a snapshot)
+VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "weaviate")
+LOCAL_INDEX_DIR = os.getenv("LOCAL_INDEX_DIR", os.path.join("data", "index", WEAVIATE_COLLECTION_NAME))
+LOCAL_INDEX_NPROBE = int(os.getenv("LOCAL_INDEX_NPROBE", "8"))
+FEATURE_STORE_PATH = os.getenv(
+    "FEATURE_STORE_PATH", os.path.join("data", "index", f"{WEAVIATE_COLLECTION_NAME}.features.duckdb")
+)
+FEATURE_STORE_CACHE_SIZE = int(os.getenv("FEATURE_STORE_CACHE_SIZE", "256"))
+MISTRAL_BASE_URL = os.getenv("MISTRAL_BASE_URL", "https://api.mistral.ai/v1")
+MISTRAL_EMBED_MODEL = os.getenv("MISTRAL_EMBED_MODEL", "mistral-embed")
+
+# Local caches
+CACHE_DIR = os.getenv("CACHE_DIR", ".cache")
+QUERY_REWRITE_CACHE_BACKEND = os.getenv("QUERY_REWRITE_CACHE_BACKEND", "memory")  # "memory" or "disk"
+QUERY_REWRITE_CACHE_SIZE = int(os.getenv("QUERY_REWRITE_CACHE_SIZE", "2048"))
+QUERY_REWRITE_CACHE_TTL = int(os.getenv("QUERY_REWRITE_CACHE_TTL", str(24 * 3600)))
+
+# Image preprocessing before VLM analysis
+IMAGE_MAX_EDGE = int(os.getenv("IMAGE_MAX_EDGE", "1568"))
+IMAGE_TARGET_BYTES = int(os.getenv("IMAGE_TARGET_BYTES", str(400 * 1024)))
+IMAGE_MIN_QUALITY = int(os.getenv("IMAGE_MIN_QUALITY", "60"))
+IMAGE_PROCESS_WORKERS = int(os.getenv("IMAGE_PROCESS_WORKERS", "2"))
+
+# Shared image fetcher
+IMAGE_FETCH_MAX_BYTES = int(os.getenv("IMAGE_FETCH_MAX_BYTES", str(15 * 1024 * 1024)))
+IMAGE_FETCH_TIMEOUT = float(os.getenv("IMAGE_FETCH_TIMEOUT", "10"))
+IMAGE_FETCH_MAX_CONNECTIONS = int(os.getenv("IMAGE_FETCH_MAX_CONNECTIONS", "20"))
+IMAGE_FETCH_CACHE_ENTRIES = int(os.getenv("IMAGE_FETCH_CACHE_ENTRIES", "500"))
+
+# Perceptual-hash cache of VLM image descriptions
+IMAGE_CACHE_MAX_ENTRIES = int(os.getenv("IMAGE_CACHE_MAX_ENTRIES", "5000"))
+IMAGE_CACHE_MAX_DISTANCE = int(os.getenv("IMAGE_CACHE_MAX_DISTANCE", "4"))  # Hamming bits out of 64
+
+# Windowed LLM reranking
+RERANK_WINDOW_SIZE = int(os.getenv("RERANK_WINDOW_SIZE", "25"))
+RERANK_WINDOW_OVERLAP = int(os.getenv("RERANK_WINDOW_OVERLAP", "5"))
+RERANK_MAX_CONCURRENCY = int(os.getenv("RERANK_MAX_CONCURRENCY", "4"))
+RERANK_RRF_K = int(os.getenv("RERANK_RRF_K", "60"))
+
+# Result gallery
+GALLERY_PAGE_SIZE = int(os.getenv("GALLERY_PAGE_SIZE", "10"))
+GALLERY_CARDS_PER_MESSAGE = int(os.getenv("GALLERY_CARDS_PER_MESSAGE", "5"))
+
+# Two-phase retrieval: queries return only what the rerankers read, display properties
+# are fetched by UUID for the results actually shown (see rag.hydration)
+TWO_PHASE_RETRIEVAL = os.getenv("TWO_PHASE_RETRIEVAL", "1") == "1"
+HYDRATION_BATCH_SIZE = int(os.getenv("HYDRATION_BATCH_SIZE", "100"))
+HYDRATION_CACHE_SIZE = int(os.getenv("HYDRATION_CACHE_SIZE", "4096"))
+HYDRATION_CACHE_TTL = float(os.getenv("HYDRATION_CACHE_TTL", "3600"))
+
+# Search results memoized per (query, target vector, filters, limit, ...) in the Weaviate clients;
+# every write to a collection bumps its version token and drops them (see rag.result_cache)
+RESULT_CACHE_ENABLED = os.getenv("RESULT_CACHE_ENABLED", "1") == "1"
+RESULT_CACHE_SIZE = int(os.getenv("RESULT_CACHE_SIZE", "512"))
+RESULT_CACHE_TTL = float(os.getenv("RESULT_CACHE_TTL", "900"))
+COLLECTION_VERSION_DIR = os.getenv("COLLECTION_VERSION_DIR", os.path.join(CACHE_DIR, "collection_versions"))
+
+# Reranker backend per command: "llm" (qwen-plus) or "local" (in-process BM25 + vector fusion).
+# Keys are command ids plus "image_url" and "image_upload"; anything missing uses RERANK_BACKEND.
+RERANK_BACKEND = os.getenv("RERANK_BACKEND", "llm")
+RERANK_BACKENDS = json.loads(os.getenv("RERANK_BACKENDS", "{}"))
+
+# Local keyword router for tool search; below this confidence the LLM picks the tools (set above 1 to always use the LLM)
+TOOL_ROUTER_MIN_CONFIDENCE = float(os.getenv("TOOL_ROUTER_MIN_CONFIDENCE", "0.6"))
+
+# Cache of LLM tool-call decisions, keyed by normalized query and tool schema
+TOOL_CALL_CACHE_BACKEND = os.getenv("TOOL_CALL_CACHE_BACKEND", "disk")  # "memory" or "disk"
+TOOL_CALL_CACHE_SIZE = int(os.getenv("TOOL_CALL_CACHE_SIZE", "4096"))
+TOOL_CALL_CACHE_TTL = int(os.getenv("TOOL_CALL_CACHE_TTL", str(7 * 24 * 3600)))
+
+# Speculative retrieval on the raw query while the rewrite runs; reuse it when the rewrite is this similar (token Jaccard)
+SPECULATION_SIMILARITY = float(os.getenv("SPECULATION_SIMILARITY", "0.8"))
+
+# Ingestion of chart records (JSONL, CSV or Parquet) into the collection
+DOCUMENTS_DIR = os.getenv("DOCUMENTS_DIR", os.path.join("data", "documents"))
+INGEST_CHECKPOINT = os.getenv("INGEST_CHECKPOINT", os.path.join(CACHE_DIR, "ingest_checkpoint.json"))
+INGEST_SEGMENT_SIZE = int(os.getenv("INGEST_SEGMENT_SIZE", "2000"))  # records per checkpoint
+INGEST_BATCH_SIZE = int(os.getenv("INGEST_BATCH_SIZE", "0"))  # 0 = Weaviate dynamic batching
+INGEST_CONCURRENCY = int(os.getenv("INGEST_CONCURRENCY", "4"))  # concurrent requests for fixed-size batches
+INGEST_RETRIES = int(os.getenv("INGEST_RETRIES", "3"))
+
+# Bulk VLM annotation with IMAGE_PROMPT (process_image_output.annotate_images)
+ANNOTATE_MODEL = os.getenv("ANNOTATE_MODEL", "qwen-vl-plus")
+ANNOTATE_CONCURRENCY = int(os.getenv("ANNOTATE_CONCURRENCY", "8"))
+ANNOTATE_REQUESTS_PER_MINUTE = float(os.getenv("ANNOTATE_REQUESTS_PER_MINUTE", "60"))
+ANNOTATE_TOKENS_PER_MINUTE = float(os.getenv("ANNOTATE_TOKENS_PER_MINUTE", "0"))  # 0 = no token limit
+ANNOTATE_MAX_RETRIES = int(os.getenv("ANNOTATE_MAX_RETRIES", "5"))
+VLM_PRICE_INPUT_PER_M = float(os.getenv("VLM_PRICE_INPUT_PER_M", "0.21"))  # USD per 1M prompt tokens
+VLM_PRICE_OUTPUT_PER_M = float(os.getenv("VLM_PRICE_OUTPUT_PER_M", "0.63"))  # USD per 1M completion tokens
+
 COMMANDS = [
     {"id": "upload_image", "icon": "upload", "description": "Upload an image for analysis", "button": True, "persistent": False},
     {"id": "analyze_url", "icon": "link", "description": "Analyze image from URL", "button": True, "persistent": False},
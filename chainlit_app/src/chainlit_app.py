@@ -1,26 +1,46 @@
 # filepath: src/chainlit_app.py
+import os
+import asyncio
 import chainlit as cl
-import requests
-from app_config import MOONSHOT_API_KEY, MOONSHOT_BASE_URL, COMMANDS,QWEN_VL_API_KEY, QWEB_VL_BASE_URL,WEAVIATE_CLOUD_URL,WEAVIATE_CLUSTER_API_KEY,Mistral_API_KEY, WEAVIATE_COLLECTION_NAME
-from services import get_openai_client, get_weaviate_client, get_retriever
-from llm_utils import llm_rerank_results, query_rewrite
-from rag.retriever import Retriever
+import httpx
+from app_config import MOONSHOT_API_KEY, MOONSHOT_BASE_URL, COMMANDS,QWEN_VL_API_KEY, QWEB_VL_BASE_URL,WEAVIATE_CLOUD_URL,WEAVIATE_CLUSTER_API_KEY,Mistral_API_KEY, WEAVIATE_COLLECTION_NAME, CACHE_DIR, IMAGE_CACHE_MAX_ENTRIES, IMAGE_CACHE_MAX_DISTANCE, TWO_PHASE_RETRIEVAL
+from services import get_async_openai_client, get_async_weaviate_client, get_async_retriever
+from llm_utils import rerank_results, query_rewrite
+from rag.hydration import CANDIDATE_PROPERTIES
 # In your main app
 from modules.toolcalling import detect_tools_and_execute
-from process_images import analyze_image_with_llm, image_bytes_to_base64, process_image_bytes
+from process_images import analyze_image_with_llm
+from modules.image_utils import image_bytes_to_base64, prepare_image_async
+from modules.http_fetcher import fetch_image_bytes
+from modules.local_reranker import KEYWORDS_PROPERTY
+from modules.image_cache import ImageDescriptionCache
+from modules.gallery import LOAD_MORE_ACTION, send_gallery, send_page
+from modules.tracing import span, start_trace, increment, register_cache, install_metrics_endpoint
+from modules.speculation import speculative_retrieve
+from db import DBClient
+from chainlit.server import app as chainlit_server_app
 import logging
 from weaviate.classes.query import Filter
-client = get_openai_client(MOONSHOT_API_KEY, MOONSHOT_BASE_URL)
-qwen_client = get_openai_client( QWEN_VL_API_KEY, QWEB_VL_BASE_URL) 
-weaviate_client = get_weaviate_client()
+client = get_async_openai_client(MOONSHOT_API_KEY, MOONSHOT_BASE_URL)
+qwen_client = get_async_openai_client(QWEN_VL_API_KEY, QWEB_VL_BASE_URL)
+weaviate_client = get_async_weaviate_client()
+image_description_cache = ImageDescriptionCache(
+    os.path.join(CACHE_DIR, "image_descriptions.sqlite"),
+    max_entries=IMAGE_CACHE_MAX_ENTRIES,
+    max_distance=IMAGE_CACHE_MAX_DISTANCE
+)
+register_cache("image_description", image_description_cache)
+install_metrics_endpoint(chainlit_server_app)
 
 # Pass the actual weaviate client, not the wrapper
-retriever = Retriever(
-    client=weaviate_client,  # Use the actual weaviate client
-    collection_name="dviz_c_structured_v3",
-    return_properties=["image_url", "section_11_description", "post_title", "post_url", "image_description","external_link"],
-    target_vector="section_11_description_vector"
+retriever = get_async_retriever(
+    weaviate_client,  # Use the actual weaviate client
+    "dviz_c_structured_v3",
+    ["image_url", "section_11_description", "post_title", "post_url", "image_description","external_link", KEYWORDS_PROPERTY],
+    "section_11_description_vector",
+    candidate_properties=CANDIDATE_PROPERTIES if TWO_PHASE_RETRIEVAL else None
 )
+register_cache("hydration", retriever.hydrator.cache)
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -43,72 +63,46 @@ def detect_source_website(query: str):
     return None
 
 
-# Update the format_results_for_display function
 async def format_results_for_display(results: list, title: str):
     """
-    Sends each result as a separate message with description and image.
+    Shows results as a paged gallery, several cards per message.
     """
-    if not results:
-        await cl.Message(content="No matching visualizations found.").send()
-        return
+    with span("format_results_for_display", results=len(results or [])):
+        await send_gallery(results, title, hydrate=retriever.hydrate)
+
+
+@cl.action_callback(LOAD_MORE_ACTION)
+async def on_load_more(action: cl.Action):
+    await action.remove()
+    await send_page(action.payload["gallery_id"])
 
-    # Send title message first
-    await cl.Message(content=f"**{title}**").send()
-
-    # Send each result as a separate message
-    for i, doc in enumerate(results, 1):
-        props = getattr(doc, "properties", {}) or {}
-        #desc = props.get("section_11_description") or "No description available."
-        #desc_trunc = (desc[:200] + "...") if len(desc) > 200 else desc
-        image_url = props.get("image_url")
-        post_title = props.get("post_title") or "No title"
-        post_url = props.get("post_url")
-        external_link = props.get("external_link")
-        if external_link:
-            post_url = external_link
-        image_description = props.get("image_description") or "No image description available."
-
-        # Build the result content with all the information
-        #result_content = f"**{i}. {post_title}**\n\n"
-        #result_content += f"**Description:** {desc_trunc}\n\n"
-        result_content = f"**Image Description:** {image_description}\n\n"
-        
-        # Add links
-        if image_url:
-            result_content += f"🖼️ [View Visualization]({image_url})\n"
-        if post_url:
-            result_content += f"📄 [View Original Post]({post_url})"
-        if external_link:
-            result_content += f"\n🔗 [External Link]({external_link})"
-        
-        if image_url:
-            try:
-                # Send message with both text and image
-                await cl.Message(
-                    content=result_content,
-                    elements=[cl.Image(name=f"viz_{i}", display="inline", url=image_url, size="medium")]
-                ).send()
-            except Exception as e:
-                print(f"Error creating image element for {image_url}: {e}")
-                await cl.Message(content=result_content).send()
-        else:
-            await cl.Message(content=result_content).send()
+
+async def describe_image_bytes(raw_bytes: bytes, client):
+    """VLM description of an image, served from the perceptual-hash cache when the chart was seen before."""
+    prepared = await prepare_image_async(raw_bytes)
+    cached = image_description_cache.get(prepared.phash, prompt_img)
+    increment("image_description_cache_hit" if cached is not None else "image_description_cache_miss")
+    if cached is not None:
+        logger.info(f"Image description cache hit ({image_description_cache.stats.hit_rate:.1%} hit rate)")
+        return cached
+
+    img_base = image_bytes_to_base64(prepared.data)
+    logger.info("Image content processed, analyzing with LLM...")
+    description = await analyze_image_with_llm(client, img_base, prompt_img)
+    if description:
+        image_description_cache.set(prepared.phash, prompt_img, description)
+    return description
 
 async def process_image_from_url(image_url: str, client):
     try:
         logger.info(f"Fetching image from URL: {image_url}")
-        response = requests.get(image_url, timeout=10)
-        response.raise_for_status()
+        raw_bytes = await fetch_image_bytes(image_url)
         logger.info("Image fetched successfully, processing content...")
         
-        image_content = process_image_bytes(response.content)
-        img_base = image_bytes_to_base64(image_content)
-        logger.info("Image content processed, analyzing with LLM...")
-        
-        description = analyze_image_with_llm(client, img_base, prompt_img)
+        description = await describe_image_bytes(raw_bytes, client)
         logger.info("Image analysis completed.")
         return description
-    except requests.exceptions.RequestException as req_err:
+    except httpx.HTTPError as req_err:
         logger.error(f"Request error while fetching image: {req_err}")
         return None
     except Exception as e:
@@ -117,9 +111,7 @@ async def process_image_from_url(image_url: str, client):
 
 async def process_uploaded_image(image_file, client):
     try:
-        image_content = process_image_bytes(image_file.content)
-        img_base = image_bytes_to_base64(image_content)
-        description = analyze_image_with_llm(client, img_base, prompt_img)
+        description = await describe_image_bytes(image_file.content, client)
         return description
     except Exception as e:
         print(f"Error processing image with OpenAI: {e}")
@@ -152,6 +144,7 @@ it should be max 3-4 sentences, concise and to the point."""
 
 @cl.on_chat_start
 async def on_chat_start():
+    await weaviate_client.connect()
     cl.user_session.set("retriever", retriever)
     cl.user_session.set("history", [])  # Initialize chat history
     await cl.Message(
@@ -169,9 +162,14 @@ async def on_chat_start():
     ).send()
     await cl.context.emitter.set_commands(COMMANDS)
 
+@cl.on_app_shutdown
+async def on_app_shutdown():
+    # Write queued chat messages through the batched writer; db's atexit drain is only a last resort
+    await DBClient.close()
+
 @cl.on_message
 async def on_message(message: cl.Message):
-    
+    start_trace()
     user_query = message.content.strip()
     source_website = detect_source_website(user_query)
     filter_message = f" (filtered by {source_website})" if source_website else ""
@@ -196,9 +194,9 @@ async def on_message(message: cl.Message):
                 ).send()
                 
                 # Search for similar results
-                results = retriever.retrieve(description, filters = filter_condition,limit=100)
+                results = await retriever.retrieve(description, filters = filter_condition,limit=100)
                 if results and getattr(results, "objects", None):
-                    reranked_objects = await llm_rerank_results(qwen_client, description, results.objects)
+                    reranked_objects = await rerank_results(qwen_client, description, results.objects, command="image_url")
                     top_k_results = reranked_objects[:20]
                     await format_results_for_display(top_k_results, f"Top {len(top_k_results)} Similar Visualizations Found")
             else:
@@ -230,9 +228,9 @@ async def on_message(message: cl.Message):
                         ).send()
 
                         # Search for similar results
-                        results = retriever.retrieve(description,filters = filter_condition, limit=100)
+                        results = await retriever.retrieve(description,filters = filter_condition, limit=100)
                         if results and getattr(results, "objects", None):
-                            reranked_objects = await llm_rerank_results(qwen_client, description, results.objects)
+                            reranked_objects = await rerank_results(qwen_client, description, results.objects, command="image_upload")
                             top_k_results = reranked_objects[:20]
                             await format_results_for_display(top_k_results, f"Top {len(top_k_results)} Similar Visualizations Found")
                     else:
@@ -244,11 +242,27 @@ async def on_message(message: cl.Message):
                 return
 
     # --- Regular Text Query Logic ---
-    rewritten_user_query = await query_rewrite(qwen_client, user_query)
-    await cl.Message(content=f"🔄 **Rewritten Query:** {rewritten_user_query}").send()
-    
     retr = cl.user_session.get("retriever")
 
+    async def show_rewrite(rewritten):
+        await cl.Message(content=f"🔄 **Rewritten Query:** {rewritten}").send()
+
+    # Plain searches retrieve on the raw query while the rewrite is still running
+    if not message.command and not cl.user_session.get("waiting_for_url"):
+        rewritten_user_query, objects = await speculative_retrieve(
+            retr, user_query, query_rewrite(qwen_client, user_query),
+            limit=10, filters=filter_condition, on_rewrite=show_rewrite
+        )
+        if objects:
+            title = f"Top {len(objects)} Results for: '{user_query}'"
+            await format_results_for_display(objects, title)
+        else:
+            await cl.Message(content=f"No visualizations found for: {user_query}").send()
+        return
+
+    rewritten_user_query = await query_rewrite(qwen_client, user_query)
+    await show_rewrite(rewritten_user_query)
+
     if message.command:
         if message.command == "upload_image":
             await cl.Message(content="📤 Please upload an image to analyze...").send()
@@ -292,7 +306,7 @@ async def on_message(message: cl.Message):
             if results:
                 try:
                     await thinking_msg.remove()
-                    reranked_results = await llm_rerank_results(qwen_client, user_query, results, rewritten_user_query)
+                    reranked_results = await rerank_results(qwen_client, user_query, results, rewritten_user_query, command="deconstruct_elements_tool")
                     top_k_results = reranked_results[:20]
                     title = f"Top {len(top_k_results)} Results (Tool-Based Search)"
                     await format_results_for_display(top_k_results, title)
@@ -308,12 +322,12 @@ async def on_message(message: cl.Message):
         if message.command == "hybrid_search":
             thinking_msg = cl.Message(content="🔍 Running hybrid (keyword + vector) search...")
             await thinking_msg.send()
-            results = retr.hybrid_retrieve(user_query, filters = filter_condition, limit=100, alpha=0.5)
+            results = await retr.hybrid_retrieve(user_query, filters = filter_condition, limit=100, alpha=0.5)
 
             if results and getattr(results, "objects", None):
                 try:
                     await thinking_msg.remove()
-                    reranked_results = await llm_rerank_results(qwen_client, user_query, results.objects)
+                    reranked_results = await rerank_results(qwen_client, user_query, results.objects, command="hybrid_search")
                     top_k_results = reranked_results[:20]
                     title = f"Top {len(top_k_results)} Hybrid Search Results (Reranked)"
                     await format_results_for_display(top_k_results, title)
@@ -330,7 +344,7 @@ async def on_message(message: cl.Message):
         if message.command == "long_context_retrieval":
             thinking_msg = cl.Message(content="🧠 Gathering extended context (top 150 results)...")
             await thinking_msg.send()
-            raw_results = retr.retrieve(rewritten_user_query,filters = filter_condition, limit=150)
+            raw_results = await retr.retrieve(rewritten_user_query,filters = filter_condition, limit=150)
 
             if not raw_results or not getattr(raw_results, "objects", None):
                 thinking_msg.content = "No results found for extended context."
@@ -341,7 +355,7 @@ async def on_message(message: cl.Message):
             try:
                 if len(objs) > 1:
                     await thinking_msg.remove()
-                    reranked = await llm_rerank_results(qwen_client, user_query, objs, rewritten_user_query)
+                    reranked = await rerank_results(qwen_client, user_query, objs, rewritten_user_query, command="long_context_retrieval")
                     objs = reranked
             except Exception as e:
                 print(f"Rerank error: {e}")
@@ -351,10 +365,9 @@ async def on_message(message: cl.Message):
             await format_results_for_display(top_k, title)
             return
 
-    # Regular search handling
-    if not cl.user_session.get("waiting_for_url") and not user_query.startswith(('http://', 'https://')):
-        results = retr.retrieve(rewritten_user_query, filters = filter_condition,limit=10)
-        
+        # Unknown command: plain search on what the user typed
+        logger.warning(f"Unknown command {message.command!r}, running a plain search")
+        results = await retr.retrieve(user_query, filters = filter_condition, limit=10)
         if results and getattr(results, "objects", None):
             title = f"Top {len(results.objects)} Results for: '{user_query}'"
             await format_results_for_display(results.objects, title)
@@ -363,7 +376,7 @@ async def on_message(message: cl.Message):
 
 async def analyze_user_query_with_tools(user_query: str):
     try:
-        hits, results = detect_tools_and_execute(client, user_query, weaviate_client)
+        hits, results = await detect_tools_and_execute(client, user_query, weaviate_client)
         return {
             "hits": hits,  # Return the actual ToolHit objects, not dict conversion
             "results": results,
@@ -1,11 +1,16 @@
 import os
+import time
 import uuid
 import asyncio
 import json
+import atexit
+import threading
 import psycopg2
 import psycopg2.extras
+import psycopg2.pool
 from datetime import datetime
 from dotenv import load_dotenv
+from modules.tracing import register_gauge, increment
 
 # Load environment variables
 load_dotenv()
@@ -17,100 +22,347 @@ POSTGRES_DB = os.getenv("POSTGRES_DB", "chainlit")
 POSTGRES_USER = os.getenv("POSTGRES_USER", "postgres")
 POSTGRES_PASSWORD = os.getenv("POSTGRES_PASSWORD", "postgres")
 
-# Rest of your code remains the same
+# Connection pool
+POSTGRES_POOL_MIN = int(os.getenv("POSTGRES_POOL_MIN", "1"))
+POSTGRES_POOL_MAX = int(os.getenv("POSTGRES_POOL_MAX", "10"))
+POSTGRES_CONNECT_TIMEOUT = int(os.getenv("POSTGRES_CONNECT_TIMEOUT", "5"))
+POSTGRES_RETRIES = int(os.getenv("POSTGRES_RETRIES", "2"))
+POSTGRES_HEALTHCHECK_INTERVAL = float(os.getenv("POSTGRES_HEALTHCHECK_INTERVAL", "30"))  # seconds idle before SELECT 1
+
+# Write-behind chat logging
+CHAT_LOG_BATCH_SIZE = int(os.getenv("CHAT_LOG_BATCH_SIZE", "100"))
+CHAT_LOG_FLUSH_INTERVAL = float(os.getenv("CHAT_LOG_FLUSH_INTERVAL", "2.0"))  # seconds
+CHAT_LOG_QUEUE_SIZE = int(os.getenv("CHAT_LOG_QUEUE_SIZE", "10000"))
+CHAT_LOG_BACKPRESSURE = os.getenv("CHAT_LOG_BACKPRESSURE", "drop_oldest")  # "block", "drop_oldest" or "drop_new"
+
+
+def _write_messages(conn, batch):
+    """Insert a batch of messages and bump each session's updated_at once, in one transaction."""
+    latest = {}
+    for message in batch:
+        latest[message[1]] = max(latest.get(message[1], message[5]), message[5])
+    conn.autocommit = False
+    try:
+        with conn.cursor() as cursor:
+            psycopg2.extras.execute_values(
+                cursor,
+                'INSERT INTO chat_messages (id, session_id, user_message, ai_response, metadata, created_at) VALUES %s '
+                'ON CONFLICT (id) DO NOTHING',  # a retried batch may already be partly written
+                batch,
+                page_size=len(batch)
+            )
+            psycopg2.extras.execute_values(
+                cursor,
+                'UPDATE chat_sessions AS s SET updated_at = GREATEST(s.updated_at, v.updated_at) '
+                'FROM (VALUES %s) AS v(id, updated_at) WHERE s.id = v.id',
+                list(latest.items()),
+                template="(%s, %s::timestamp)",
+                page_size=len(latest)
+            )
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.autocommit = True
+
+
+class ChatLogBuffer:
+    """
+    Write-behind queue for chat messages.
+
+    ``put`` returns as soon as the message is queued; a background task writes batches
+    of up to ``batch_size`` messages whenever that many are waiting or every
+    ``flush_interval`` seconds. When the queue is full, ``policy`` decides whether the
+    caller waits ("block"), the oldest queued message is dropped ("drop_oldest") or the
+    new one is ("drop_new").
+    """
+
+    def __init__(self, batch_size=CHAT_LOG_BATCH_SIZE, flush_interval=CHAT_LOG_FLUSH_INTERVAL,
+                 max_size=CHAT_LOG_QUEUE_SIZE, policy=CHAT_LOG_BACKPRESSURE):
+        if policy not in ("block", "drop_oldest", "drop_new"):
+            raise ValueError(f"Unknown backpressure policy: {policy}")
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.policy = policy
+        self._queue = asyncio.Queue(maxsize=max_size)
+        self._wakeup = asyncio.Event()
+        self._task = None
+        self._closing = False
+
+    def qsize(self):
+        return self._queue.qsize()
+
+    async def put(self, message):
+        if self._task is None or self._task.done():
+            self._closing = False
+            self._task = asyncio.create_task(self._run())
+        if self._queue.full():
+            if self.policy == "drop_new":
+                increment("chat_log_dropped")
+                return False
+            if self.policy == "drop_oldest":
+                self._queue.get_nowait()
+                self._queue.task_done()
+                increment("chat_log_dropped")
+        await self._queue.put(message)
+        if self._queue.qsize() >= self.batch_size:
+            self._wakeup.set()
+        return True
+
+    async def _run(self):
+        while not (self._closing and self._queue.empty()):
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            while not self._queue.empty():
+                batch = [self._queue.get_nowait() for _ in range(min(self.batch_size, self._queue.qsize()))]
+                try:
+                    await DBClient.run(lambda conn: _write_messages(conn, batch))
+                    increment("chat_log_written", len(batch))
+                except Exception as e:
+                    increment("chat_log_failed", len(batch))
+                    print(f"Error writing {len(batch)} chat messages: {e}")
+                finally:
+                    for _ in batch:
+                        self._queue.task_done()
+
+    async def flush(self):
+        """Wait until every message queued so far has been written (or has failed)."""
+        if self._task is None or self._task.done():
+            return
+        self._wakeup.set()
+        await self._queue.join()
+
+    async def close(self):
+        """Write what is queued and stop the background task."""
+        self._closing = True
+        self._wakeup.set()
+        if self._task is not None:
+            await self._task
+            self._task = None
+
+    def drain_sync(self):
+        """Last-resort flush at interpreter exit, when the event loop is already gone."""
+        batch = []
+        while not self._queue.empty():
+            batch.append(self._queue.get_nowait())
+        for k in range(0, len(batch), self.batch_size):
+            chunk = batch[k:k + self.batch_size]
+            try:
+                DBClient._execute(lambda conn: _write_messages(conn, chunk))
+            except Exception as e:
+                print(f"Error writing {len(chunk)} chat messages at exit: {e}")
+
 
 class DBClient:
-    _connection = None
-    _lock = asyncio.Lock()  # Lock for thread safety
+    """
+    Chat persistence over a psycopg2 ThreadedConnectionPool.
+
+    Queries run in worker threads via ``asyncio.to_thread`` so they never block the
+    event loop, and up to POSTGRES_POOL_MAX of them run at once. Connections idle for
+    longer than POSTGRES_HEALTHCHECK_INTERVAL are checked with ``SELECT 1`` before use,
+    and a query that fails on a broken connection is retried on a fresh one.
+    """
+    _pool = None
+    _pool_lock = threading.Lock()
+    _slots = asyncio.Semaphore(POSTGRES_POOL_MAX)  # callers wait here instead of hitting PoolError
+    _last_used = {}
+    _log_buffer = ChatLogBuffer()
+    _counts_lock = threading.Lock()
+    _checkouts = 0
+    _returns = 0
 
     @classmethod
-    async def get_connection(cls):
-        """Get or create the database connection"""
-        if cls._connection is None or cls._connection.closed:
-            cls._connection = psycopg2.connect(
-                host=POSTGRES_HOST,
-                port=POSTGRES_PORT,
-                dbname=POSTGRES_DB,
-                user=POSTGRES_USER,
-                password=POSTGRES_PASSWORD
-            )
-            cls._connection.autocommit = True
-            await cls.initialize_tables()
-        return cls._connection
+    def _connect_pool(cls):
+        with cls._pool_lock:
+            if cls._pool is None or cls._pool.closed:
+                pool = psycopg2.pool.ThreadedConnectionPool(
+                    POSTGRES_POOL_MIN,
+                    POSTGRES_POOL_MAX,
+                    host=POSTGRES_HOST,
+                    port=POSTGRES_PORT,
+                    dbname=POSTGRES_DB,
+                    user=POSTGRES_USER,
+                    password=POSTGRES_PASSWORD,
+                    connect_timeout=POSTGRES_CONNECT_TIMEOUT
+                )
+                cls._initialize_tables(pool)
+                cls._pool = pool
+                cls._last_used = {}
+                print(f"Database pool ready ({POSTGRES_POOL_MIN}-{POSTGRES_POOL_MAX} connections)")
+            return cls._pool
 
     @classmethod
-    async def initialize_tables(cls):
+    def _initialize_tables(cls, pool):
         """Create necessary tables if they don't exist"""
-        conn = await cls.get_connection()
-        cursor = conn.cursor()
-        
-        # Create chat_sessions table
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS chat_sessions (
-                id VARCHAR PRIMARY KEY,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                user_ip VARCHAR
-            )
-        ''')
-        
-        # Create chat_messages table
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS chat_messages (
-                id VARCHAR PRIMARY KEY,
-                session_id VARCHAR REFERENCES chat_sessions(id),
-                user_message TEXT,
-                ai_response TEXT,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                metadata JSONB
-            )
-        ''')
-        cursor.close()
+        conn = pool.getconn()
+        try:
+            conn.autocommit = True
+            cursor = conn.cursor()
+
+            # Create chat_sessions table
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS chat_sessions (
+                    id VARCHAR PRIMARY KEY,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    user_ip VARCHAR
+                )
+            ''')
+
+            # Create chat_messages table
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS chat_messages (
+                    id VARCHAR PRIMARY KEY,
+                    session_id VARCHAR REFERENCES chat_sessions(id),
+                    user_message TEXT,
+                    ai_response TEXT,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    metadata JSONB
+                )
+            ''')
+            cursor.close()
+        finally:
+            pool.putconn(conn)
         print("Database tables initialized")
 
+    @classmethod
+    def _usable(cls, conn):
+        """Whether a pooled connection is open and, if it sat idle, still answers ``SELECT 1``."""
+        if conn.closed:
+            return False
+        try:
+            conn.autocommit = True
+            if time.monotonic() - cls._last_used.get(id(conn), 0.0) > POSTGRES_HEALTHCHECK_INTERVAL:
+                with conn.cursor() as cursor:
+                    cursor.execute("SELECT 1")
+        except (psycopg2.OperationalError, psycopg2.InterfaceError):
+            return False
+        return True
+
+    @classmethod
+    def _checkout(cls, pool):
+        """Take a connection from the pool, replacing it if it is closed or fails the health check."""
+        for _ in range(2):
+            conn = pool.getconn()
+            if cls._usable(conn):
+                with cls._counts_lock:
+                    cls._checkouts += 1
+                return conn
+            pool.putconn(conn, close=True)
+            cls._last_used.pop(id(conn), None)
+        raise psycopg2.OperationalError("No working database connection in the pool")
+
+    @classmethod
+    def _release(cls, pool, conn, close=False):
+        """Return a connection taken with ``_checkout``."""
+        with cls._counts_lock:
+            cls._returns += 1
+        pool.putconn(conn, close=close)
+
+    @classmethod
+    def _execute(cls, fn):
+        """Run ``fn(conn)`` on a pooled connection, retrying on connection-level failures."""
+        for attempt in range(POSTGRES_RETRIES + 1):
+            try:
+                pool = cls._connect_pool()
+                conn = cls._checkout(pool)
+            except psycopg2.OperationalError:
+                if attempt == POSTGRES_RETRIES:
+                    raise
+                time.sleep(0.2 * 2 ** attempt)
+                continue
+
+            try:
+                result = fn(conn)
+            except (psycopg2.OperationalError, psycopg2.InterfaceError) as e:
+                cls._release(pool, conn, close=True)
+                cls._last_used.pop(id(conn), None)
+                if attempt == POSTGRES_RETRIES:
+                    raise
+                print(f"Database connection failed ({e}), retrying")
+                time.sleep(0.2 * 2 ** attempt)
+                continue
+            except Exception:
+                cls._release(pool, conn)
+                raise
+            cls._last_used[id(conn)] = time.monotonic()
+            cls._release(pool, conn)
+            return result
+
+    @classmethod
+    async def run(cls, fn):
+        """Run ``fn(conn)`` in a worker thread on a pooled connection."""
+        async with cls._slots:
+            return await asyncio.to_thread(cls._execute, fn)
+
     @classmethod
     async def create_session(cls, user_ip=None):
         """Create a new chat session"""
         session_id = str(uuid.uuid4())
-        async with cls._lock:
-            conn = await cls.get_connection()
-            cursor = conn.cursor()
-            cursor.execute(
-                'INSERT INTO chat_sessions (id, user_ip) VALUES (%s, %s)',
-                (session_id, user_ip)
-            )
-            cursor.close()
+
+        def insert(conn):
+            with conn.cursor() as cursor:
+                cursor.execute(
+                    'INSERT INTO chat_sessions (id, user_ip) VALUES (%s, %s)',
+                    (session_id, user_ip)
+                )
+
+        await cls.run(insert)
         return session_id
 
     @classmethod
     async def log_message(cls, session_id, user_message, ai_response, metadata=None):
-        """Log a chat message to the database"""
+        """Queue a chat message for the background writer and return its id"""
         message_id = str(uuid.uuid4())
-        async with cls._lock:
-            conn = await cls.get_connection()
-            cursor = conn.cursor()
-            
-            # Convert metadata to JSON if it's not None
-            if metadata is not None and not isinstance(metadata, str):
-                metadata = json.dumps(metadata)
-            
-            # Insert the message
-            cursor.execute(
-                'INSERT INTO chat_messages (id, session_id, user_message, ai_response, metadata) VALUES (%s, %s, %s, %s, %s)',
-                (message_id, session_id, user_message, ai_response, metadata)
-            )
-            
-            # Update session timestamp
-            cursor.execute(
-                'UPDATE chat_sessions SET updated_at = CURRENT_TIMESTAMP WHERE id = %s',
-                (session_id,)
-            )
-            cursor.close()
+
+        # Convert metadata to JSON if it's not None
+        if metadata is not None and not isinstance(metadata, str):
+            metadata = json.dumps(metadata)
+
+        await cls._log_buffer.put((message_id, session_id, user_message, ai_response, metadata, datetime.now()))
         return message_id
 
     @classmethod
     async def get_chat_history(cls, session_id, limit=10):
-        """Retrieve chat history for a session"""
-        async with cls._lock:
-            conn = await cls.get_connection()
-            cursor = conn.cursor(cursor_fac
\ No newline at end of file
+        """Retrieve chat history for a session, oldest message first"""
+        await cls._log_buffer.flush()
+
+        def select(conn):
+            with conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cursor:
+                cursor.execute(
+                    'SELECT id, user_message, ai_response, created_at, metadata FROM chat_messages '
+                    'WHERE session_id = %s ORDER BY created_at DESC LIMIT %s',
+                    (session_id, limit)
+                )
+                return [dict(row) for row in reversed(cursor.fetchall())]
+
+        return await cls.run(select)
+
+    @classmethod
+    def pool_stats(cls):
+        with cls._counts_lock:
+            return {
+                "in_use": cls._checkouts - cls._returns,
+                "checkouts": cls._checkouts,
+                "returns": cls._returns,
+                "max": POSTGRES_POOL_MAX,
+            }
+
+    @classmethod
+    async def close(cls):
+        """Flush queued chat messages, then close every pooled connection"""
+        await cls._log_buffer.close()
+        with cls._pool_lock:
+            if cls._pool is not None and not cls._pool.closed:
+                cls._pool.closeall()
+            cls._pool = None
+
+
+register_gauge("db_pool", DBClient.pool_stats)
+register_gauge("chat_log_queue", DBClient._log_buffer.qsize)
+# Normally DBClient.close() runs from the app's shutdown hook; this catches whatever is left
+atexit.register(DBClient._log_buffer.drain_sync)
@@ -1,12 +1,72 @@
 
+import os
+import re
+import asyncio
 import json
+import hashlib
+import logging
+from app_config import (
+    CACHE_DIR, QUERY_REWRITE_CACHE_BACKEND, QUERY_REWRITE_CACHE_SIZE, QUERY_REWRITE_CACHE_TTL,
+    RERANK_WINDOW_SIZE, RERANK_WINDOW_OVERLAP, RERANK_MAX_CONCURRENCY, RERANK_RRF_K,
+    RERANK_BACKEND, RERANK_BACKENDS
+)
+from modules.cache import make_cache
+from modules.local_reranker import local_rerank
+from modules.tracing import span, register_cache
+
+logger = logging.getLogger(__name__)
+
+HISTORY_WINDOW = 4  # Use last 4 turns to keep it concise
+
+query_rewrite_cache = make_cache(
+    QUERY_REWRITE_CACHE_BACKEND,
+    maxsize=QUERY_REWRITE_CACHE_SIZE,
+    ttl=QUERY_REWRITE_CACHE_TTL,
+    path=os.path.join(CACHE_DIR, "query_rewrite.sqlite"),
+    table="query_rewrite"
+)
+register_cache("query_rewrite", query_rewrite_cache)
+
+
+def normalize_query(text: str) -> str:
+    """Lowercase, drop punctuation and collapse whitespace so trivial variants share a cache key."""
+    text = re.sub(r"[^\w\s-]", " ", text.lower())
+    return " ".join(text.split())
+
+
+def query_rewrite_cache_key(user_query: str, history: list = None) -> str:
+    window = [
+        [turn["role"], normalize_query(turn["content"])]
+        for turn in (history or [])[-HISTORY_WINDOW:]
+    ]
+    payload = json.dumps([normalize_query(user_query), window], ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
 
 async def query_rewrite(client, user_query, history: list = None):
+    with span("query_rewrite") as trace:
+        cache_key = query_rewrite_cache_key(user_query, history)
+        cached = query_rewrite_cache.get(cache_key)
+        trace.set_attribute("cache_hit", cached is not None)
+        if cached is not None:
+            return cached
+        try:
+            response = await _rewrite_query_with_llm(client, user_query, history)
+        except Exception as e:
+            print(f"Error in query rewriting: {e}")
+            return user_query
+        trace.set_usage(response)
+        content = response.choices[0].message.content.strip()
+        query_rewrite_cache.set(cache_key, content)
+        return content
+
+
+async def _rewrite_query_with_llm(client, user_query, history: list = None):
     history_str = ""
     if history:
         # Format the last few turns of history for the prompt
         formatted_history = []
-        for turn in history[-4:]: # Use last 4 turns to keep it concise
+        for turn in history[-HISTORY_WINDOW:]:
             role = "User" if turn["role"] == "user" else "Assistant"
             formatted_history.append(f"{role}: {turn['content']}")
         history_str = "\n".join(formatted_history)
@@ -67,30 +127,20 @@ async def query_rewrite(client, user_query, history: list = None):
     [CURRENT USER QUERY]
     {user_query}
     """
-    try:
-        response = client.chat.completions.create(
-            model="qwen-plus",
-            messages=[{"role": "user", "content": QUERY_REWRITE_PROMPT}],
-            max_tokens=150,
-            temperature=0.0
-        )
-        content = response.choices[0].message.content.strip()
-        return content
-    except Exception as e:
-        print(f"Error in query rewriting: {e}")
-        return user_query
+    return await client.chat.completions.create(
+        model="qwen-plus",
+        messages=[{"role": "user", "content": QUERY_REWRITE_PROMPT}],
+        max_tokens=150,
+        temperature=0.0
+    )
     
     
     
 
-async def llm_rerank_results(client, query, results_objects,rewritten_user_query = '', relevance_threshold=0.5):
-    if not results_objects or len(results_objects) == 0:
-        return []
-    result_texts = []
-    for i, doc in enumerate(results_objects):
-        doc_content = doc.properties.get("section_11_description", "")
-        result_texts.append({"id": i, "content": doc_content})
-    prompt = f"""As a data visualization expert, carefully analyze these visualization results for relevance to the user's query.
+# The only property the LLM reranker shows the model for each result
+LLM_RERANK_PROPERTY = "section_11_description"
+
+RERANK_PROMPT = """As a data visualization expert, carefully analyze these visualization results for relevance to the user's query.
       The user sends a query about data visualizations he wants to retrieve from a vector database, and you must determine which results best match the intent and requirements of that query.
       Use the users instruction to retrieve the most relevant results based on what the user finds important.
 
@@ -98,7 +148,7 @@ async def llm_rerank_results(client, query, results_objects,rewritten_user_query
 USER QUERY: "{query}"
 
 SEARCH RESULTS:
-{json.dumps(result_texts, indent=2)}
+{results}
 
 INSTRUCTIONS:
 1. Analyze how well each result matches the semantic meaning of the query
@@ -113,32 +163,142 @@ Example format: [2, 0, 3]
 
 Only respond with the JSON array.
 """
-    try:
-        response = client.chat.completions.create(
+
+
+def make_windows(n_items: int, window_size: int, overlap: int) -> list:
+    """Split ``range(n_items)`` into overlapping windows; the last window always reaches the end."""
+    if n_items <= window_size:
+        return [list(range(n_items))]
+    step = max(1, window_size - overlap)
+    windows = []
+    start = 0
+    while True:
+        end = min(start + window_size, n_items)
+        windows.append(list(range(max(0, end - window_size), end)))
+        if end == n_items:
+            return windows
+        start += step
+
+
+def _parse_ranking(content: str, n_items: int):
+    content = content.replace("```json", "").replace("```", "").strip()
+    match = re.search(r"\[[^\[\]]*\]", content)
+    ranking = json.loads(match.group(0) if match else content)
+    if not isinstance(ranking, list):
+        raise ValueError(f"Expected a JSON array, got: {content}")
+    seen = set()
+    ordered = []
+    for idx in ranking:
+        if isinstance(idx, int) and 0 <= idx < n_items and idx not in seen:
+            seen.add(idx)
+            ordered.append(idx)
+    return ordered
+
+
+async def _rerank_window(client, query, results_objects, window, semaphore, trace=None):
+    """Rank one window with the LLM; returns global indices of the relevant results in order."""
+    result_texts = [
+        {"id": local_id, "content": results_objects[idx].properties.get(LLM_RERANK_PROPERTY, "")}
+        for local_id, idx in enumerate(window)
+    ]
+    prompt = RERANK_PROMPT.format(
+        query=query,
+        results=json.dumps(result_texts, ensure_ascii=False, separators=(",", ":"))
+    )
+    async with semaphore:
+        response = await client.chat.completions.create(
             model="qwen-plus",
             messages=[{"role": "user", "content": prompt}],
-            max_tokens=100,
+            # Room for every id in the window, so long relevant lists are never cut off
+            max_tokens=16 + 4 * len(window),
             temperature=0.1
         )
-        content = response.choices[0].message.content.strip()
-        content = content.replace("```json", "").replace("```", "").strip()
-        try:
-            ranking = json.loads(content)
-            if isinstance(ranking, list):
-                reordered_results = []
-                for idx in ranking:
-                    if isinstance(idx, int) and 0 <= idx < len(results_objects):
-                        reordered_results.append(results_objects[idx])
-                return reordered_results
-        except json.JSONDecodeError:
-            print(f"Failed to parse LLM response as JSON: {content}")
-    except Exception as e:
-        print(f"Error in LLM reranking: {e}")
+    if trace is not None:
+        trace.set_usage(response)
+    content = response.choices[0].message.content.strip()
+    return [window[local_id] for local_id in _parse_ranking(content, len(window))]
+
+
+def merge_window_rankings(windows, rankings, k=RERANK_RRF_K):
+    """
+    Reciprocal-rank merge of per-window rankings.
+
+    An item's score is its mean ``1 / (k + rank)`` over the windows that contained it
+    (0 where a window judged it irrelevant), so items in overlaps are not favoured.
+    Ties keep retrieval order. Items no window selected are left out.
+    """
+    totals = {}
+    appearances = {}
+    for window, ranking in zip(windows, rankings):
+        for idx in window:
+            appearances[idx] = appearances.get(idx, 0) + 1
+        for rank, idx in enumerate(ranking, 1):
+            totals[idx] = totals.get(idx, 0.0) + 1.0 / (k + rank)
+    return sorted(totals, key=lambda idx: (-totals[idx] / appearances[idx], idx))
+
+
+def _distance_filter(results_objects, relevance_threshold):
     filtered_results = []
     for obj in results_objects:
-        if hasattr(obj, 'distance') and obj.distance is not None:
-            if obj.distance < (1.0 - relevance_threshold):
+        distance = getattr(getattr(obj, "metadata", None), "distance", None)
+        if distance is not None:
+            if distance < (1.0 - relevance_threshold):
                 filtered_results.append(obj)
         else:
             filtered_results.append(obj)
-    return filtered_results
\ No newline at end of file
+    return filtered_results
+
+
+async def llm_rerank_results(
+    client,
+    query,
+    results_objects,
+    rewritten_user_query='',
+    relevance_threshold=0.5,
+    window_size=RERANK_WINDOW_SIZE,
+    window_overlap=RERANK_WINDOW_OVERLAP,
+    max_concurrency=RERANK_MAX_CONCURRENCY
+):
+    """
+    Listwise LLM reranking over overlapping windows of candidates.
+
+    Windows are ranked concurrently (at most ``max_concurrency`` calls in flight)
+    and merged with merge_window_rankings. A window whose call fails falls back to
+    the local BM25/vector reranker for its distance-filtered candidates.
+    """
+    if not results_objects or len(results_objects) == 0:
+        return []
+    with span("llm_rerank_results", candidates=len(results_objects)) as trace:
+        windows = make_windows(len(results_objects), window_size, window_overlap)
+        trace.set_attribute("windows", len(windows))
+        semaphore = asyncio.Semaphore(max_concurrency)
+        outcomes = await asyncio.gather(
+            *(_rerank_window(client, query, results_objects, window, semaphore, trace) for window in windows),
+            return_exceptions=True
+        )
+
+        rankings = []
+        failures = 0
+        for window, outcome in zip(windows, outcomes):
+            if isinstance(outcome, Exception):
+                logger.warning(f"LLM reranking window {window[0]}-{window[-1]} failed: {outcome}")
+                failures += 1
+                kept = _distance_filter([results_objects[idx] for idx in window], relevance_threshold)
+                position = {id(results_objects[idx]): idx for idx in window}
+                rankings.append([position[id(obj)] for obj in local_rerank(query, kept, rewritten_user_query)])
+            else:
+                rankings.append(outcome)
+
+        trace.set_attribute("failed_windows", failures)
+        if failures == len(windows):
+            return local_rerank(query, _distance_filter(results_objects, relevance_threshold), rewritten_user_query)
+        return [results_objects[idx] for idx in merge_window_rankings(windows, rankings)]
+
+
+async def rerank_results(client, query, results_objects, rewritten_user_query='', command=None):
+    """Rerank with the backend configured for ``command`` ("llm" or "local")."""
+    backend = RERANK_BACKENDS.get(command, RERANK_BACKEND)
+    if backend == "local":
+        with span("local_rerank", candidates=len(results_objects)):
+            return local_rerank(query, results_objects, rewritten_user_query)
+    return await llm_rerank_results(client, query, results_objects, rewritten_user_query)
@@ -1,23 +1,42 @@
-from chainlit import Chainlit
+import os
+import argparse
+from chainlit.cli import run_chainlit
+from app_config import DOCUMENTS_DIR, WEAVIATE_COLLECTION_NAME
+
 
 def main():
-    app = Chainlit()
-    
+    parser = argparse.ArgumentParser(description="Index chart records, then start the Chainlit app.")
+    parser.add_argument("--documents", default=DOCUMENTS_DIR, help="JSONL/CSV/Parquet file or directory to index")
+    parser.add_argument("--skip-ingest", action="store_true")
+    parser.add_argument("--restart", action="store_true", help="ignore the checkpoint and index everything again")
+    args = parser.parse_args()
+
     # Initialize Weaviate client and other configurations
     from rag.weaviate_client import WeaviateClient
     from rag.document_loader import DocumentLoader
     from rag.retriever import Retriever
+    from rag.feature_store import FeatureStore
 
-    weaviate_client = WeaviateClient()
-    document_loader = DocumentLoader()
-    retriever = Retriever(weaviate_client)
+    if not args.skip_ingest and os.path.exists(args.documents):
+        weaviate_client = WeaviateClient()
+        try:
+            document_loader = DocumentLoader(args.documents)
+            if args.restart:
+                document_loader.reset_checkpoint()
+            retriever = Retriever(weaviate_client, collection_name=WEAVIATE_COLLECTION_NAME)
 
-    # Load documents into the application
-    documents = document_loader.load_documents()
-    retriever.index_documents(documents)
+            # Load documents into the collection, resuming after the last checkpoint
+            documents = document_loader.load_documents()
+            retriever.index_documents(documents)
+
+            # Refresh the facet store that answers filter-only searches
+            FeatureStore().build_from_collection(weaviate_client, WEAVIATE_COLLECTION_NAME)
+        finally:
+            weaviate_client.client.close()
 
     # Start the Chainlit application
-    app.run()
+    run_chainlit(os.path.join(os.path.dirname(os.path.abspath(__file__)), "chainlit_app.py"))
+
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
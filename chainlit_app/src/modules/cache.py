@@ -0,0 +1,169 @@
+import os
+import json
+import time
+import sqlite3
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+
+
+@dataclass
+class CacheStats:
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+    expirations: int = 0
+
+    @property
+    def lookups(self):
+        return self.hits + self.misses
+
+    @property
+    def hit_rate(self):
+        return self.hits / self.lookups if self.lookups else 0.0
+
+    def to_dict(self):
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "hit_rate": round(self.hit_rate, 4),
+        }
+
+
+class MemoryCache:
+    """In-process LRU cache with a per-entry TTL (``ttl=None`` never expires)."""
+
+    def __init__(self, maxsize=1024, ttl=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.stats = CacheStats()
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.stats.misses += 1
+                return default
+            value, expires_at = entry
+            if expires_at is not None and expires_at < time.time():
+                del self._data[key]
+                self.stats.expirations += 1
+                self.stats.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.stats.hits += 1
+            return value
+
+    def set(self, key, value):
+        expires_at = time.time() + self.ttl if self.ttl else None
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.stats.evictions += 1
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class SqliteCache:
+    """On-disk LRU+TTL cache; values are stored as JSON so they survive restarts."""
+
+    def __init__(self, path, maxsize=10000, ttl=None, table="cache"):
+        self.path = path
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.table = table
+        self.stats = CacheStats()
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            f"CREATE TABLE IF NOT EXISTS {table} ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, "
+            "expires_at REAL, last_access REAL NOT NULL)"
+        )
+        self._conn.execute(f"CREATE INDEX IF NOT EXISTS {table}_lru ON {table}(last_access)")
+        self._conn.commit()
+
+    def get(self, key, default=None):
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT value, expires_at FROM {self.table} WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                self.stats.misses += 1
+                return default
+            value, expires_at = row
+            if expires_at is not None and expires_at < now:
+                self._conn.execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+                self._conn.commit()
+                self.stats.expirations += 1
+                self.stats.misses += 1
+                return default
+            self._conn.execute(f"UPDATE {self.table} SET last_access = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+            self.stats.hits += 1
+        return json.loads(value)
+
+    def set(self, key, value):
+        now = time.time()
+        expires_at = now + self.ttl if self.ttl else None
+        with self._lock:
+            self._conn.execute(
+                f"INSERT OR REPLACE INTO {self.table} (key, value, expires_at, last_access) VALUES (?, ?, ?, ?)",
+                (key, json.dumps(value), expires_at, now)
+            )
+            (count,) = self._conn.execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()
+            overflow = count - self.maxsize
+            if overflow > 0:
+                self._conn.execute(
+                    f"DELETE FROM {self.table} WHERE key IN "
+                    f"(SELECT key FROM {self.table} ORDER BY last_access ASC LIMIT ?)",
+                    (overflow,)
+                )
+                self.stats.evictions += overflow
+            self._conn.commit()
+
+    def delete(self, key):
+        with self._lock:
+            self._conn.execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+            self._conn.commit()
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute(f"DELETE FROM {self.table}")
+            self._conn.commit()
+
+    def __len__(self):
+        with self._lock:
+            (count,) = self._conn.execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()
+        return count
+
+
+def make_cache(backend="memory", maxsize=1024, ttl=None, path=None, table="cache"):
+    """Build a cache for the configured backend ("memory" or "disk")."""
+    if backend == "memory":
+        return MemoryCache(maxsize=maxsize, ttl=ttl)
+    if backend == "disk":
+        if not path:
+            raise ValueError("A path is required for the disk cache backend")
+        return SqliteCache(path, maxsize=maxsize, ttl=ttl, table=table)
+    raise ValueError(f"Unknown cache backend: {backend}")
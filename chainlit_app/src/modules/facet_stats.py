@@ -0,0 +1,162 @@
+"""
+Facet statistics over the filter fields, used to prune filter combinations that match
+no chart before they cost a vector query.
+
+Counts are kept per (field, value) and per pair of (field, value)s across fields, so
+any single filter or pair of filters with a zero count is known to be unsatisfiable.
+The per-chart facet values are kept as well, so a refresh only applies the differences.
+"""
+import threading
+from collections import Counter
+from itertools import combinations
+
+
+def _normalize(value):
+    if value is None:
+        return None
+    return str(value).strip().lower() or None
+
+
+class FacetStats:
+    """Counts over ``fields``; filters on other fields are never judged."""
+
+    def __init__(self, fields):
+        self.fields = list(fields)
+        self._order = {field: i for i, field in enumerate(self.fields)}
+        self.values = {field: Counter() for field in self.fields}
+        self.pairs = Counter()
+        self.total = 0
+        self.version = None
+        self._rows = {}
+        self._lock = threading.Lock()
+
+    # --- maintenance -----------------------------------------------------------
+
+    def _items(self, properties):
+        items = ((field, _normalize(properties.get(field))) for field in self.fields)
+        return tuple((field, value) for field, value in items if value is not None)
+
+    def _apply(self, items, sign):
+        for field, value in items:
+            counts = self.values[field]
+            counts[value] += sign
+            if counts[value] <= 0:
+                del counts[value]
+        for pair in combinations(items, 2):
+            self.pairs[pair] += sign
+            if self.pairs[pair] <= 0:
+                del self.pairs[pair]
+        self.total += sign
+
+    def _set_row(self, uuid, items):
+        old = self._rows.get(uuid)
+        if old == items:
+            return False
+        if old is not None:
+            self._apply(old, -1)
+        self._apply(items, 1)
+        self._rows[uuid] = items
+        return True
+
+    def _drop_row(self, uuid):
+        old = self._rows.pop(uuid, None)
+        if old is not None:
+            self._apply(old, -1)
+
+    def update(self, uuid, properties):
+        """Add a chart or replace its facet values."""
+        items = self._items(properties)
+        with self._lock:
+            self._set_row(uuid, items)
+
+    def remove(self, uuid):
+        with self._lock:
+            self._drop_row(uuid)
+
+    def sync(self, rows, version=None):
+        """Bring the counts in line with ``rows`` of (uuid, properties), the full current set; returns the number of changes."""
+        rows = [(str(uuid), self._items(properties)) for uuid, properties in rows]
+        changes = 0
+        with self._lock:
+            for uuid, items in rows:
+                changes += self._set_row(uuid, items)
+            stale = set(self._rows) - {uuid for uuid, _ in rows}
+            for uuid in stale:
+                self._drop_row(uuid)
+            self.version = version
+        return changes + len(stale)
+
+    def is_stale(self, store) -> bool:
+        return store.version() != self.version
+
+    def refresh_from_store(self, store):
+        """Sync with a rag.feature_store.FeatureStore if it was rebuilt since the last refresh."""
+        version = store.version()
+        if version == self.version:
+            return 0
+        if version is None:
+            self.sync([], version=None)
+            return 0
+        rows = store.rows(self.fields)
+        changes = self.sync(((row[0], dict(zip(self.fields, row[1:]))) for row in rows), version=version)
+        print(f"Facet stats refreshed: {changes} chart(s) changed, {self.total} total")
+        return changes
+
+    # --- queries ---------------------------------------------------------------
+
+    def count(self, field, value) -> int:
+        return self.values.get(field, {}).get(_normalize(value), 0)
+
+    def pair_count(self, a, b) -> int:
+        (field_a, value_a), (field_b, value_b) = a, b
+        value_a, value_b = _normalize(value_a), _normalize(value_b)
+        if field_a == field_b:
+            return self.count(field_a, value_a) if value_a == value_b else 0
+        if self._order[field_a] > self._order[field_b]:
+            (field_a, value_a), (field_b, value_b) = (field_b, value_b), (field_a, value_a)
+        return self.pairs.get(((field_a, value_a), (field_b, value_b)), 0)
+
+    def estimate(self, filters) -> int:
+        """Upper bound on the charts matching every (field, value) in ``filters``."""
+        filters = [(field, value) for field, value in filters if field in self._order]
+        if not filters:
+            return self.total
+        bound = min(self.count(field, value) for field, value in filters)
+        for a, b in combinations(filters, 2):
+            bound = min(bound, self.pair_count(a, b))
+        return bound
+
+    def prune(self, filters):
+        """
+        Split ``filters`` of (field, value, confidence) into (kept, dropped) so that no kept
+        value or pair of values is known to match nothing. Conflicting filters are dropped
+        one at a time: the one in most zero-count pairs, then the least confident, then the
+        last. Without statistics every filter is kept.
+        """
+        if not self.total:
+            return list(filters), []
+        kept, dropped = [], []
+        for hit in filters:
+            field, value = hit[0], hit[1]
+            if field in self._order and not self.count(field, value):
+                dropped.append((*hit, "no chart has this value"))
+            else:
+                kept.append(hit)
+        while True:
+            conflicts = Counter()
+            for a, b in combinations(kept, 2):
+                if a[0] in self._order and b[0] in self._order and not self.pair_count(a[:2], b[:2]):
+                    conflicts[a] += 1
+                    conflicts[b] += 1
+            if not conflicts:
+                return kept, dropped
+            worst = max(conflicts, key=lambda hit: (conflicts[hit], -(hit[2] or 0.0), kept.index(hit)))
+            kept.remove(worst)
+            dropped.append((*worst, f"matches nothing together with {conflicts[worst]} other filter(s)"))
+
+    def stats(self):
+        return {
+            "charts": self.total,
+            "values": sum(len(counts) for counts in self.values.values()),
+            "pairs": len(self.pairs),
+        }
@@ -0,0 +1,90 @@
+import uuid
+import chainlit as cl
+from app_config import GALLERY_PAGE_SIZE, GALLERY_CARDS_PER_MESSAGE
+
+LOAD_MORE_ACTION = "load_more_results"
+MAX_GALLERIES_PER_SESSION = 5
+
+
+def build_card(i: int, doc):
+    """Markdown for one result plus its image URL (or None)."""
+    props = getattr(doc, "properties", {}) or {}
+    image_url = props.get("image_url")
+    post_url = props.get("post_url")
+    external_link = props.get("external_link")
+    if external_link:
+        post_url = external_link
+    image_description = props.get("image_description") or "No image description available."
+
+    content = f"**{i}.** {image_description}\n\n"
+    if image_url:
+        content += f"🖼️ [View Visualization]({image_url})\n"
+    if post_url:
+        content += f"📄 [View Original Post]({post_url})"
+    if external_link:
+        content += f"\n🔗 [External Link]({external_link})"
+    return content, image_url
+
+
+async def _send_group(cards, actions=None, header=None):
+    elements = []
+    for i, (_, image_url) in cards:
+        if image_url:
+            try:
+                elements.append(cl.Image(name=f"viz_{i}", display="inline", url=image_url, size="medium"))
+            except Exception as e:
+                print(f"Error creating image element for {image_url}: {e}")
+    content = "\n\n---\n\n".join(content for _, (content, _) in cards)
+    if header:
+        content = f"{header}\n\n{content}"
+    await cl.Message(content=content, elements=elements, actions=actions or []).send()
+
+
+async def send_page(gallery_id: str, header: str = None):
+    """Send the next page of a gallery, several cards per message, with a load-more button if results remain."""
+    galleries = cl.user_session.get("galleries") or {}
+    gallery = galleries.get(gallery_id)
+    if gallery is None:
+        await cl.Message(content="These results have expired, please search again.").send()
+        return
+
+    results, offset = gallery["results"], gallery["offset"]
+    page = results[offset:offset + GALLERY_PAGE_SIZE]
+    gallery["offset"] = offset + len(page)
+    if gallery.get("hydrate"):
+        page = await gallery["hydrate"](page)
+    remaining = len(results) - gallery["offset"]
+
+    cards = [(offset + j + 1, build_card(offset + j + 1, doc)) for j, doc in enumerate(page)]
+    groups = [cards[k:k + GALLERY_CARDS_PER_MESSAGE] for k in range(0, len(cards), GALLERY_CARDS_PER_MESSAGE)]
+    for k, group in enumerate(groups):
+        actions = None
+        if remaining > 0 and k == len(groups) - 1:
+            actions = [cl.Action(
+                name=LOAD_MORE_ACTION,
+                payload={"gallery_id": gallery_id},
+                label=f"Load more ({remaining} left)"
+            )]
+        await _send_group(group, actions, header=header if k == 0 else None)
+
+    if remaining <= 0:
+        galleries.pop(gallery_id, None)
+
+
+async def send_gallery(results: list, title: str, hydrate=None):
+    """
+    Show results as a paged gallery: the first page goes out immediately and the
+    rest is kept in the user session until the user asks for more. ``hydrate`` is
+    awaited on each page before it is shown, to fetch properties the search left out.
+    """
+    if not results:
+        await cl.Message(content="No matching visualizations found.").send()
+        return
+
+    galleries = cl.user_session.get("galleries") or {}
+    while len(galleries) >= MAX_GALLERIES_PER_SESSION:
+        galleries.pop(next(iter(galleries)))
+    gallery_id = uuid.uuid4().hex
+    galleries[gallery_id] = {"results": list(results), "offset": 0, "hydrate": hydrate}
+    cl.user_session.set("galleries", galleries)
+    await send_page(gallery_id, header=f"**{title}**")
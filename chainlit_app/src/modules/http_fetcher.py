@@ -0,0 +1,161 @@
+import os
+import json
+import asyncio
+import hashlib
+import urllib.parse
+import httpx
+from app_config import (
+    CACHE_DIR, IMAGE_FETCH_MAX_BYTES, IMAGE_FETCH_TIMEOUT, IMAGE_FETCH_MAX_CONNECTIONS, IMAGE_FETCH_CACHE_ENTRIES
+)
+from modules.image_utils import convert_github_url_to_raw
+
+
+class ImageTooLargeError(ValueError):
+    pass
+
+
+def canonicalize_url(url: str) -> str:
+    """Rewrite GitHub blob links to raw content and drop fragments so equal images share a cache key."""
+    url = convert_github_url_to_raw(url.strip())
+    parts = urllib.parse.urlsplit(url)
+    return urllib.parse.urlunsplit((parts.scheme.lower(), parts.netloc.lower(), parts.path, parts.query, ""))
+
+
+class ImageFetcher:
+    """
+    Shared async HTTP fetcher for images.
+
+    One keep-alive connection pool serves every session. Downloads are streamed
+    and aborted past ``max_bytes``. Responses with an ETag or Last-Modified are
+    cached on disk and revalidated with conditional requests.
+    """
+
+    def __init__(
+        self,
+        cache_dir=os.path.join(CACHE_DIR, "images"),
+        max_bytes=IMAGE_FETCH_MAX_BYTES,
+        timeout=IMAGE_FETCH_TIMEOUT,
+        max_connections=IMAGE_FETCH_MAX_CONNECTIONS,
+        max_cache_entries=IMAGE_FETCH_CACHE_ENTRIES
+    ):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.timeout = timeout
+        self.max_connections = max_connections
+        self.max_cache_entries = max_cache_entries
+        self._client = None
+        os.makedirs(cache_dir, exist_ok=True)
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                timeout=self.timeout,
+                follow_redirects=True,
+                limits=httpx.Limits(
+                    max_connections=self.max_connections,
+                    max_keepalive_connections=self.max_connections
+                ),
+                headers={"Accept": "image/*"}
+            )
+        return self._client
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+
+    def _paths(self, url):
+        key = hashlib.sha256(url.encode("utf-8")).hexdigest()
+        base = os.path.join(self.cache_dir, key)
+        return base + ".bin", base + ".json"
+
+    def _read_cached(self, url):
+        body_path, meta_path = self._paths(url)
+        try:
+            with open(meta_path) as f:
+                meta = json.load(f)
+            with open(body_path, "rb") as f:
+                return meta, f.read()
+        except (OSError, ValueError):
+            return None, None
+
+    def _write_cached(self, url, meta, body):
+        body_path, meta_path = self._paths(url)
+        for path, data, mode in ((body_path, body, "wb"), (meta_path, json.dumps(meta), "w")):
+            tmp_path = path + ".tmp"
+            with open(tmp_path, mode) as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        self._prune()
+
+    def _touch(self, url):
+        for path in self._paths(url):
+            try:
+                os.utime(path)
+            except OSError:
+                pass
+
+    def _prune(self):
+        metas = [entry for entry in os.scandir(self.cache_dir) if entry.name.endswith(".json")]
+        overflow = len(metas) - self.max_cache_entries
+        if overflow <= 0:
+            return
+        metas.sort(key=lambda entry: entry.stat().st_mtime)
+        for entry in metas[:overflow]:
+            for path in (entry.path, entry.path[:-len(".json")] + ".bin"):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+
+    async def fetch(self, url: str) -> bytes:
+        url = canonicalize_url(url)
+        meta, cached_body = await asyncio.to_thread(self._read_cached, url)
+        headers = {}
+        if meta:
+            if meta.get("etag"):
+                headers["If-None-Match"] = meta["etag"]
+            if meta.get("last_modified"):
+                headers["If-Modified-Since"] = meta["last_modified"]
+
+        async with self.client.stream("GET", url, headers=headers) as response:
+            if response.status_code == 304 and cached_body is not None:
+                await asyncio.to_thread(self._touch, url)
+                return cached_body
+            response.raise_for_status()
+
+            declared = response.headers.get("Content-Length")
+            if declared and declared.isdigit() and int(declared) > self.max_bytes:
+                raise ImageTooLargeError(f"Image is {declared} bytes, limit is {self.max_bytes}")
+            chunks = []
+            received = 0
+            async for chunk in response.aiter_bytes():
+                received += len(chunk)
+                if received > self.max_bytes:
+                    raise ImageTooLargeError(f"Image exceeds the {self.max_bytes} byte limit")
+                chunks.append(chunk)
+            body = b"".join(chunks)
+
+            etag = response.headers.get("ETag")
+            last_modified = response.headers.get("Last-Modified")
+            no_store = "no-store" in response.headers.get("Cache-Control", "")
+        if (etag or last_modified) and not no_store:
+            await asyncio.to_thread(
+                self._write_cached, url, {"url": url, "etag": etag, "last_modified": last_modified}, body
+            )
+        return body
+
+
+_image_fetcher = None
+
+
+def get_image_fetcher() -> ImageFetcher:
+    global _image_fetcher
+    if _image_fetcher is None:
+        _image_fetcher = ImageFetcher()
+    return _image_fetcher
+
+
+async def fetch_image_bytes(image_url: str) -> bytes:
+    """Download an image through the shared fetcher."""
+    return await get_image_fetcher().fetch(image_url)
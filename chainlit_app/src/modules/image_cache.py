@@ -0,0 +1,106 @@
+import os
+import time
+import sqlite3
+import hashlib
+import threading
+from PIL import Image
+from modules.cache import CacheStats
+
+
+def dhash(image: Image.Image, hash_size: int = 8) -> int:
+    """64-bit difference hash: robust to re-encoding, resizing and small edits."""
+    gray = image.convert("L").resize((hash_size + 1, hash_size), Image.LANCZOS)
+    pixels = gray.tobytes()
+    value = 0
+    for row in range(hash_size):
+        offset = row * (hash_size + 1)
+        for col in range(hash_size):
+            value = (value << 1) | (pixels[offset + col] > pixels[offset + col + 1])
+    return value
+
+
+def hamming(a: int, b: int) -> int:
+    return (a ^ b).bit_count()
+
+
+class ImageDescriptionCache:
+    """
+    Persistent cache of VLM descriptions keyed by perceptual image hash and prompt.
+
+    A lookup matches any stored hash within ``max_distance`` bits, so the same chart
+    re-encoded or served from another URL is found. Least recently used entries are
+    evicted beyond ``max_entries``.
+    """
+
+    def __init__(self, path, max_entries=5000, max_distance=4):
+        self.path = path
+        self.max_entries = max_entries
+        self.max_distance = max_distance
+        self.stats = CacheStats()
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS image_descriptions ("
+            "phash TEXT NOT NULL, prompt_key TEXT NOT NULL, description TEXT NOT NULL, "
+            "last_access REAL NOT NULL, PRIMARY KEY (phash, prompt_key))"
+        )
+        self._conn.commit()
+        # prompt_key -> {phash: description}, loaded once; the table is bounded so this stays small
+        self._index = {}
+        for phash, prompt_key, description in self._conn.execute(
+            "SELECT phash, prompt_key, description FROM image_descriptions"
+        ):
+            self._index.setdefault(prompt_key, {})[int(phash, 16)] = description
+
+    @staticmethod
+    def prompt_key(prompt: str) -> str:
+        return hashlib.sha256(prompt.encode("utf-8")).hexdigest()[:16]
+
+    def get(self, phash: int, prompt: str):
+        prompt_key = self.prompt_key(prompt)
+        with self._lock:
+            entries = self._index.get(prompt_key, {})
+            match = phash if phash in entries else None
+            if match is None:
+                best = self.max_distance + 1
+                for candidate in entries:
+                    distance = hamming(phash, candidate)
+                    if distance < best:
+                        match, best = candidate, distance
+            if match is None:
+                self.stats.misses += 1
+                return None
+            self.stats.hits += 1
+            self._conn.execute(
+                "UPDATE image_descriptions SET last_access = ? WHERE phash = ? AND prompt_key = ?",
+                (time.time(), f"{match:016x}", prompt_key)
+            )
+            self._conn.commit()
+            return entries[match]
+
+    def set(self, phash: int, prompt: str, description: str):
+        prompt_key = self.prompt_key(prompt)
+        with self._lock:
+            self._index.setdefault(prompt_key, {})[phash] = description
+            self._conn.execute(
+                "INSERT OR REPLACE INTO image_descriptions (phash, prompt_key, description, last_access) "
+                "VALUES (?, ?, ?, ?)",
+                (f"{phash:016x}", prompt_key, description, time.time())
+            )
+            (count,) = self._conn.execute("SELECT COUNT(*) FROM image_descriptions").fetchone()
+            overflow = count - self.max_entries
+            if overflow > 0:
+                evicted = self._conn.execute(
+                    "SELECT phash, prompt_key FROM image_descriptions ORDER BY last_access ASC LIMIT ?",
+                    (overflow,)
+                ).fetchall()
+                self._conn.executemany(
+                    "DELETE FROM image_descriptions WHERE phash = ? AND prompt_key = ?", evicted
+                )
+                for old_hash, old_prompt_key in evicted:
+                    self._index.get(old_prompt_key, {}).pop(int(old_hash, 16), None)
+                self.stats.evictions += overflow
+            self._conn.commit()
@@ -1,7 +1,15 @@
 import re
 import io
+import time
 import base64
+import asyncio
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from functools import partial
 from PIL import Image
+from app_config import IMAGE_MAX_EDGE, IMAGE_TARGET_BYTES, IMAGE_MIN_QUALITY, IMAGE_PROCESS_WORKERS
+from modules.image_cache import dhash
+from modules.tracing import span
 
 def convert_github_url_to_raw(github_url: str) -> str:
     """Convert GitHub repository URL to raw content URL for images."""
@@ -12,21 +20,109 @@ def convert_github_url_to_raw(github_url: str) -> str:
         return f'https://raw.githubusercontent.com/{user}/{repo}/{path}'
     return github_url
 
-def process_image_bytes(image_bytes: bytes) -> bytes:
-    """Convert image bytes to RGB JPEG bytes."""
-    image = Image.open(io.BytesIO(image_bytes))
+@dataclass
+class PreparedImage:
+    data: bytes
+    width: int
+    height: int
+    quality: int
+    phash: int
+    timings: dict = field(default_factory=dict)  # stage -> milliseconds
+
+
+def _to_rgb(image: Image.Image) -> Image.Image:
     if image.mode in ['P', 'RGBA', 'LA']:
         if image.mode == 'P':
-            image = image.convert('RGB')
-        else:
+            image = image.convert('RGBA') if 'transparency' in image.info else image.convert('RGB')
+        if image.mode in ['RGBA', 'LA']:
             rgb_image = Image.new('RGB', image.size, (255, 255, 255))
             rgb_image.paste(image, mask=image.split()[-1])
             image = rgb_image
     elif image.mode != 'RGB':
         image = image.convert('RGB')
-    img_byte_arr = io.BytesIO()
-    image.save(img_byte_arr, format='JPEG', quality=95)
-    return img_byte_arr.getvalue()
+    return image
+
+
+def _initial_quality(pixels: int) -> int:
+    # Small charts keep more detail per pixel; big ones compress well at lower quality
+    if pixels <= 512 * 512:
+        return 92
+    if pixels <= 1024 * 1024:
+        return 88
+    return 82
+
+
+def prepare_image(image_bytes: bytes, max_edge: int = IMAGE_MAX_EDGE, target_bytes: int = IMAGE_TARGET_BYTES) -> PreparedImage:
+    """
+    Decode, downsample and JPEG-encode an image for the VLM.
+
+    JPEGs are decoded at reduced scale with ``Image.draft``; the longest edge is capped
+    at ``max_edge`` and quality steps down until the payload fits ``target_bytes``.
+    """
+    timings = {}
+    start = time.perf_counter()
+
+    def lap(stage):
+        nonlocal start
+        now = time.perf_counter()
+        timings[stage] = round((now - start) * 1000, 2)
+        start = now
+
+    image = Image.open(io.BytesIO(image_bytes))
+    if image.format == 'JPEG':
+        image.draft('RGB', (max_edge, max_edge))
+    image.load()
+    lap("decode")
+
+    image = _to_rgb(image)
+    if max(image.size) > max_edge:
+        image.thumbnail((max_edge, max_edge), Image.LANCZOS)
+    lap("resize")
+
+    phash = dhash(image)
+    lap("hash")
+
+    quality = _initial_quality(image.width * image.height)
+    while True:
+        img_byte_arr = io.BytesIO()
+        image.save(img_byte_arr, format='JPEG', quality=quality, optimize=True)
+        if img_byte_arr.tell() <= target_bytes or quality <= IMAGE_MIN_QUALITY:
+            break
+        quality = max(IMAGE_MIN_QUALITY, quality - 10)
+    lap("encode")
+
+    return PreparedImage(
+        data=img_byte_arr.getvalue(),
+        width=image.width,
+        height=image.height,
+        quality=quality,
+        phash=phash,
+        timings=timings
+    )
+
+
+_process_pool = None
+
+
+def get_process_pool() -> ProcessPoolExecutor:
+    global _process_pool
+    if _process_pool is None:
+        _process_pool = ProcessPoolExecutor(max_workers=IMAGE_PROCESS_WORKERS)
+    return _process_pool
+
+
+async def prepare_image_async(image_bytes: bytes, **kwargs) -> PreparedImage:
+    """Run prepare_image in the shared process pool so decoding never holds the event loop or the GIL."""
+    loop = asyncio.get_running_loop()
+    with span("image_prepare", input_bytes=len(image_bytes)) as trace:
+        prepared = await loop.run_in_executor(get_process_pool(), partial(prepare_image, image_bytes, **kwargs))
+        trace.set_attribute("output_bytes", len(prepared.data))
+        trace.set_attribute("size", f"{prepared.width}x{prepared.height}")
+        trace.set_attribute("quality", prepared.quality)
+        for stage, ms in prepared.timings.items():
+            trace.set_attribute(f"{stage}_ms", ms)
+    return prepared
+
 
 def image_bytes_to_base64(image_bytes: bytes) -> str:
     """Convert image bytes to base64 string."""
@@ -0,0 +1,93 @@
+import re
+import numpy as np
+
+# Section_17_Searchable_Keywords of the VLM output is stored as section_9_searchable_keywords
+# in dviz_c_structured_v3 (see VECTOR_NAME_MAP in modules.toolcalling).
+KEYWORDS_PROPERTY = "section_9_searchable_keywords"
+
+# Property -> BM25 weight
+RERANK_FIELDS = {
+    "section_11_description": 1.0,
+    "image_description": 0.7,
+    KEYWORDS_PROPERTY: 1.3,
+}
+
+STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "for", "from", "in", "is", "it", "me",
+    "of", "on", "or", "show", "that", "the", "this", "to", "with", "find", "plot", "plots",
+    "chart", "charts", "visualization", "visualizations",
+}
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+(?:[-_][a-z0-9]+)*")
+
+
+def tokenize(text) -> list:
+    if isinstance(text, (list, tuple)):
+        text = " ".join(str(t) for t in text)
+    tokens = _TOKEN_RE.findall(str(text or "").lower())
+    return [t for t in tokens if t not in STOPWORDS]
+
+
+def bm25_scores(query_terms: list, documents: list, k1: float = 1.2, b: float = 0.75) -> np.ndarray:
+    """BM25 of each tokenized document against the query terms, with IDF taken over ``documents``."""
+    n_docs = len(documents)
+    terms = list(dict.fromkeys(query_terms))
+    if not n_docs or not terms:
+        return np.zeros(n_docs)
+    term_index = {term: j for j, term in enumerate(terms)}
+    tf = np.zeros((n_docs, len(terms)))
+    lengths = np.zeros(n_docs)
+    for i, tokens in enumerate(documents):
+        lengths[i] = len(tokens)
+        for token in tokens:
+            j = term_index.get(token)
+            if j is not None:
+                tf[i, j] += 1
+    df = (tf > 0).sum(axis=0)
+    idf = np.log(1.0 + (n_docs - df + 0.5) / (df + 0.5))
+    avg_len = lengths.mean() or 1.0
+    norm = k1 * (1.0 - b + b * lengths / avg_len)
+    return ((tf * (k1 + 1.0)) / (tf + norm[:, None]) * idf).sum(axis=1)
+
+
+def _min_max(values: np.ndarray) -> np.ndarray:
+    span = values.max() - values.min() if len(values) else 0.0
+    if span <= 0:
+        return np.zeros_like(values)
+    return (values - values.min()) / span
+
+
+def vector_similarities(results_objects) -> np.ndarray:
+    """Similarity from the search metadata: 1 - distance for near_text, score for hybrid."""
+    sims = np.zeros(len(results_objects))
+    for i, obj in enumerate(results_objects):
+        metadata = getattr(obj, "metadata", None)
+        distance = getattr(metadata, "distance", None)
+        score = getattr(metadata, "score", None)
+        if distance is not None:
+            sims[i] = 1.0 - distance
+        elif score is not None:
+            sims[i] = score
+    return sims
+
+
+def local_rerank(query, results_objects, rewritten_user_query='', text_weight=0.6, fields=None):
+    """
+    Rerank search results in-process by fusing BM25 text relevance with the vector similarity.
+
+    The query and its rewrite are both used as query terms. Returns every candidate,
+    best first; ties keep retrieval order.
+    """
+    if not results_objects:
+        return []
+    fields = fields or RERANK_FIELDS
+    query_terms = tokenize(query) + tokenize(rewritten_user_query)
+
+    text_scores = np.zeros(len(results_objects))
+    for field, weight in fields.items():
+        documents = [tokenize((getattr(doc, "properties", {}) or {}).get(field)) for doc in results_objects]
+        text_scores += weight * bm25_scores(query_terms, documents)
+
+    fused = text_weight * _min_max(text_scores) + (1.0 - text_weight) * _min_max(vector_similarities(results_objects))
+    order = np.argsort(-fused, kind="stable")
+    return [results_objects[i] for i in order]
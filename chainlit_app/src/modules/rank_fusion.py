@@ -0,0 +1,29 @@
+from typing import Callable, Hashable, List, Sequence
+
+
+def reciprocal_rank_fusion(rankings: Sequence[Sequence], key: Callable = None, k: int = 60, weights: Sequence[float] = None) -> List:
+    """
+    Fuse several ranked lists into one with reciprocal-rank fusion.
+
+    Each item scores ``sum(weight / (k + rank))`` over the lists it appears in.
+    Ties keep the order of first appearance, so the output is stable.
+    """
+    key = key or (lambda item: item)
+    weights = weights or [1.0] * len(rankings)
+    scores = {}
+    first_seen = {}
+    items = {}
+    for ranking, weight in zip(rankings, weights):
+        for rank, item in enumerate(ranking, 1):
+            item_key = key(item)
+            if item_key not in items:
+                items[item_key] = item
+                first_seen[item_key] = len(first_seen)
+            scores[item_key] = scores.get(item_key, 0.0) + weight / (k + rank)
+    ordered = sorted(items, key=lambda item_key: (-scores[item_key], first_seen[item_key]))
+    return [items[item_key] for item_key in ordered]
+
+
+def object_uuid(obj) -> Hashable:
+    """Dedup key for Weaviate result objects."""
+    return str(getattr(obj, "uuid", None) or id(obj))
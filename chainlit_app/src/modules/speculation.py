@@ -0,0 +1,93 @@
+"""
+Speculative retrieval: search on the raw query while the LLM rewrite is still running.
+
+If the rewrite turns out to say the same thing (token Jaccard similarity at or above
+SPECULATION_SIMILARITY), the speculative result is used as is. Otherwise the rewritten
+query is searched too and both rankings are fused, the rewrite's weighted higher; a
+speculative search that is still running by then is cancelled.
+"""
+import asyncio
+from app_config import SPECULATION_SIMILARITY, RERANK_RRF_K
+from modules.local_reranker import tokenize
+from modules.rank_fusion import reciprocal_rank_fusion, object_uuid
+from modules.tracing import span, increment, register_gauge
+
+RAW_QUERY_WEIGHT = 0.5  # weight of the raw-query ranking when fused with the rewrite's
+
+_outcomes = {"reused": 0, "merged": 0, "cancelled": 0, "failed": 0}
+
+
+def _speculation_stats():
+    # Only a reused result saves the second search; merged ones add recall, not speed
+    total = sum(_outcomes.values())
+    return {**_outcomes, "paid_off_rate": _outcomes["reused"] / total if total else 0.0}
+
+
+register_gauge("speculation", _speculation_stats)
+
+
+def query_similarity(a: str, b: str) -> float:
+    """Jaccard similarity of the two queries' content tokens."""
+    tokens_a, tokens_b = set(tokenize(a)), set(tokenize(b))
+    if not tokens_a and not tokens_b:
+        return 1.0
+    return len(tokens_a & tokens_b) / len(tokens_a | tokens_b)
+
+
+def _record(outcome):
+    _outcomes[outcome] += 1
+    increment(f"speculation_{outcome}")
+
+
+async def speculative_retrieve(retriever, user_query: str, rewrite, limit=10, filters=None, on_rewrite=None,
+                               threshold=SPECULATION_SIMILARITY):
+    """
+    Run ``retriever.retrieve(user_query)`` concurrently with the ``rewrite`` awaitable.
+
+    ``on_rewrite(rewritten)`` is awaited as soon as the rewrite is known, while the
+    search may still be in flight. Returns ``(rewritten_query, objects)``.
+    """
+    with span("speculative_retrieve", limit=limit) as trace:
+        speculative = asyncio.create_task(retriever.retrieve(user_query, limit=limit, filters=filters))
+        try:
+            rewritten = await rewrite
+            if on_rewrite is not None:
+                await on_rewrite(rewritten)
+        except BaseException:
+            speculative.cancel()
+            raise
+
+        similarity = query_similarity(user_query, rewritten)
+        trace.set_attribute("similarity", round(similarity, 3))
+        if similarity >= threshold:
+            try:
+                response = await speculative
+                _record("reused")
+                trace.set_attribute("outcome", "reused")
+                return rewritten, list(getattr(response, "objects", None) or [])
+            except Exception as e:
+                print(f"Speculative retrieval failed, searching the rewrite: {e}")
+
+        try:
+            response = await retriever.retrieve(rewritten, limit=limit, filters=filters)
+        except BaseException:
+            speculative.cancel()
+            raise
+        objects = list(getattr(response, "objects", None) or [])
+        if not speculative.done():
+            speculative.cancel()
+            _record("cancelled")
+            trace.set_attribute("outcome", "cancelled")
+            return rewritten, objects
+        if speculative.cancelled() or speculative.exception() is not None:
+            _record("failed")
+            trace.set_attribute("outcome", "failed")
+            return rewritten, objects
+
+        raw_objects = list(getattr(speculative.result(), "objects", None) or [])
+        merged = reciprocal_rank_fusion(
+            [objects, raw_objects], key=object_uuid, k=RERANK_RRF_K, weights=[1.0, RAW_QUERY_WEIGHT]
+        )[:limit]
+        _record("merged")
+        trace.set_attribute("outcome", "merged")
+        return rewritten, merged
@@ -0,0 +1,224 @@
+"""
+Local routing of tool-search queries to FIELD_TOOLS, without an LLM round trip.
+
+Keywords are compiled into a word-level Aho-Corasick automaton, so one pass over the
+query finds every keyword of every field. Filter fields only fire on values of their
+controlled vocabulary, and ambiguous values (light, vertical, ...) also need a cue word
+for the field in the query ("dark background", "dashed grid lines"). Each route carries
+a confidence; callers fall back to the LLM when it is too low.
+"""
+import re
+from collections import deque
+from dataclasses import dataclass, field
+
+# Words that carry no routing signal; they neither match nor count against coverage
+NEUTRAL_WORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "for", "from", "in", "is", "it", "me", "i",
+    "of", "on", "or", "that", "the", "this", "to", "with", "find", "want", "looking", "some",
+    "plot", "chart", "graph", "visualization", "viz", "figure", "image", "one", "using", "has", "have",
+}
+
+# Keywords that appear in so many queries that they hardly say which field is meant
+GENERIC_KEYWORDS = {
+    "data", "type", "variable", "size", "shape", "key", "scale", "element", "component", "part",
+    "position", "range", "label", "text", "method", "model", "analysis", "what", "about", "show",
+    "content", "style", "feature", "category", "tag", "special", "interesting", "why", "goal",
+}
+
+# Extra phrasings routed to vector fields, on top of their FIELD_TOOLS keywords
+EXTRA_KEYWORDS = {
+    "plot_type": [
+        "bar chart", "bar plot", "vertical bar", "horizontal bar", "stacked bar", "grouped bar",
+        "line chart", "area chart", "bubble chart", "donut", "treemap", "choropleth", "boxplot",
+        "violin", "dot plot", "lollipop", "ridgeline", "sankey", "network", "streamgraph", "map",
+    ],
+    "statistical_methods": ["trend line", "regression line", "confidence interval", "smoothing"],
+    "layout": ["faceted", "small multiples", "subplots", "panels"],
+}
+
+# Filter field -> cue words (required for ambiguous values) and canonical value -> phrasings
+CONTROLLED_VOCABULARY = {
+    "background_type": {
+        "cues": ["background", "theme", "mode"],
+        "values": {"dark": ["dark", "black"], "light": ["light", "white"]},
+        "ambiguous": {"dark", "light", "black", "white"},
+    },
+    "grid_orientation": {
+        "cues": ["grid", "gridline", "grid line"],
+        "values": {"horizontal": ["horizontal"], "vertical": ["vertical"], "both": ["both"], "radial": ["radial"]},
+        "ambiguous": {"horizontal", "vertical", "both", "radial"},
+    },
+    "grid_style": {
+        "cues": ["grid", "gridline", "grid line"],
+        "values": {"solid": ["solid"], "dashed": ["dashed"], "dotted": ["dotted"]},
+        "ambiguous": {"solid", "dashed", "dotted"},
+    },
+    "coordinate_type": {
+        "cues": ["coordinate", "coordinate system", "projection"],
+        "values": {"polar": ["polar"], "cartesian": ["cartesian"]},
+        "ambiguous": set(),
+    },
+    "palette_type": {
+        "cues": ["palette", "color", "colour", "colormap", "color scheme", "color scale"],
+        "values": {
+            "sequential": ["sequential"],
+            "diverging": ["diverging"],
+            "qualitative": ["qualitative"],
+            "monochrome": ["monochrome", "monochromatic"],
+        },
+        "ambiguous": {"sequential", "diverging"},
+    },
+    "readability_assessment": {
+        "cues": ["readability", "readable", "legible"],
+        "values": {"high": ["high"], "medium": ["medium"], "low": ["low"]},
+        "ambiguous": {"high", "medium", "low"},
+    },
+}
+
+FILTER_CONFIDENCE = 0.9
+MAX_VECTOR_HITS = 2
+
+_WORD_RE = re.compile(r"[a-z0-9]+")
+
+
+def _stem(token):
+    if len(token) > 3 and token.endswith("s") and not token.endswith("ss"):
+        return token[:-1]
+    return token
+
+
+def normalize_tokens(text):
+    """Lowercase word tokens with a light plural strip, shared by keywords and queries."""
+    return [_stem(t) for t in _WORD_RE.findall(str(text or "").lower())]
+
+
+class KeywordAutomaton:
+    """Aho-Corasick automaton over token sequences; ``search`` yields (start, end, payload)."""
+
+    def __init__(self):
+        self._goto = [{}]
+        self._fail = [0]
+        self._out = [[]]
+
+    def add(self, tokens, payload):
+        node = 0
+        for token in tokens:
+            nxt = self._goto[node].get(token)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[node][token] = nxt
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append([])
+            node = nxt
+        self._out[node].append((len(tokens), payload))
+
+    def build(self):
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for token, child in self._goto[node].items():
+                queue.append(child)
+                fail = self._fail[node]
+                while fail and token not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[child] = self._goto[fail][token] if node and token in self._goto[fail] else 0
+                self._out[child] = self._out[child] + self._out[self._fail[child]]
+        return self
+
+    def search(self, tokens):
+        node = 0
+        for end, token in enumerate(tokens, 1):
+            while node and token not in self._goto[node]:
+                node = self._fail[node]
+            node = self._goto[node].get(token, 0)
+            for length, payload in self._out[node]:
+                yield end - length, end, payload
+
+
+@dataclass
+class Route:
+    hits: list = field(default_factory=list)  # (field, query, confidence)
+    confidence: float = 0.0
+
+
+class ToolRouter:
+    def __init__(self, field_tools, vocabulary=CONTROLLED_VOCABULARY, extra_keywords=EXTRA_KEYWORDS):
+        self.automaton = KeywordAutomaton()
+        self.field_order = {name: i for i, name in enumerate(field_tools)}
+        keywords = {}
+        for name, config in field_tools.items():
+            if config.get("type") != "vector":
+                continue
+            phrases = list(config.get("keywords", [])) + list(extra_keywords.get(name, []))
+            for phrase in phrases:
+                tokens = tuple(normalize_tokens(phrase))
+                if tokens:
+                    keywords.setdefault(name, set()).add(tokens)
+        for name, phrases in keywords.items():
+            for tokens in phrases:
+                weight = 0.8 if len(tokens) > 1 else 0.6
+                if len(tokens) == 1 and tokens[0] in GENERIC_KEYWORDS:
+                    weight = 0.15
+                self.automaton.add(tokens, ("vector", name, weight))
+
+        self.vocabulary = {name: spec for name, spec in vocabulary.items() if name in field_tools}
+        for name, spec in self.vocabulary.items():
+            for cue in spec["cues"]:
+                self.automaton.add(normalize_tokens(cue), ("cue", name, None))
+            for value, phrases in spec["values"].items():
+                for phrase in phrases:
+                    self.automaton.add(normalize_tokens(phrase), ("value", name, (value, phrase in spec["ambiguous"])))
+        self.automaton.build()
+
+    def route(self, query: str) -> Route:
+        words = _WORD_RE.findall(str(query or "").lower())
+        tokens = [_stem(w) for w in words]
+        matches = list(self.automaton.search(tokens))
+        cues = {name for _, _, (kind, name, _) in matches if kind == "cue"}
+
+        filter_hits, filter_spans = {}, set()
+        for start, end, (kind, name, data) in matches:
+            if kind != "value":
+                continue
+            value, ambiguous = data
+            if ambiguous and name not in cues:
+                continue
+            filter_hits.setdefault(name, value)
+            filter_spans.update(range(start, end))
+        for start, end, (kind, name, _) in matches:
+            if kind == "cue" and name in filter_hits:
+                filter_spans.update(range(start, end))
+
+        vector_scores, vector_spans, covered = {}, {}, set(filter_spans)
+        for start, end, (kind, name, weight) in matches:
+            if kind != "vector" or filter_spans.intersection(range(start, end)):
+                continue
+            vector_scores.setdefault(name, []).append(weight)
+            vector_spans.setdefault(name, set()).update(range(start, end))
+            covered.update(range(start, end))
+        confidences = {}
+        for name, weights in vector_scores.items():
+            miss = 1.0
+            for weight in weights:
+                miss *= 1.0 - weight
+            confidences[name] = 1.0 - miss
+
+        content = [i for i, t in enumerate(tokens) if t not in NEUTRAL_WORDS]
+        coverage = sum(1 for i in content if i in covered) / len(content) if content else 0.0
+
+        hits = [(name, value, FILTER_CONFIDENCE) for name, value in filter_hits.items()]
+        # Best field first, ties in FIELD_TOOLS order; a further field only for a distinct part of the query
+        ranked = sorted(confidences, key=lambda name: (-confidences[name], self.field_order[name]))
+        vector_query = " ".join(w for i, w in enumerate(words) if i not in filter_spans and tokens[i] not in NEUTRAL_WORDS)
+        used = set()
+        for name in ranked if vector_query else []:
+            if len(used) and (vector_spans[name] & used or confidences[name] < 0.5):
+                continue
+            hits.append((name, vector_query, confidences[name]))
+            used |= vector_spans[name]
+            if sum(1 for h in hits if h[0] in confidences) == MAX_VECTOR_HITS:
+                break
+        if not hits:
+            return Route()
+        return Route(hits=hits, confidence=sum(h[2] for h in hits) / len(hits) * coverage)
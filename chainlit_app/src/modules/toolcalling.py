@@ -1,31 +1,34 @@
 import json
 from weaviate.classes.query import MetadataQuery, Filter
-from openai import OpenAI
+from openai import AsyncOpenAI
 from dataclasses import dataclass
 import json
 from dataclasses import dataclass
 from typing import List
 import os
-# ====== Initialize Clients ======
-client = OpenAI(
-    api_key = os.getenv("OPENAI_API_KEY"), 
-    base_url = "https://api.moonshot.ai/v1",
+import asyncio
+import hashlib
+import logging
+from modules.local_reranker import KEYWORDS_PROPERTY
+from modules.rank_fusion import reciprocal_rank_fusion, object_uuid
+from modules.tracing import span, increment, register_cache, register_gauge
+from modules.tool_router import ToolRouter
+from modules.cache import make_cache
+from modules.facet_stats import FacetStats
+from rag.feature_store import get_feature_store, FACET_COLUMNS
+from rag.hydration import CANDIDATE_PROPERTIES
+from llm_utils import normalize_query
+from app_config import (
+    CACHE_DIR, TOOL_ROUTER_MIN_CONFIDENCE, TOOL_CALL_CACHE_BACKEND, TOOL_CALL_CACHE_SIZE, TOOL_CALL_CACHE_TTL,
+    TWO_PHASE_RETRIEVAL
 )
 
-# Weaviate client
-import weaviate
-from typing import List, Dict
-def detect_tools_and_execute(llm_client, user_query: str, weaviate_client):
-    """
-    Detects tools and executes combined search with vectors and filters
-    """
-    tools = generate_tools()
-    resp = llm_client.chat.completions.create(
-        model="kimi-k2-0711-preview",
-        messages=[
-            {
-                "role": "system", 
-                "content": """You are a data visualization search assistant. Your task is to analyze user queries and call the MOST RELEVANT search function.
+logger = logging.getLogger(__name__)
+
+SEARCH_LIMIT = 100
+TOOL_MODEL = "kimi-k2-0711-preview"
+
+TOOL_SELECTION_PROMPT = """You are a data visualization search assistant. Your task is to analyze user queries and call the MOST RELEVANT search function.
 
 IMPORTANT RULES:
 1. Call ONLY ONE function unless the user explicitly mentions MULTIPLE DISTINCT aspects
@@ -42,6 +45,75 @@ EXAMPLES:
 - "faceted visualization" → ONLY call search_layout("faceted visualization")
 
 For broad conceptual queries, use the most appropriate single search function and let semantic search find relevant matches."""
+
+tool_call_cache = make_cache(
+    TOOL_CALL_CACHE_BACKEND,
+    maxsize=TOOL_CALL_CACHE_SIZE,
+    ttl=TOOL_CALL_CACHE_TTL,
+    path=os.path.join(CACHE_DIR, "tool_calls.sqlite"),
+    table="tool_calls"
+)
+register_cache("tool_call", tool_call_cache)
+
+# ====== Initialize Clients ======
+client = AsyncOpenAI(
+    api_key = os.getenv("OPENAI_API_KEY"), 
+    base_url = "https://api.moonshot.ai/v1",
+)
+
+# Weaviate client
+import weaviate
+from typing import List, Dict
+async def detect_tools_and_execute(llm_client, user_query: str, weaviate_client):
+    """
+    Detects tools and executes combined search with vectors and filters
+    """
+    with span("detect_tools_and_execute") as trace:
+        route = tool_router.route(user_query)
+        trace.set_attribute("router_confidence", round(route.confidence, 3))
+        if route.hits and route.confidence >= TOOL_ROUTER_MIN_CONFIDENCE:
+            hits = [_make_hit(field, query, confidence) for field, query, confidence in route.hits]
+            trace.set_attribute("router", "local")
+            increment("tool_router_local")
+        else:
+            hits = await _detect_tools_cached(llm_client, user_query, trace)
+            trace.set_attribute("router", "llm")
+            increment("tool_router_llm")
+        trace.set_attribute("hits", len(hits))
+
+        # Execute combined search
+        results = await execute_combined_search(weaviate_client, hits, user_query)
+        trace.set_attribute("candidates", len(results))
+    return hits, results
+
+
+def tool_call_cache_key(user_query: str) -> str:
+    """Normalized query plus a digest of everything the LLM decides from: model, prompt and tool schema."""
+    schema = json.dumps([TOOL_MODEL, TOOL_SELECTION_PROMPT, generate_tools()], sort_keys=True)
+    payload = json.dumps([normalize_query(user_query), hashlib.sha256(schema.encode("utf-8")).hexdigest()])
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+async def _detect_tools_cached(llm_client, user_query: str, trace) -> List["ToolHit"]:
+    cache_key = tool_call_cache_key(user_query)
+    cached = tool_call_cache.get(cache_key)
+    trace.set_attribute("tool_cache_hit", cached is not None)
+    if cached is not None:
+        return [_make_hit(hit["field"], hit["query"]) for hit in cached]
+    hits = await _detect_tools(llm_client, user_query, trace)
+    tool_call_cache.set(cache_key, [{"field": hit.field, "query": hit.query} for hit in hits])
+    return hits
+
+
+async def _detect_tools(llm_client, user_query: str, trace) -> List["ToolHit"]:
+    """Ask the LLM which search_* tools the query calls for and turn the calls into ToolHits."""
+    tools = generate_tools()
+    resp = await llm_client.chat.completions.create(
+        model=TOOL_MODEL,
+        messages=[
+            {
+                "role": "system", 
+                "content": TOOL_SELECTION_PROMPT
             },
             {
                 "role": "user", 
@@ -53,6 +125,7 @@ For broad conceptual queries, use the most appropriate single search function an
         temperature=0
     )
     
+    trace.set_usage(resp)
     msg = resp.choices[0].message
     hits = []
     
@@ -66,25 +139,27 @@ For broad conceptual queries, use the most appropriate single search function an
             else:
                 continue
             
-            config = FIELD_TOOLS.get(field, {})
-            field_type = config.get("type", "vector")
-            
-            hit = ToolHit(
-                field=field,
-                query=args.get("query", ""),
-                field_type=field_type
-            )
-            
-            if field_type == "vector":
-                hit.vector = VECTOR_NAME_MAP.get(field, f"{field}_vector")
-            elif field_type == "filter":
-                hit.filter_field = config.get("field_name", field)
-            
-            hits.append(hit)
-    
-    # Execute combined search
-    results = execute_combined_search(weaviate_client, hits, user_query)
-    return hits, results
+            hits.append(_make_hit(field, args.get("query", "")))
+    return hits
+
+
+def _make_hit(field: str, query: str, confidence: float = None) -> "ToolHit":
+    config = FIELD_TOOLS.get(field, {})
+    field_type = config.get("type", "vector")
+
+    hit = ToolHit(
+        field=field,
+        query=query,
+        field_type=field_type,
+        confidence=confidence
+    )
+
+    if field_type == "vector":
+        hit.vector = VECTOR_NAME_MAP.get(field, f"{field}_vector")
+    elif field_type == "filter":
+        hit.filter_field = config.get("field_name", field)
+    return hit
+
 # Field definitions + trigger keyword hints
 FIELD_TOOLS = {
     # Vectorized fields
@@ -222,6 +297,15 @@ FIELD_TOOLS = {
     }
 }
 
+tool_router = ToolRouter(FIELD_TOOLS)
+
+# Value and pair counts of the filter fields, to drop filter combinations that match nothing
+facet_stats = FacetStats([
+    config["field_name"] for config in FIELD_TOOLS.values()
+    if config.get("type") == "filter" and config["field_name"] in FACET_COLUMNS
+])
+register_gauge("facet_stats", facet_stats.stats)
+
 # Map field names to their corresponding vector names
 VECTOR_NAME_MAP = {
     "data_types": "section_1_data_and_variable_types_vector",
@@ -277,9 +361,14 @@ class ToolHit:
     vector: str = None
     filter_field: str = None
     results: list = None
-def execute_combined_search(weaviate_client, hits: List[ToolHit], original_query: str):
+    confidence: float = None  # set by the local router; None for LLM-chosen hits
+async def execute_combined_search(weaviate_client, hits: List[ToolHit], original_query: str):
     """
     Execute search with a combination of vector queries and filters.
+
+    Every vector hit is queried concurrently against its own named vector with the
+    shared filter; the result lists are merged with reciprocal-rank fusion and
+    deduplicated by UUID.
     """
     print(f"\n--- [DEBUG] Executing Combined Search ---")
     print(f"Original Query: '{original_query}'")
@@ -291,18 +380,17 @@ def execute_combined_search(weaviate_client, hits: List[ToolHit], original_query
     print(f"Vector Hits: {len(vector_hits)}")
     print(f"Filter Hits: {len(filter_hits)}")
 
-    # Determine the primary vector search
+    # One near_text per vector hit, each against its own named vector
     if vector_hits:
-        primary_vector_target = vector_hits[0].vector
-        query_text = vector_hits[0].query
-        print(f"Using VECTOR hit for search. Target Vector: '{primary_vector_target}', Query: '{query_text}'")
+        searches = [(hit.vector, hit.query) for hit in vector_hits]
+        for target_vector, query_text in searches:
+            print(f"Using VECTOR hit for search. Target Vector: '{target_vector}', Query: '{query_text}'")
     else:
-        primary_vector_target = "section_11_description_vector"
-        query_text = original_query
-        print(f"Using DEFAULT vector search. Target Vector: '{primary_vector_target}', Query: '{query_text}'")
+        searches = [("section_11_description_vector", original_query)]
+        print(f"Using DEFAULT vector search. Target Vector: '{searches[0][0]}', Query: '{original_query}'")
 
     # Build filters with robust value mapping
-    filters_list = []
+    resolved_filters = []
     for hit in filter_hits:
         query_value = hit.query.lower().strip()
         filter_field = hit.filter_field
@@ -319,8 +407,27 @@ def execute_combined_search(weaviate_client, hits: List[ToolHit], original_query
                 continue
         
         print(f"Creating FILTER: Field='{filter_field}', Value='{filter_value}' (from query='{query_value}')")
-        filters_list.append(Filter.by_property(filter_field).equal(filter_value))
+        resolved_filters.append((filter_field, filter_value, hit.confidence))
 
+    # Drop filters that match nothing, alone or together, before they cost a query
+    try:
+        store = get_feature_store()
+        if facet_stats.is_stale(store):
+            await asyncio.to_thread(facet_stats.refresh_from_store, store)
+        resolved_filters, dropped_filters = facet_stats.prune(resolved_filters)
+    except Exception as e:
+        logger.warning(f"Facet stats unavailable, keeping every filter: {e}")
+        increment("facet_stats_unavailable")
+        dropped_filters = []
+    for filter_field, filter_value, _, reason in dropped_filters:
+        print(f"Dropping FILTER: Field='{filter_field}', Value='{filter_value}' ({reason})")
+        increment("facet_filter_dropped")
+
+    filters_list = []
+    filter_values = {}
+    for filter_field, filter_value, _ in resolved_filters:
+        filters_list.append(Filter.by_property(filter_field).equal(filter_value))
+        filter_values.setdefault(filter_field, set()).add(filter_value)
 
     # Combine all filters using a logical AND
     combined_filter = None
@@ -330,33 +437,59 @@ def execute_combined_search(weaviate_client, hits: List[ToolHit], original_query
     else:
         print("No filters were applied.")
 
+    # Ensure the filtered field is returned for debugging
+    return_props = ["image_url", "section_11_description", "post_title", "post_url", "image_description", "external_link", "background_type", KEYWORDS_PROPERTY]
+
+    # Filter-only searches are plain facet lookups; answer them from the local feature store
+    if not vector_hits and filter_values and get_feature_store().available():
+        try:
+            with span("combined_search.feature_store", filters=len(filters_list)):
+                # The filters are ANDed, so two values for one field match nothing
+                if any(len(values) > 1 for values in filter_values.values()):
+                    objects = []
+                else:
+                    objects = get_feature_store().query(filter_values, limit=SEARCH_LIMIT, return_properties=return_props)
+            print(f"Found {len(objects)} results in the feature store.")
+            return objects
+        except Exception as e:
+            print(f"Feature store query failed, falling back to Weaviate: {e}")
+
+    # With two-phase retrieval the display properties are hydrated when a page is shown
+    query_props = CANDIDATE_PROPERTIES + ["background_type"] if TWO_PHASE_RETRIEVAL else return_props
+
     try:
-        # Ensure the filtered field is returned for debugging
-        return_props = ["image_url", "section_11_description", "post_title", "post_url", "image_description", "external_link", "background_type"]
-        
-        collection = weaviate_client.collections.get("dviz_c_structured_v3")
-        results = collection.query.near_text(
-            query=query_text,
-            limit=100,
-            target_vector=primary_vector_target,
-            filters=combined_filter,
-            return_metadata=MetadataQuery(distance=True),
-            return_properties=return_props
-        )
-        
-        print(f"Weaviate search executed successfully.")
-        
-        if hasattr(results, 'objects'):
-            print(f"Found {len(results.objects)} results from Weaviate.")
-            # Log the background type of the first few results to check the data
-            for i, obj in enumerate(results.objects[:3]):
-                bg_type = obj.properties.get("background_type", "N/A")
-                print(f"  - Result {i+1} background_type: '{bg_type}'")
-            return results.objects
-        else:
-            print("Weaviate response did not contain 'objects'.")
+        with span("combined_search.weaviate", vectors=len(searches), filters=len(filters_list)):
+            responses = await asyncio.gather(*(
+                weaviate_client.query_near_text(
+                    query_text=query_text,
+                    collection_name="dviz_c_structured_v3",
+                    limit=SEARCH_LIMIT,
+                    target_vector=target_vector,
+                    filters=combined_filter,
+                    return_metadata=MetadataQuery(distance=True),
+                    return_properties=query_props
+                )
+                for target_vector, query_text in searches
+            ), return_exceptions=True)
+
+        rankings = []
+        for (target_vector, _), response in zip(searches, responses):
+            if isinstance(response, Exception):
+                print(f"!!!!!! WEAVIATE SEARCH ERROR on '{target_vector}': {response} !!!!!!")
+                continue
+            rankings.append(getattr(response, "objects", None) or [])
+        if not rankings:
             return []
-        
+        print(f"Weaviate search executed successfully ({len(rankings)}/{len(searches)} vectors).")
+
+        objects = reciprocal_rank_fusion(rankings, key=object_uuid)[:SEARCH_LIMIT]
+        print(f"Found {len(objects)} fused results from Weaviate.")
+        # Log the background type of the first few results to check the data
+        for i, obj in enumerate(objects[:3]):
+            bg_type = obj.properties.get("background_type", "N/A")
+            print(f"  - Result {i+1} background_type: '{bg_type}'")
+        return objects
+
     except Exception as e:
         print(f"!!!!!! WEAVIATE SEARCH ERROR: {e} !!!!!!")
         return []
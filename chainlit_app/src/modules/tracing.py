@@ -0,0 +1,159 @@
+import time
+import uuid
+import logging
+import threading
+import contextvars
+from collections import deque
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+HISTOGRAM_WINDOW = 2048  # latency samples kept per stage
+QUANTILES = (0.5, 0.95, 0.99)
+
+_trace_id = contextvars.ContextVar("trace_id", default=None)
+_lock = threading.Lock()
+_histograms = {}
+_counters = {}
+_gauges = {}
+
+
+class LatencyHistogram:
+    """Sliding window of latency samples plus running totals."""
+
+    def __init__(self, window=HISTOGRAM_WINDOW):
+        self.samples = deque(maxlen=window)
+        self.count = 0
+        self.total = 0.0
+        self.errors = 0
+
+    def observe(self, seconds, error=False):
+        self.samples.append(seconds)
+        self.count += 1
+        self.total += seconds
+        if error:
+            self.errors += 1
+
+    def quantile(self, q):
+        if not self.samples:
+            return 0.0
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+class Span:
+    def __init__(self, name, attributes):
+        self.name = name
+        self.trace_id = _trace_id.get()
+        self.attributes = dict(attributes)
+        self.duration = None
+
+    def set_attribute(self, key, value):
+        self.attributes[key] = value
+
+    def set_usage(self, response):
+        """Record token usage from an OpenAI-compatible response."""
+        usage = getattr(response, "usage", None)
+        if usage is not None:
+            self.attributes["tokens"] = self.attributes.get("tokens", 0) + (getattr(usage, "total_tokens", 0) or 0)
+
+
+def start_trace():
+    """Start a trace for one request; spans opened in this context share its id."""
+    trace_id = uuid.uuid4().hex[:12]
+    _trace_id.set(trace_id)
+    return trace_id
+
+
+@contextmanager
+def span(name, **attributes):
+    """Time a pipeline stage and add it to the stage's latency histogram."""
+    current = Span(name, attributes)
+    start = time.perf_counter()
+    error = False
+    try:
+        yield current
+    except BaseException:
+        error = True
+        raise
+    finally:
+        current.duration = time.perf_counter() - start
+        with _lock:
+            _histograms.setdefault(name, LatencyHistogram()).observe(current.duration, error)
+        logger.info(
+            f"[trace {current.trace_id}] {name} {current.duration * 1000:.1f}ms "
+            f"{current.attributes}{' ERROR' if error else ''}"
+        )
+
+
+def increment(name, value=1):
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + value
+
+
+def register_gauge(name, fn):
+    """``fn`` returns a number, or a dict of label value -> number, at scrape time."""
+    _gauges[name] = fn
+
+
+def register_cache(name, cache):
+    """Expose a cache's CacheStats as gauges."""
+    register_gauge(f"{name}_cache", lambda: cache.stats.to_dict())
+
+
+def snapshot():
+    with _lock:
+        stages = {
+            name: {
+                "count": hist.count,
+                "errors": hist.errors,
+                "sum_seconds": hist.total,
+                **{f"p{int(q * 100)}": hist.quantile(q) for q in QUANTILES},
+            }
+            for name, hist in _histograms.items()
+        }
+        counters = dict(_counters)
+    gauges = {}
+    for name, fn in _gauges.items():
+        try:
+            gauges[name] = fn()
+        except Exception as e:
+            logger.warning(f"Gauge {name} failed: {e}")
+    return {"stages": stages, "counters": counters, "gauges": gauges}
+
+
+def render_prometheus():
+    """Prometheus text exposition of stage latencies, counters and gauges."""
+    data = snapshot()
+    lines = [
+        "# HELP search_stage_latency_seconds Latency of search pipeline stages",
+        "# TYPE search_stage_latency_seconds summary",
+    ]
+    for name, stats in sorted(data["stages"].items()):
+        for q in QUANTILES:
+            lines.append(f'search_stage_latency_seconds{{stage="{name}",quantile="{q}"}} {stats[f"p{int(q * 100)}"]:.6f}')
+        lines.append(f'search_stage_latency_seconds_sum{{stage="{name}"}} {stats["sum_seconds"]:.6f}')
+        lines.append(f'search_stage_latency_seconds_count{{stage="{name}"}} {stats["count"]}')
+        lines.append(f'search_stage_errors_total{{stage="{name}"}} {stats["errors"]}')
+    for name, value in sorted(data["counters"].items()):
+        lines.append(f"# TYPE {name}_total counter")
+        lines.append(f"{name}_total {value}")
+    for name, value in sorted(data["gauges"].items()):
+        lines.append(f"# TYPE {name} gauge")
+        if isinstance(value, dict):
+            for label, number in value.items():
+                lines.append(f'{name}{{stat="{label}"}} {number}')
+        else:
+            lines.append(f"{name} {value}")
+    return "\n".join(lines) + "\n"
+
+
+def install_metrics_endpoint(app, path="/metrics"):
+    """Add a scrape endpoint to the Chainlit FastAPI app, ahead of its catch-all frontend route."""
+    from fastapi.responses import PlainTextResponse
+
+    async def metrics():
+        return PlainTextResponse(render_prometheus(), media_type="text/plain; version=0.0.4")
+
+    app.add_api_route(path, metrics, methods=["GET"], include_in_schema=False)
+    app.router.routes.insert(0, app.router.routes.pop())
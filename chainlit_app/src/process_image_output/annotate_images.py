@@ -0,0 +1,259 @@
+"""
+Bulk VLM annotation of chart images with IMAGE_PROMPT.
+
+Reads a manifest of image URLs or local paths, one per line (.txt), or records with
+an "image_url" field (.jsonl, .csv) whose other fields are carried into the journal.
+Requests run with bounded concurrency behind request and token buckets, and transient
+failures are retried with exponential backoff. Every result is appended to a JSONL
+journal; a rerun skips images already annotated there, so a stopped job resumes without
+paying twice. The journal is the input of process_output_df.
+
+    cd src && python -m process_image_output.annotate_images manifest.jsonl --journal annotations.jsonl
+"""
+import os
+import csv
+import json
+import time
+import random
+import asyncio
+import argparse
+from pathlib import Path
+import httpx
+import openai
+from openai import AsyncOpenAI
+from app_config import (
+    QWEN_VL_API_KEY, QWEB_VL_BASE_URL, ANNOTATE_MODEL, ANNOTATE_CONCURRENCY, ANNOTATE_REQUESTS_PER_MINUTE,
+    ANNOTATE_TOKENS_PER_MINUTE, ANNOTATE_MAX_RETRIES, VLM_PRICE_INPUT_PER_M, VLM_PRICE_OUTPUT_PER_M
+)
+from prompts.image_prompts import IMAGE_PROMPT
+from modules.image_utils import prepare_image_async, image_bytes_to_base64
+from modules.http_fetcher import get_image_fetcher
+
+RETRYABLE_ERRORS = (
+    openai.RateLimitError, openai.APITimeoutError, openai.APIConnectionError, openai.InternalServerError,
+    httpx.TransportError,
+)
+
+
+class TokenBucket:
+    """Refills ``rate`` tokens per second up to ``capacity``; ``acquire`` waits until enough are available."""
+
+    def __init__(self, rate: float, capacity: float = None):
+        self.rate = rate
+        self.capacity = capacity or max(1.0, rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self, amount: float = 1.0):
+        if self.rate <= 0:
+            return
+        async with self._lock:
+            self._refill()
+            while self.tokens < min(amount, self.capacity):
+                await asyncio.sleep((min(amount, self.capacity) - self.tokens) / self.rate)
+                self._refill()
+            self.tokens -= amount
+
+    def consume(self, amount: float):
+        """Charge tokens after the fact (e.g. actual usage); the balance may go negative."""
+        if self.rate > 0:
+            self._refill()
+            self.tokens -= amount
+
+
+def read_manifest(path):
+    """Yield manifest records, each a dict with at least "image_url"."""
+    ext = os.path.splitext(path)[1]
+    with open(path, encoding="utf-8", newline="") as f:
+        if ext == ".jsonl":
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+        elif ext == ".csv":
+            yield from csv.DictReader(f)
+        else:
+            for line in f:
+                if line.strip() and not line.startswith("#"):
+                    yield {"image_url": line.strip()}
+
+
+def read_journal(path):
+    """Image URLs already annotated successfully."""
+    done = set()
+    if os.path.exists(path):
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    continue  # a torn last line from an interrupted run
+                if entry.get("status") == "ok":
+                    done.add(entry["image_url"])
+    return done
+
+
+def _retry_after(error):
+    response = getattr(error, "response", None)
+    value = response.headers.get("Retry-After") if response is not None else None
+    try:
+        return float(value) if value else None
+    except ValueError:
+        return None
+
+
+class AnnotationRunner:
+    def __init__(self, client, journal_path, model=ANNOTATE_MODEL, prompt=IMAGE_PROMPT,
+                 concurrency=ANNOTATE_CONCURRENCY, requests_per_minute=ANNOTATE_REQUESTS_PER_MINUTE,
+                 tokens_per_minute=ANNOTATE_TOKENS_PER_MINUTE, max_retries=ANNOTATE_MAX_RETRIES,
+                 price_input=VLM_PRICE_INPUT_PER_M, price_output=VLM_PRICE_OUTPUT_PER_M):
+        self.client = client
+        self.journal_path = journal_path
+        self.model = model
+        self.prompt = prompt
+        self.concurrency = concurrency
+        self.requests = TokenBucket(requests_per_minute / 60.0, capacity=max(1.0, concurrency))
+        self.tokens = TokenBucket(tokens_per_minute / 60.0, capacity=tokens_per_minute)
+        self.max_retries = max_retries
+        self.price_input = price_input
+        self.price_output = price_output
+        self.stats = {"ok": 0, "error": 0, "skipped": 0, "retries": 0, "prompt_tokens": 0, "completion_tokens": 0}
+
+    async def _load_image(self, location):
+        if location.startswith(("http://", "https://")):
+            return await get_image_fetcher().fetch(location)
+        return await asyncio.to_thread(Path(location).read_bytes)
+
+    async def _call(self, img_base64):
+        for attempt in range(self.max_retries + 1):
+            await self.requests.acquire()
+            try:
+                return await self.client.chat.completions.create(
+                    model=self.model,
+                    messages=[{
+                        "role": "user",
+                        "content": [
+                            {"type": "image_url", "image_url": {"url": f"data:image/jpeg;base64,{img_base64}"}},
+                            {"type": "text", "text": self.prompt}
+                        ]
+                    }]
+                ), attempt
+            except RETRYABLE_ERRORS as e:
+                if attempt == self.max_retries:
+                    raise
+                self.stats["retries"] += 1
+                delay = _retry_after(e) or min(60.0, 2.0 ** attempt) * (0.5 + random.random())
+                print(f"{type(e).__name__}, retrying in {delay:.1f}s")
+                await asyncio.sleep(delay)
+
+    async def annotate(self, record):
+        started = time.perf_counter()
+        entry = dict(record, model=self.model)
+        try:
+            raw_bytes = await self._load_image(record["image_url"])
+            prepared = await prepare_image_async(raw_bytes)
+            await self.tokens.acquire(0)  # wait out any token debt from earlier responses
+            response, attempt = await self._call(image_bytes_to_base64(prepared.data))
+            usage = getattr(response, "usage", None)
+            prompt_tokens = getattr(usage, "prompt_tokens", 0) or 0
+            completion_tokens = getattr(usage, "completion_tokens", 0) or 0
+            self.tokens.consume(prompt_tokens + completion_tokens)
+            self.stats["prompt_tokens"] += prompt_tokens
+            self.stats["completion_tokens"] += completion_tokens
+            entry.update(
+                status="ok",
+                output=response.choices[0].message.content,
+                usage={"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens},
+                attempts=attempt + 1
+            )
+            self.stats["ok"] += 1
+        except Exception as e:
+            entry.update(status="error", error=f"{type(e).__name__}: {e}")
+            self.stats["error"] += 1
+        entry["latency_s"] = round(time.perf_counter() - started, 3)
+        return entry
+
+    async def run(self, records):
+        done = read_journal(self.journal_path)
+        queue = asyncio.Queue(maxsize=self.concurrency * 2)
+        started = time.perf_counter()
+
+        async def worker(journal):
+            while True:
+                record = await queue.get()
+                try:
+                    if record is None:
+                        return
+                    entry = await self.annotate(record)
+                    journal.write(json.dumps(entry, ensure_ascii=False, default=str) + "\n")
+                    journal.flush()
+                    finished = self.stats["ok"] + self.stats["error"]
+                    if finished % 50 == 0:
+                        print(self.progress(time.perf_counter() - started))
+                finally:
+                    queue.task_done()
+
+        with open(self.journal_path, "a", encoding="utf-8") as journal:
+            workers = [asyncio.create_task(worker(journal)) for _ in range(self.concurrency)]
+            for record in records:
+                if record.get("image_url") in done:
+                    self.stats["skipped"] += 1
+                    continue
+                await queue.put(record)
+            for _ in workers:
+                await queue.put(None)
+            await asyncio.gather(*workers)
+        await get_image_fetcher().aclose()
+        return self.report(time.perf_counter() - started)
+
+    def cost(self):
+        return (self.stats["prompt_tokens"] * self.price_input + self.stats["completion_tokens"] * self.price_output) / 1e6
+
+    def progress(self, elapsed):
+        finished = self.stats["ok"] + self.stats["error"]
+        return f"{finished} annotated ({self.stats['error']} errors), {finished / max(elapsed, 1e-9):.2f} images/s, ${self.cost():.4f}"
+
+    def report(self, elapsed):
+        finished = self.stats["ok"] + self.stats["error"]
+        return {
+            **self.stats,
+            "elapsed_s": round(elapsed, 1),
+            "images_per_s": round(finished / max(elapsed, 1e-9), 3),
+            "tokens_per_s": round((self.stats["prompt_tokens"] + self.stats["completion_tokens"]) / max(elapsed, 1e-9), 1),
+            "cost_usd": round(self.cost(), 4),
+            "cost_per_image_usd": round(self.cost() / self.stats["ok"], 6) if self.stats["ok"] else 0.0,
+        }
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("manifest", help=".txt (one URL or path per line), .jsonl or .csv with an image_url field")
+    parser.add_argument("--journal", default="annotations.jsonl")
+    parser.add_argument("--model", default=ANNOTATE_MODEL)
+    parser.add_argument("--concurrency", type=int, default=ANNOTATE_CONCURRENCY)
+    parser.add_argument("--rpm", type=float, default=ANNOTATE_REQUESTS_PER_MINUTE, help="requests per minute")
+    parser.add_argument("--tpm", type=float, default=ANNOTATE_TOKENS_PER_MINUTE, help="tokens per minute, 0 for no limit")
+    parser.add_argument("--max-retries", type=int, default=ANNOTATE_MAX_RETRIES)
+    parser.add_argument("--price-input", type=float, default=VLM_PRICE_INPUT_PER_M, help="USD per 1M prompt tokens")
+    parser.add_argument("--price-output", type=float, default=VLM_PRICE_OUTPUT_PER_M, help="USD per 1M completion tokens")
+    return parser.parse_args(argv)
+
+
+async def main(args):
+    client = AsyncOpenAI(api_key=QWEN_VL_API_KEY, base_url=QWEB_VL_BASE_URL)
+    runner = AnnotationRunner(
+        client, args.journal, model=args.model, concurrency=args.concurrency, requests_per_minute=args.rpm,
+        tokens_per_minute=args.tpm, max_retries=args.max_retries, price_input=args.price_input,
+        price_output=args.price_output
+    )
+    return await runner.run(read_manifest(args.manifest))
+
+
+if __name__ == "__main__":
+    report = asyncio.run(main(parse_args()))
+    print(json.dumps(report, indent=2))
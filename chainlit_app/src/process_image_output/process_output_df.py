@@ -1,5 +1,15 @@
+import os
 import re
+import glob
+import json
+import time
+import argparse
+from functools import partial
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
 import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
 from typing import List, Dict
 
 SECTION_ORDER = [
@@ -24,114 +34,233 @@ SECTION_ORDER = [
     "Section_19_Description",
 ]
 
+_DELIMITER_RE = re.compile(r"%%%+")
+_HEADER_RE = re.compile(r"(Section_[0-9]+_[A-Za-z0-9_]+)")
+_KEYWORD_SEPARATOR_RE = re.compile(r"[,@;]+")
+
+TYPOGRAPHY_FIELDS = ["font_family", "font_type", "font_size", "alignment", "style"]
+
+
+def _split_vals(body: str) -> List[str]:
+    parts = [p for p in (v.strip() for v in body.split('*')) if p]
+    return parts if parts else ["Not implemented"]
+
+
+def _parse_key_values(section, body, parsed, fallback="extra"):
+    # "Key: value * Key: value", one "<section>__<Key>" column per key
+    for entry in _split_vals(body):
+        key, sep, val = entry.partition(':')
+        if sep:
+            parsed[f"{section}__{key.strip().replace(' ', '_')}"] = val.strip()
+        else:
+            parsed[f"{section}__{fallback}"] = entry
+
+
+def _parse_variable_types(section, body, parsed):
+    # "Variable 1: Meth concentration → Continuous * ..."
+    variables = {}
+    for line in body.split('*'):
+        line = line.strip()
+        if ':' not in line:
+            continue
+        var_part, _, type_part = line.partition('→')
+        var_name = var_part.split(':', 1)[1].strip() if ':' in var_part else var_part.strip()
+        variables[var_name] = [t.strip() for t in type_part.split(',') if t.strip()] or ["Not implemented"]
+    parsed[section] = variables
+
+
+def _parse_mapping(section, body, parsed):
+    # "Methamphetamine concentration: color * Population size: circle area"
+    mapping = {}
+    for entry in _split_vals(body):
+        var, sep, enc = entry.partition(':')
+        if sep:
+            mapping[var.strip()] = enc.strip()
+    parsed[section] = mapping
+
+
+def _parse_typography(section, body, parsed):
+    # "Title|Arial|Sans-serif|24px|center|bold * ..."
+    typography = {}
+    for line in body.split('*'):
+        parts = [p.strip() for p in line.strip().split('|')]
+        if len(parts) >= 6:
+            typography[parts[0]] = dict(zip(TYPOGRAPHY_FIELDS, parts[1:6]))
+    parsed[section] = typography
+
+
+def _parse_keywords(section, body, parsed):
+    if '*' in body:
+        parsed[section] = _split_vals(body)
+    else:
+        parsed[section] = [k.strip() for k in _KEYWORD_SEPARATOR_RE.split(body) if k.strip()]
+
+
+def _parse_list(section, body, parsed):
+    parsed[section] = _split_vals(body)
+
+
+_STRING_LIST = pa.list_(pa.string())
+_SPECIAL_SECTIONS = {
+    "Section_1_Plot_Type": (partial(_parse_key_values, fallback="unknown"), None),
+    "Section_2_Data_and_Variable_Types": (_parse_variable_types, pa.map_(pa.string(), _STRING_LIST)),
+    "Section_3_Variable_Mapping": (_parse_mapping, pa.map_(pa.string(), pa.string())),
+    "Section_12_Typography": (
+        _parse_typography, pa.map_(pa.string(), pa.struct([(f, pa.string()) for f in TYPOGRAPHY_FIELDS]))
+    ),
+    "Section_16_Data_Source": (_parse_list, _STRING_LIST),
+    "Section_17_Searchable_Keywords": (_parse_keywords, _STRING_LIST),
+    "Section_19_Description": (_parse_keywords, _STRING_LIST),
+}
+_DEFAULT_SPEC = (_parse_key_values, None)
+
+# Section -> (parser, Arrow type of its column). A None type means the section is
+# flattened into "<section>__<key>" string columns.
+SECTION_SPECS = {name: _SPECIAL_SECTIONS.get(name, _DEFAULT_SPEC) for name in SECTION_ORDER}
+
+
 def parse_llm_visualization_output(text: str) -> Dict[str, any]:
     """
     Parse the structured LLM output into a flat dictionary suitable for DataFrame ingestion.
+
+    Sections are delimited by %%%; the header is either the first line of its chunk or
+    a chunk of its own ("%%% Section_1_Plot_Type %%%") followed by the body.
     """
-    # Split into sections
-    raw_sections = re.split(r"%%%+", text)
     parsed: Dict[str, any] = {}
-    
-    # Helper to clean and split values
-    def split_vals(val_str):
-        parts = [v.strip() for v in val_str.split('*') if v.strip()]
-        return parts if parts else ["Not implemented"]
-    
-    for raw in raw_sections:
-        raw = raw.strip()
-        if not raw:
+    section, body = None, ""
+    for chunk in _DELIMITER_RE.split(text):
+        chunk = chunk.strip()
+        if not chunk:
             continue
-        # Expect section header like "Section_1_Plot_Type"
-        first_line, *rest = raw.splitlines()
-        header_match = re.match(r"(Section_[0-9]+_[A-Za-z0-9_]+)", first_line.strip())
-        if not header_match:
-            continue
-        section_name = header_match.group(1)
-        body = "\n".join(rest).strip()
-        if section_name == "Section_1_Plot_Type":
-            # Primary, Subcategory, Specific
-            # Example line: Primary Category: Spatial & Geospatial * Subcategory: Maps * ...
-            # We'll capture key: value parts separated by '*'
-            entries = split_vals(body)
-            for entry in entries:
-                if ':' in entry:
-                    key, val = entry.split(':', 1)
-                    parsed[f"{section_name}__{key.strip().replace(' ', '_')}"] = val.strip()
-                else:
-                    parsed[f"{section_name}__unknown"] = entry
-        elif section_name == "Section_2_Data_and_Variable_Types":
-            # Expect variable definitions like "Variable 1: Meth concentration → Continuous"
-            lines = [l.strip() for l in body.split('*') if l.strip()]
-            vlist = {}
-            for line in lines:
-                # e.g., "Variable 1: Methamphetamine concentration in mg per 1000 inhabitants → Continuous"
-                if ':' in line:
-                    var_part, type_part = line.split('→') if '→' in line else (line, "")
-                    var_name = var_part.split(':', 1)[1].strip() if ':' in var_part else var_part.strip()
-                    types = [t.strip() for t in type_part.split(',') if t.strip()]
-                    vlist[var_name] = types or ["Not implemented"]
-            parsed[section_name] = vlist
-        elif section_name == "Section_3_Variable_Mapping":
-            # e.g., "Methamphetamine concentration: color * Population size: circle area"
-            entries = split_vals(body)
-            mapping = {}
-            for entry in entries:
-                if ':' in entry:
-                    var, enc = entry.split(':', 1)
-                    mapping[var.strip()] = enc.strip()
-            parsed[section_name] = mapping
-        elif section_name == "Section_12_Typography":
-            # Each entry like Title|Arial|Sans-serif|24px|center|bold
-            lines = [l.strip() for l in body.split('*') if l.strip()]
-            typo = {}
-            for line in lines:
-                parts = [p.strip() for p in line.split('|')]
-                if len(parts) >= 6:
-                    element = parts[0]
-                    typo[element] = {
-                        "font_family": parts[1],
-                        "font_type": parts[2],
-                        "font_size": parts[3],
-                        "alignment": parts[4],
-                        "style": parts[5],
-                    }
-            parsed[section_name] = typo
-        elif section_name in ("Section_17_Searchable_Keywords", "Section_19_Description"):
-            # Keywords: split by * or comma
-            if '*' in body:
-                parsed[section_name] = split_vals(body)
-            else:
-                parsed[section_name] = [k.strip() for k in re.split(r"[,@;]+", body) if k.strip()]
-        elif section_name == "Section_16_Data_Source":
-            # Expect Source_Name and Year; crude split
-            parts = split_vals(body)
-            parsed[section_name] = parts
-        else:
-            # Generic key: value split by '*' and ':' 
-            entries = split_vals(body)
-            for entry in entries:
-                if ':' in entry:
-                    key, val = entry.split(':', 1)
-                    parsed[f"{section_name}__{key.strip().replace(' ', '_')}"] = val.strip()
-                else:
-                    parsed[f"{section_name}__extra"] = entry
-
+        header_match = _HEADER_RE.match(chunk)
+        if header_match:
+            if section is not None:
+                SECTION_SPECS.get(section, _DEFAULT_SPEC)[0](section, body, parsed)
+            section, body = header_match.group(1), "\n".join(chunk.splitlines()[1:]).strip()
+        elif section is not None and not body:
+            body = chunk
+    if section is not None:
+        SECTION_SPECS.get(section, _DEFAULT_SPEC)[0](section, body, parsed)
     return parsed
 
+
 def build_dataframe_from_outputs(outputs: List[str]) -> pd.DataFrame:
     """
     Given a list of raw LLM output strings, parse each and build a DataFrame.
     """
+    return pd.DataFrame.from_records([parse_llm_visualization_output(o) for o in outputs])
+
+
+def _column_type(name):
+    spec = SECTION_SPECS.get(name)
+    if spec is not None and spec[1] is not None:
+        return spec[1]
+    return pa.string() if name.startswith("Section_") else None
+
+
+def records_to_table(records: List[Dict[str, any]]) -> pa.Table:
+    """Typed Arrow table of parsed records: nested sections as maps/lists, the rest as strings."""
+    names = list(dict.fromkeys(key for record in records for key in record))
+    arrays = []
+    for name in names:
+        values = [record.get(name) for record in records]
+        try:
+            arrays.append(pa.array(values, type=_column_type(name)))
+        except (pa.ArrowInvalid, pa.ArrowTypeError):
+            # Mixed passthrough values; keep them as JSON text
+            arrays.append(pa.array([None if v is None else json.dumps(v, default=str) for v in values], pa.string()))
+    return pa.Table.from_arrays(arrays, names=names)
+
+
+def _parse_part(lines, text_field, part_path):
+    """Parse a chunk of JSONL lines into one Parquet part; runs in a worker process."""
     records = []
-    for o in outputs:
-        record = parse_llm_visualization_output(o)
+    for line in lines:
+        try:
+            entry = json.loads(line)
+        except json.JSONDecodeError:
+            continue
+        text = entry.get(text_field)
+        if not isinstance(text, str) or entry.get("status", "ok") != "ok":
+            continue
+        record = {
+            k: v for k, v in entry.items()
+            if k not in (text_field, "status", "error") and not isinstance(v, (dict, list))
+        }
+        record.update(parse_llm_visualization_output(text))
         records.append(record)
-    df = pd.DataFrame.from_records(records)
-    return df
+    table = records_to_table(records)
+    tmp_path = f"{part_path}.tmp"
+    pq.write_table(table, tmp_path)
+    os.replace(tmp_path, part_path)
+    return len(lines), table.num_rows
 
-# Example usage with a single earlier output string:
-if __name__ == "__main__":
-    sample_output = """
+
+def _chunked_lines(path, chunk_size):
+    with open(path, encoding="utf-8") as f:
+        chunk = []
+        for line in f:
+            if line.strip():
+                chunk.append(line)
+                if len(chunk) == chunk_size:
+                    yield chunk
+                    chunk = []
+        if chunk:
+            yield chunk
+
+
+def stream_outputs_to_parquet(input_path, out_dir, text_field="output", chunk_size=2000, workers=None):
+    """
+    Parse a JSONL of raw VLM outputs (e.g. the annotate_images journal) into Parquet parts
+    under ``out_dir``, one per ``chunk_size`` lines. Chunks are parsed in a process pool with
+    at most two per worker in flight, so memory stays bounded whatever the input size.
+    ``workers=0`` parses in this process. Other scalar fields of each line are kept as columns.
+    """
+    started = time.perf_counter()
+    os.makedirs(out_dir, exist_ok=True)
+    for stale in glob.glob(os.path.join(out_dir, "part-*.parquet")):
+        os.remove(stale)
+
+    lines_total = rows_total = parts = 0
+    chunks = _chunked_lines(input_path, chunk_size)
+    if workers == 0:
+        for index, lines in enumerate(chunks):
+            n_lines, n_rows = _parse_part(lines, text_field, os.path.join(out_dir, f"part-{index:05d}.parquet"))
+            lines_total, rows_total, parts = lines_total + n_lines, rows_total + n_rows, parts + 1
+    else:
+        workers = workers or os.cpu_count()
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            pending = set()
+            for index, lines in enumerate(chunks):
+                if len(pending) >= 2 * workers:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        n_lines, n_rows = future.result()
+                        lines_total, rows_total, parts = lines_total + n_lines, rows_total + n_rows, parts + 1
+                part_path = os.path.join(out_dir, f"part-{index:05d}.parquet")
+                pending.add(pool.submit(_parse_part, lines, text_field, part_path))
+            for future in pending:
+                n_lines, n_rows = future.result()
+                lines_total, rows_total, parts = lines_total + n_lines, rows_total + n_rows, parts + 1
+
+    elapsed = time.perf_counter() - started
+    return {
+        "lines": lines_total,
+        "records": rows_total,
+        "parts": parts,
+        "elapsed_s": round(elapsed, 3),
+        "records_per_s": round(rows_total / max(elapsed, 1e-9), 1),
+    }
+
+
+def open_parsed_dataset(out_dir) -> ds.Dataset:
+    """Dataset over the Parquet parts, with their column sets unified (missing columns read as null)."""
+    paths = sorted(glob.glob(os.path.join(out_dir, "part-*.parquet")))
+    schema = pa.unify_schemas([pq.read_schema(p) for p in paths], promote_options="permissive")
+    return ds.dataset(paths, schema=schema, format="parquet")
+
+
+SAMPLE_OUTPUT = """
 %%% Section_1_Plot_Type %%%
 Primary Category: Spatial & Geospatial * Subcategory: Maps * Proportional Symbol Maps * Specific Variant / Technique: Choropleth overlay with proportional circles * Annotated map
 %%% Section_2_Data_and_Variable_Types %%%
@@ -171,5 +300,21 @@ Readability: good * Data–ink ratio: efficient (minimal extra decoration) * Col
 %%% Section_19_Description %%%
 This visualization is a proportional symbol map of Europe showing daily average methamphetamine concentration in wastewater by city. Colors range from blue (low) to deep red (high), with the largest concentration observed in Ústí nad Labem, Czech Republic. Circle sizes represent city population, providing a secondary layer of context. A clear, minimalistic design with a pale background ensures strong contrast for the colored points. The map effectively communicates spatial patterns in drug usage, highlighting both regional trends and extreme outliers.
 """
-    df = build_dataframe_from_outputs([sample_output])
-    print(df.T)  # transpose to inspect fields
\ No newline at end of file
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Parse raw VLM outputs into a DataFrame or Parquet parts.")
+    parser.add_argument("input", nargs="?", help="JSONL of raw outputs; without it the sample output is parsed")
+    parser.add_argument("out_dir", nargs="?", default="parsed_outputs")
+    parser.add_argument("--text-field", default="output", help='field holding the raw output ("llm_output" in document records)')
+    parser.add_argument("--chunk-size", type=int, default=2000)
+    parser.add_argument("--workers", type=int, default=None, help="parser processes (default: CPU count, 0: in process)")
+    args = parser.parse_args()
+
+    if args.input:
+        print(json.dumps(stream_outputs_to_parquet(
+            args.input, args.out_dir, text_field=args.text_field, chunk_size=args.chunk_size, workers=args.workers
+        ), indent=2))
+    else:
+        df = build_dataframe_from_outputs([SAMPLE_OUTPUT])
+        print(df.T)  # transpose to inspect fields
@@ -1,13 +1,194 @@
+import os
+import csv
+import json
+import math
+import glob
+import hashlib
+import pyarrow.parquet as pq
+from weaviate.util import generate_uuid5
+from app_config import INGEST_CHECKPOINT
+from modules.local_reranker import KEYWORDS_PROPERTY
+
+# Collection text property (source of the matching named vector in VECTOR_NAME_MAP) ->
+# parsed VLM output sections it is built from (see process_image_output.process_output_df)
+SECTION_PROPERTIES = {
+    "section_1_data_and_variable_types": ["Section_2_Data_and_Variable_Types"],
+    "section_2_variable_mapping": ["Section_3_Variable_Mapping"],
+    "section_3_color_encoding_details": ["Section_4_Color_Encoding"],
+    "section_4_chart_element_identification": ["Section_7_Chart_Element_Identification"],
+    "section_5_layout_details": ["Section_8_Grid_Arrangement", "Section_9_Layout"],
+    "section_6_axes_and_scales": ["Section_10_Axes_and_Scales", "Section_11_Coordinate_Systems"],
+    "section_7_annotation_and_storytelling_elements": ["Section_14_Annotation_and_Storytelling_Elements"],
+    "section_8_plot_goal": ["Section_15_Plot_Goal"],
+    KEYWORDS_PROPERTY: ["Section_17_Searchable_Keywords"],
+    "section_11_description": ["Section_19_Description"],
+    "primary_category": ["Section_1_Plot_Type__Primary_Category"],
+    "plot_type": ["Section_1_Plot_Type"],
+}
+
+# Filter properties (controlled vocabularies, lowercased) -> parsed section key
+FILTER_PROPERTIES = {
+    "background_type": "Section_5_Theme__Background_type",
+    "palette_type": "Section_4_Color_Encoding__Palette_type",
+}
+
+
+def _to_text(value) -> str:
+    if isinstance(value, dict):
+        return "; ".join(f"{k}: {_to_text(v)}" for k, v in value.items())
+    if isinstance(value, (list, tuple)):
+        return ", ".join(_to_text(v) for v in value)
+    return str(value)
+
+
+def _is_missing(value) -> bool:
+    return value is None or value == "" or (isinstance(value, float) and math.isnan(value))
+
+
+def _read_jsonl(path, skip=0):
+    with open(path, encoding="utf-8") as f:
+        for offset, line in enumerate(f):
+            if offset < skip or not line.strip():
+                continue
+            try:
+                yield offset, json.loads(line)
+            except json.JSONDecodeError as e:
+                print(f"Skipping malformed line {offset + 1} of {path}: {e}")
+
+
+def _read_csv(path, skip=0):
+    with open(path, encoding="utf-8", newline="") as f:
+        for offset, record in enumerate(csv.DictReader(f)):
+            if offset >= skip:
+                yield offset, record
+
+
+def _read_parquet(path, skip=0):
+    """Parquet rows from ``skip`` on; whole row groups before it are not decoded. Map columns come back as dicts."""
+    parquet_file = pq.ParquetFile(path)
+    offset = 0
+    for group in range(parquet_file.num_row_groups):
+        rows = parquet_file.metadata.row_group(group).num_rows
+        if offset + rows > skip:
+            for batch in parquet_file.iter_batches(row_groups=[group], batch_size=1024):
+                for record in batch.to_pylist(maps_as_pydicts="lossy"):
+                    if offset >= skip:
+                        yield offset, record
+                    offset += 1
+        else:
+            offset += rows
+
+
+READERS = {".jsonl": _read_jsonl, ".csv": _read_csv, ".parquet": _read_parquet}
+
+
+class DocumentStream:
+    """
+    Documents of a DocumentLoader, each a dict with "uuid", "properties" and the
+    (path, offset) "position" of its record. ``commit`` stores progress so a later
+    run resumes after the committed documents.
+    """
+
+    def __init__(self, loader):
+        self.loader = loader
+
+    def __iter__(self):
+        return self.loader._iter_documents()
+
+    def commit(self, documents, failed=()):
+        self.loader._commit([document["position"] for document in documents], failed)
+
+
 class DocumentLoader:
-    def __init__(self, data_source):
+    """
+    Streams chart records from JSONL, CSV or Parquet files (a file or a directory of them)
+    and turns each into collection properties. Records may already use the collection's
+    property names, carry parsed VLM sections (Section_* keys), or the raw VLM text under
+    "llm_output".
+    """
+
+    def __init__(self, data_source, checkpoint_path=INGEST_CHECKPOINT):
         self.data_source = data_source
+        self.checkpoint_path = checkpoint_path
+        self.failed_path = f"{os.path.splitext(checkpoint_path)[0]}.failed.jsonl" if checkpoint_path else None
+        self.checkpoint = self._load_checkpoint()
+
+    def files(self):
+        if os.path.isdir(self.data_source):
+            paths = [
+                path for ext in READERS
+                for path in glob.glob(os.path.join(self.data_source, "**", f"*{ext}"), recursive=True)
+            ]
+            return sorted(paths)
+        return [self.data_source]
 
     def load_documents(self):
-        documents = []
-        # Logic to load documents from the data source
-        # This could involve reading files, querying a database, etc.
-        return documents
+        return DocumentStream(self)
+
+    def _iter_documents(self):
+        for path in self.files():
+            reader = READERS.get(os.path.splitext(path)[1])
+            if reader is None:
+                raise ValueError(f"Unsupported document file: {path}")
+            for offset, record in reader(path, self.checkpoint.get(path, 0)):
+                document = self.preprocess_document(record)
+                document["position"] = (path, offset)
+                yield document
 
     def preprocess_document(self, document):
-        # Logic to preprocess a single document
-        return document
\ No newline at end of file
+        """Build the collection properties (named-vector text fields, filters) and a stable UUID."""
+        record = {k: v for k, v in document.items() if not _is_missing(v)}
+        if isinstance(record.get("llm_output"), str):
+            from process_image_output.process_output_df import parse_llm_visualization_output
+            record.update(parse_llm_visualization_output(record.pop("llm_output")))
+
+        properties = {k: v for k, v in record.items() if not k.startswith("Section_") and k != "uuid"}
+        for prop, sources in SECTION_PROPERTIES.items():
+            if prop in properties:
+                continue
+            parts = []
+            for key, value in record.items():
+                for source in sources:
+                    if key == source:
+                        parts.append(_to_text(value))
+                    elif key.startswith(f"{source}__"):
+                        parts.append(f"{key[len(source) + 2:].replace('_', ' ')}: {_to_text(value)}")
+            if parts:
+                properties[prop] = "\n".join(parts)
+        for prop, key in FILTER_PROPERTIES.items():
+            if prop not in properties and key in record:
+                properties[prop] = _to_text(record[key]).strip().lower()
+
+        identity = properties.get("image_url") or hashlib.sha256(
+            json.dumps(properties, sort_keys=True, default=str).encode("utf-8")
+        ).hexdigest()
+        return {"uuid": str(record.get("uuid") or generate_uuid5(identity)), "properties": properties}
+
+    # --- checkpointing ---------------------------------------------------------
+
+    def _load_checkpoint(self):
+        if not self.checkpoint_path or not os.path.exists(self.checkpoint_path):
+            return {}
+        with open(self.checkpoint_path) as f:
+            return json.load(f).get("files", {})
+
+    def _commit(self, positions, failed=()):
+        """Record that every document up to ``positions`` was written; keep failures for a retry run."""
+        if not self.checkpoint_path:
+            return
+        for path, offset in positions:
+            self.checkpoint[path] = max(self.checkpoint.get(path, 0), offset + 1)
+        os.makedirs(os.path.dirname(self.checkpoint_path) or ".", exist_ok=True)
+        tmp_path = f"{self.checkpoint_path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"data_source": self.data_source, "files": self.checkpoint}, f)
+        os.replace(tmp_path, self.checkpoint_path)
+        if failed:
+            with open(self.failed_path, "a", encoding="utf-8") as f:
+                for document in failed:
+                    f.write(json.dumps({"uuid": document["uuid"], **document["properties"]}, default=str) + "\n")
+
+    def reset_checkpoint(self):
+        self.checkpoint = {}
+        if self.checkpoint_path and os.path.exists(self.checkpoint_path):
+            os.remove(self.checkpoint_path)
@@ -0,0 +1,334 @@
+"""
+Columnar store of chart features for faceted queries that need no vector search.
+
+One DuckDB table, ``charts``, holds the display properties of every chart plus its
+facets (the filter fields of the search tools) as ENUM columns, and the variable types
+and font families from the parsed VLM sections as lists. The store is rebuilt as a whole
+from a collection snapshot or the live collection and swapped in atomically; readers
+reopen it when the file changes. Facet vocabularies are small, so query answers are
+memoized until then.
+
+    cd src && python -m rag.feature_store [--from-collection] [--parsed parsed/]
+"""
+import os
+import time
+import argparse
+import threading
+import duckdb
+import pyarrow as pa
+import pyarrow.parquet as pq
+from weaviate.util import generate_uuid5
+from app_config import WEAVIATE_COLLECTION_NAME, LOCAL_INDEX_DIR, FEATURE_STORE_PATH, FEATURE_STORE_CACHE_SIZE
+from modules.local_reranker import KEYWORDS_PROPERTY
+from rag.document_loader import FILTER_PROPERTIES
+from rag.local_index import LocalObject, LocalMetadata, PROPERTIES_FILE
+from modules.cache import MemoryCache
+from modules.tracing import register_cache
+
+# Filter fields of the search tools, stored dictionary-encoded
+FACET_COLUMNS = [
+    "background_type", "background_color", "palette_type", "coordinate_type", "grid_layout",
+    "grid_orientation", "grid_style", "grid_color", "readability_assessment",
+]
+LIST_COLUMNS = ["variable_types", "font_families"]
+TEXT_COLUMNS = [
+    "image_url", "post_title", "post_url", "image_description", "external_link", "section_11_description",
+    KEYWORDS_PROPERTY, "plot_type", "primary_category",
+]
+
+
+def _text(value):
+    if value is None:
+        return None
+    if isinstance(value, (list, tuple)):
+        return ", ".join(str(v) for v in value)
+    return str(value)
+
+
+def _facet(value):
+    value = _text(value)
+    if value is None:
+        return None
+    return value.strip().lower() or None
+
+
+def _variable_types(section):
+    # Section_2_Data_and_Variable_Types: {variable: [types]}
+    if not isinstance(section, dict):
+        return []
+    return sorted({t for types in section.values() for t in (types or []) if t != "Not implemented"})
+
+
+def _font_families(section):
+    # Section_12_Typography: {element: {"font_family": ..., ...}}
+    if not isinstance(section, dict):
+        return []
+    return sorted({
+        font["font_family"] for font in section.values()
+        if isinstance(font, dict) and font.get("font_family") not in (None, "", "Unknown")
+    })
+
+
+def feature_row(uuid, properties, parsed=None):
+    """Store row from collection properties, optionally enriched with the chart's parsed sections."""
+    parsed = parsed or {}
+    row = {"uuid": str(uuid or generate_uuid5(properties.get("image_url")))}
+    for column in TEXT_COLUMNS:
+        row[column] = _text(properties.get(column))
+    for column in FACET_COLUMNS:
+        value = properties.get(column)
+        if value is None and column in FILTER_PROPERTIES:
+            value = parsed.get(FILTER_PROPERTIES[column])
+        row[column] = _facet(value)
+    row["variable_types"] = _variable_types(
+        properties.get("Section_2_Data_and_Variable_Types") or parsed.get("Section_2_Data_and_Variable_Types")
+    )
+    row["font_families"] = _font_families(
+        properties.get("Section_12_Typography") or parsed.get("Section_12_Typography")
+    )
+    return row
+
+
+def load_parsed_sections(parsed_dir):
+    """image_url -> parsed sections, from the Parquet parts of process_output_df."""
+    from process_image_output.process_output_df import open_parsed_dataset
+    dataset = open_parsed_dataset(parsed_dir)
+    columns = [c for c in ["image_url", "Section_2_Data_and_Variable_Types", "Section_12_Typography",
+                           *FILTER_PROPERTIES.values()] if c in dataset.schema.names]
+    sections = {}
+    for batch in dataset.to_batches(columns=columns):
+        for record in batch.to_pylist(maps_as_pydicts="lossy"):
+            if record.get("image_url"):
+                sections[record["image_url"]] = record
+    return sections
+
+
+ALL_COLUMNS = {"uuid", *TEXT_COLUMNS, *FACET_COLUMNS, *LIST_COLUMNS}
+
+
+def _schema():
+    fields = [("uuid", pa.string())]
+    fields += [(c, pa.string()) for c in TEXT_COLUMNS + FACET_COLUMNS]
+    fields += [(c, pa.list_(pa.string())) for c in LIST_COLUMNS]
+    return pa.schema(fields)
+
+
+class FeatureStore:
+    def __init__(self, path=FEATURE_STORE_PATH):
+        self.path = path
+        self._con = None
+        self._mtime = None
+        self._facet_values = {}
+        self._lock = threading.Lock()
+        self.results = MemoryCache(maxsize=FEATURE_STORE_CACHE_SIZE)
+
+    def available(self) -> bool:
+        return bool(self.path) and os.path.exists(self.path)
+
+    # --- building --------------------------------------------------------------
+
+    def build(self, rows, source=""):
+        """Replace the store with ``rows`` (dicts from ``feature_row``); returns the row count."""
+        started = time.perf_counter()
+        table = pa.Table.from_pylist(list(rows), schema=_schema())
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        for stale in (tmp_path, f"{tmp_path}.wal"):
+            if os.path.exists(stale):
+                os.remove(stale)
+
+        con = duckdb.connect(tmp_path)
+        try:
+            con.register("feature_rows", table)
+            con.execute("CREATE TABLE staging AS SELECT * FROM feature_rows")
+            facets = []
+            for column in FACET_COLUMNS:
+                if con.execute(f"SELECT count({column}) FROM staging").fetchone()[0]:
+                    con.execute(
+                        f"CREATE TYPE {column}_facet AS ENUM "
+                        f"(SELECT DISTINCT {column} FROM staging WHERE {column} IS NOT NULL ORDER BY 1)"
+                    )
+                    facets.append(f"{column}::{column}_facet AS {column}")
+                else:
+                    facets.append(column)  # no values at all; an ENUM cannot be empty
+            columns = ", ".join(["uuid", *TEXT_COLUMNS, *facets, *LIST_COLUMNS])
+            # Sorting by the facets keeps equal values together, so row-group zone maps skip the rest
+            con.execute(f"CREATE TABLE charts AS SELECT {columns} FROM staging ORDER BY {', '.join(FACET_COLUMNS)}, uuid")
+            con.execute("DROP TABLE staging")
+            con.execute("CREATE UNIQUE INDEX charts_uuid ON charts (uuid)")
+            con.execute(
+                "CREATE TABLE store_info AS SELECT ? AS source, now() AS built_at, (SELECT count(*) FROM charts) AS num_rows",
+                [source]
+            )
+            con.execute("CHECKPOINT")
+        finally:
+            con.close()
+        os.replace(tmp_path, self.path)
+        print(f"Built feature store {self.path}: {table.num_rows} charts in {time.perf_counter() - started:.1f}s")
+        return table.num_rows
+
+    def build_from_snapshot(self, snapshot_dir=LOCAL_INDEX_DIR, parsed_dir=None):
+        sections = load_parsed_sections(parsed_dir) if parsed_dir else {}
+        rows = (
+            feature_row(record.pop("uuid"), record, sections.get(record.get("image_url")))
+            for record in pq.read_table(os.path.join(snapshot_dir, PROPERTIES_FILE)).to_pylist(maps_as_pydicts="lossy")
+        )
+        return self.build(rows, source=snapshot_dir)
+
+    def build_from_collection(self, weaviate_client, collection_name=WEAVIATE_COLLECTION_NAME, parsed_dir=None):
+        sections = load_parsed_sections(parsed_dir) if parsed_dir else {}
+        rows = (
+            feature_row(obj.uuid, obj.properties, sections.get(obj.properties.get("image_url")))
+            for obj in weaviate_client.iterate_objects(collection_name=collection_name)
+        )
+        return self.build(rows, source=collection_name)
+
+    # --- querying --------------------------------------------------------------
+
+    def _connection(self):
+        mtime = os.path.getmtime(self.path)
+        if self._con is None or mtime != self._mtime:
+            if self._con is not None:
+                self._con.close()
+            self._con = duckdb.connect(self.path, read_only=True)
+            self._mtime = mtime
+            self.results.clear()
+            self._facet_values = {
+                column: {v for (v,) in self._con.execute(f"SELECT DISTINCT {column} FROM charts WHERE {column} IS NOT NULL").fetchall()}
+                for column in FACET_COLUMNS
+            }
+        return self._con
+
+    @staticmethod
+    def _where(filters):
+        """WHERE clause for {column: value or [values]}; list columns match if they contain the value."""
+        clauses, params = [], []
+        for column, value in (filters or {}).items():
+            values = list(value) if isinstance(value, (list, tuple, set)) else [value]
+            if column in LIST_COLUMNS:
+                clauses.append(f"list_has_any({column}, ?)")
+                params.append(values)
+            elif column in FACET_COLUMNS or column in TEXT_COLUMNS or column == "uuid":
+                clauses.append(f"{column} IN ({', '.join('?' for _ in values)})")
+                params.extend(values)
+            else:
+                raise ValueError(f"Unknown feature store column: {column}")
+        return (" WHERE " + " AND ".join(clauses) if clauses else ""), params
+
+    def _normalize(self, filters):
+        """Lowercase facet values; None if some facet asks only for values the store has never seen."""
+        normalized = {}
+        for column, value in (filters or {}).items():
+            if column in FACET_COLUMNS:
+                values = {_facet(v) for v in (value if isinstance(value, (list, tuple, set)) else [value])}
+                values &= self._facet_values.get(column, set())
+                if not values:
+                    return None
+                value = sorted(values)
+            normalized[column] = value
+        return normalized
+
+    def query(self, filters, limit=100, return_properties=None):
+        """Charts matching every filter, as LocalObject results like the vector search returns."""
+        names = list(dict.fromkeys(["uuid", *(return_properties or TEXT_COLUMNS + FACET_COLUMNS + LIST_COLUMNS)]))
+        names = [name for name in names if name in ALL_COLUMNS]
+        with self._lock:
+            con = self._connection()
+            filters = self._normalize(filters)
+            if filters is None:
+                return []
+            key = (tuple(sorted((c, str(v)) for c, v in filters.items())), limit, tuple(names))
+            rows = self.results.get(key)
+            if rows is None:
+                where, params = self._where(filters)
+                rows = con.execute(f"SELECT {', '.join(names)} FROM charts{where} LIMIT ?", params + [limit]).fetchall()
+                self.results.set(key, rows)
+        return [
+            LocalObject(uuid=row[0], properties=dict(zip(names[1:], row[1:])), metadata=LocalMetadata())
+            for row in rows
+        ]
+
+    def count(self, filters=None) -> int:
+        with self._lock:
+            con = self._connection()
+            filters = self._normalize(filters)
+            if filters is None:
+                return 0
+            where, params = self._where(filters)
+            return con.execute(f"SELECT count(*) FROM charts{where}", params).fetchone()[0]
+
+    def rows(self, columns):
+        """Every chart's (uuid, *columns) values."""
+        unknown = set(columns) - ALL_COLUMNS
+        if unknown:
+            raise ValueError(f"Unknown feature store columns: {sorted(unknown)}")
+        with self._lock:
+            con = self._connection()
+            return con.execute(f"SELECT uuid, {', '.join(columns)} FROM charts").fetchall()
+
+    def version(self):
+        """Changes whenever the store file is rebuilt; None while there is no store."""
+        return os.path.getmtime(self.path) if self.available() else None
+
+    def facet_values(self, column):
+        with self._lock:
+            self._connection()
+            return sorted(self._facet_values[column])
+
+    def facet_counts(self, column, filters=None):
+        """value -> number of charts, among those matching ``filters``."""
+        if column not in FACET_COLUMNS and column not in LIST_COLUMNS:
+            raise ValueError(f"Not a facet column: {column}")
+        with self._lock:
+            con = self._connection()
+            filters = self._normalize(filters)
+            if filters is None:
+                return {}
+            where, params = self._where(filters)
+            value = f"unnest({column})" if column in LIST_COLUMNS else column
+            rows = con.execute(
+                f"SELECT value, count(*) FROM (SELECT {value} AS value FROM charts{where}) "
+                f"WHERE value IS NOT NULL GROUP BY value ORDER BY 2 DESC",
+                params
+            ).fetchall()
+        return {str(value): count for value, count in rows}
+
+    def close(self):
+        with self._lock:
+            if self._con is not None:
+                self._con.close()
+                self._con = None
+
+
+_stores = {}
+
+
+def get_feature_store(path=FEATURE_STORE_PATH) -> FeatureStore:
+    """Shared reader per store file (DuckDB keeps one database instance per path in a process)."""
+    if path not in _stores:
+        _stores[path] = FeatureStore(path)
+        register_cache("feature_store", _stores[path].results)
+    return _stores[path]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build the chart feature store.")
+    parser.add_argument("--from-collection", action="store_true", help="read the live collection instead of the snapshot")
+    parser.add_argument("--snapshot", default=LOCAL_INDEX_DIR)
+    parser.add_argument("--collection", default=WEAVIATE_COLLECTION_NAME)
+    parser.add_argument("--parsed", help="Parquet parts of process_output_df, for variable types and fonts")
+    parser.add_argument("--path", default=FEATURE_STORE_PATH)
+    args = parser.parse_args()
+
+    store = FeatureStore(args.path)
+    if args.from_collection:
+        from rag.weaviate_client import WeaviateClient
+        client = WeaviateClient()
+        try:
+            store.build_from_collection(client, args.collection, parsed_dir=args.parsed)
+        finally:
+            client.client.close()
+    else:
+        store.build_from_snapshot(args.snapshot, parsed_dir=args.parsed)
+    for column in ("background_type", "palette_type"):
+        print(column, store.facet_counts(column))
@@ -0,0 +1,102 @@
+"""
+Second phase of two-phase retrieval: fill in result properties by UUID.
+
+Searches return CANDIDATE_PROPERTIES only: the property the LLM reranker reads plus every
+property the local reranker scores. The remaining display properties are fetched with one
+by-id query per batch for the objects that are about to be shown, and kept in a per-UUID
+cache so paging and repeated searches do not fetch them again.
+"""
+import asyncio
+from app_config import WEAVIATE_COLLECTION_NAME, HYDRATION_BATCH_SIZE, HYDRATION_CACHE_SIZE, HYDRATION_CACHE_TTL
+from llm_utils import LLM_RERANK_PROPERTY
+from modules.cache import MemoryCache
+from modules.local_reranker import RERANK_FIELDS
+from modules.tracing import span
+from rag.result_cache import collection_version
+
+# Everything either reranker reads, so neither scores a property that was left out
+CANDIDATE_PROPERTIES = list(dict.fromkeys([LLM_RERANK_PROPERTY, *RERANK_FIELDS]))
+
+
+class Hydrator:
+    def __init__(self, client, collection_name=WEAVIATE_COLLECTION_NAME, properties=None,
+                 batch_size=HYDRATION_BATCH_SIZE, cache=None):
+        self.client = client
+        self.collection_name = collection_name
+        self.properties = list(properties or [])
+        self.batch_size = batch_size
+        self.cache = cache or MemoryCache(maxsize=HYDRATION_CACHE_SIZE, ttl=HYDRATION_CACHE_TTL)
+        self.version = None
+
+    def _check_version(self):
+        # Properties cached before the collection was last written to may be outdated
+        version = collection_version(self.collection_name)
+        if version != self.version:
+            self.cache.clear()
+            self.version = version
+
+    def _pending(self, objects):
+        """Fill objects from the cache; returns uuid -> objects that still lack properties."""
+        self._check_version()
+        pending = {}
+        for obj in objects:
+            if obj.properties is None:
+                obj.properties = {}
+            if all(name in obj.properties for name in self.properties):
+                continue
+            key = str(obj.uuid)
+            cached = self.cache.get(key)
+            if cached is not None:
+                self._merge(obj, cached)
+            else:
+                pending.setdefault(key, []).append(obj)
+        return pending
+
+    @staticmethod
+    def _merge(obj, properties):
+        for name, value in properties.items():
+            obj.properties.setdefault(name, value)
+
+    def _fill(self, pending, response):
+        for fetched in getattr(response, "objects", None) or []:
+            key = str(fetched.uuid)
+            properties = {name: (fetched.properties or {}).get(name) for name in self.properties}
+            self.cache.set(key, properties)
+            for obj in pending.pop(key, []):
+                self._merge(obj, properties)
+
+    def _batches(self, pending):
+        ids = list(pending)
+        return [ids[i:i + self.batch_size] for i in range(0, len(ids), self.batch_size)]
+
+    async def hydrate(self, objects):
+        """Add the missing ``properties`` to ``objects`` in place; returns them."""
+        objects = list(objects)
+        with span("hydrate", objects=len(objects)) as trace:
+            pending = self._pending(objects)
+            trace.set_attribute("fetched", len(pending))
+            if pending:
+                responses = await asyncio.gather(*(
+                    self.client.fetch_objects_by_ids(
+                        batch, collection_name=self.collection_name, return_properties=self.properties
+                    )
+                    for batch in self._batches(pending)
+                ), return_exceptions=True)
+                for response in responses:
+                    if isinstance(response, Exception):
+                        print(f"Hydration fetch failed: {response}")
+                        continue
+                    self._fill(pending, response)
+        return objects
+
+    def hydrate_sync(self, objects):
+        """``hydrate`` for the blocking WeaviateClient."""
+        objects = list(objects)
+        with span("hydrate", objects=len(objects)) as trace:
+            pending = self._pending(objects)
+            trace.set_attribute("fetched", len(pending))
+            for batch in self._batches(pending):
+                self._fill(pending, self.client.fetch_objects_by_ids(
+                    batch, collection_name=self.collection_name, return_properties=self.properties
+                ))
+        return objects
@@ -0,0 +1,396 @@
+import os
+import json
+import asyncio
+import fnmatch
+from dataclasses import dataclass, field
+import numpy as np
+import pyarrow.parquet as pq
+from openai import OpenAI, AsyncOpenAI
+from app_config import (
+    WEAVIATE_COLLECTION_NAME, Mistral_API_KEY, MISTRAL_BASE_URL, MISTRAL_EMBED_MODEL,
+    LOCAL_INDEX_DIR, LOCAL_INDEX_NPROBE
+)
+from modules.cache import MemoryCache
+from modules.local_reranker import tokenize, RERANK_FIELDS
+
+# Snapshot layout, shared with rag.snapshot:
+#   <dir>/manifest.json            collection name, row count, vector names and dims
+#   <dir>/properties.parquet       one row per object, "uuid" column plus every property
+#   <dir>/vectors/<name>.npy       float32 (rows, dim), row-aligned with properties.parquet
+MANIFEST_FILE = "manifest.json"
+PROPERTIES_FILE = "properties.parquet"
+VECTORS_DIR = "vectors"
+
+IVF_MIN_ROWS = 4096  # below this an exact scan is as fast as probing clusters
+
+
+@dataclass
+class LocalMetadata:
+    distance: float = None
+    score: float = None
+
+
+@dataclass
+class LocalObject:
+    uuid: str
+    properties: dict
+    metadata: LocalMetadata = field(default_factory=LocalMetadata)
+
+
+@dataclass
+class LocalQueryReturn:
+    objects: list
+
+
+class MistralEmbedder:
+    """Embeds query text with the same model the collection's text2vec-mistral vectorizer uses."""
+
+    def __init__(self, api_key=Mistral_API_KEY, base_url=MISTRAL_BASE_URL, model=MISTRAL_EMBED_MODEL, cache_size=4096):
+        self.model = model
+        self.client = OpenAI(api_key=api_key, base_url=base_url)
+        self.async_client = AsyncOpenAI(api_key=api_key, base_url=base_url)
+        self.cache = MemoryCache(maxsize=cache_size)
+
+    def embed(self, text: str) -> np.ndarray:
+        vector = self.cache.get(text)
+        if vector is None:
+            response = self.client.embeddings.create(model=self.model, input=[text])
+            vector = np.asarray(response.data[0].embedding, dtype=np.float32)
+            self.cache.set(text, vector)
+        return vector
+
+    async def aembed(self, text: str) -> np.ndarray:
+        vector = self.cache.get(text)
+        if vector is None:
+            response = await self.async_client.embeddings.create(model=self.model, input=[text])
+            vector = np.asarray(response.data[0].embedding, dtype=np.float32)
+            self.cache.set(text, vector)
+        return vector
+
+
+class IVFIndex:
+    """Inverted-file ANN index: k-means coarse clusters, search probes the ``nprobe`` nearest."""
+
+    def __init__(self, vectors: np.ndarray, norms: np.ndarray, nlist=None, iterations=8, seed=0):
+        n_rows = len(vectors)
+        self.nlist = nlist or max(1, int(np.sqrt(n_rows)))
+        rng = np.random.default_rng(seed)
+        sample = np.asarray(vectors[rng.choice(n_rows, size=min(n_rows, self.nlist * 64), replace=False)])
+        sample = sample / np.maximum(np.linalg.norm(sample, axis=1, keepdims=True), 1e-12)
+        centroids = sample[rng.choice(len(sample), size=self.nlist, replace=False)]
+        for _ in range(iterations):
+            assign = np.argmax(sample @ centroids.T, axis=1)
+            for c in range(self.nlist):
+                members = sample[assign == c]
+                if len(members):
+                    centroid = members.mean(axis=0)
+                    centroids[c] = centroid / max(np.linalg.norm(centroid), 1e-12)
+        self.centroids = centroids
+        assign = np.empty(n_rows, dtype=np.int32)
+        for start in range(0, n_rows, 8192):  # chunked so the mmap is streamed, not loaded
+            block = np.asarray(vectors[start:start + 8192]) / norms[start:start + 8192, None]
+            assign[start:start + 8192] = np.argmax(block @ centroids.T, axis=1)
+        self.lists = [np.flatnonzero(assign == c) for c in range(self.nlist)]
+
+    def candidates(self, query_unit: np.ndarray, nprobe: int) -> np.ndarray:
+        nearest = np.argsort(-(self.centroids @ query_unit))[:nprobe]
+        return np.concatenate([self.lists[c] for c in nearest])
+
+
+class LocalVectorIndex:
+    """
+    In-process search over a snapshot of the collection, with the query interface of WeaviateClient.
+
+    Named vectors are memory-mapped so several worker processes share one copy in the page
+    cache. Distances are cosine distances like Weaviate's; filters accept the same
+    ``weaviate.classes.query.Filter`` objects the app already builds.
+    """
+
+    def __init__(self, snapshot_dir=LOCAL_INDEX_DIR, embedder=None, nprobe=LOCAL_INDEX_NPROBE):
+        self.snapshot_dir = snapshot_dir
+        self.embedder = embedder or MistralEmbedder()
+        self.nprobe = nprobe
+        with open(os.path.join(snapshot_dir, MANIFEST_FILE)) as f:
+            self.manifest = json.load(f)
+        self.collection_name = self.manifest.get("collection", WEAVIATE_COLLECTION_NAME)
+        table = pq.read_table(os.path.join(snapshot_dir, PROPERTIES_FILE))
+        self.uuids = [str(u) for u in table.column("uuid").to_pylist()]
+        self.rows = table.drop(["uuid"]).to_pylist()
+        self.uuid_to_row = {u: i for i, u in enumerate(self.uuids)}
+        self._columns = {}
+        self._vectors = {}
+        self._norms = {}
+        self._ivf = {}
+        self._build_text_index()
+
+    # --- vectors -------------------------------------------------------------
+
+    def _vector_data(self, target_vector):
+        if target_vector not in self._vectors:
+            path = os.path.join(self.snapshot_dir, VECTORS_DIR, f"{target_vector}.npy")
+            vectors = np.load(path, mmap_mode="r")
+            norms = np.empty(len(vectors), dtype=np.float32)
+            for start in range(0, len(vectors), 8192):
+                norms[start:start + 8192] = np.linalg.norm(vectors[start:start + 8192], axis=1)
+            norms = np.maximum(norms, 1e-12)
+            self._vectors[target_vector] = vectors
+            self._norms[target_vector] = norms
+            if len(vectors) >= IVF_MIN_ROWS:
+                self._ivf[target_vector] = IVFIndex(vectors, norms)
+        return self._vectors[target_vector], self._norms[target_vector]
+
+    def _default_vector(self):
+        return next(iter(self.manifest["vectors"]))
+
+    def _vector_search(self, query_vector, target_vector, limit, mask):
+        """(rows, distances) of the nearest rows allowed by ``mask``, best first."""
+        target_vector = target_vector or self._default_vector()
+        vectors, norms = self._vector_data(target_vector)
+        query_unit = np.asarray(query_vector, dtype=np.float32)
+        query_unit = query_unit / max(np.linalg.norm(query_unit), 1e-12)
+
+        ivf = self._ivf.get(target_vector)
+        rows = None
+        if ivf is not None:
+            rows = ivf.candidates(query_unit, self.nprobe)
+            if mask is not None:
+                rows = rows[mask[rows]]
+            if len(rows) < limit:
+                rows = None  # too selective for the probed clusters: fall back to an exact scan
+        if rows is None:
+            rows = np.flatnonzero(mask) if mask is not None else np.arange(len(vectors))
+        if not len(rows):
+            return rows, np.empty(0, dtype=np.float32)
+
+        rows = np.sort(rows)  # sequential reads from the memory map
+        distances = 1.0 - (np.asarray(vectors[rows]) @ query_unit) / norms[rows]
+        top = np.argsort(distances, kind="stable")[:limit]
+        return rows[top], distances[top]
+
+    # --- keyword side of hybrid ------------------------------------------------
+
+    def _build_text_index(self):
+        postings = {}
+        lengths = np.zeros(len(self.rows), dtype=np.float32)
+        for row, props in enumerate(self.rows):
+            for prop, weight in RERANK_FIELDS.items():
+                tokens = tokenize(props.get(prop))
+                lengths[row] += len(tokens)
+                for token in tokens:
+                    entry = postings.setdefault(token, {})
+                    entry[row] = entry.get(row, 0.0) + weight
+        self._postings = {
+            token: (np.fromiter(entry.keys(), dtype=np.int64), np.fromiter(entry.values(), dtype=np.float32))
+            for token, entry in postings.items()
+        }
+        self._lengths = lengths
+        self._avg_length = float(lengths.mean()) if len(lengths) else 1.0
+
+    def _bm25(self, query_text, k1=1.2, b=0.75):
+        scores = np.zeros(len(self.rows), dtype=np.float32)
+        n_rows = len(self.rows)
+        for token in set(tokenize(query_text)):
+            posting = self._postings.get(token)
+            if posting is None:
+                continue
+            rows, tf = posting
+            idf = np.log(1.0 + (n_rows - len(rows) + 0.5) / (len(rows) + 0.5))
+            norm = k1 * (1.0 - b + b * self._lengths[rows] / (self._avg_length or 1.0))
+            scores[rows] += idf * tf * (k1 + 1.0) / (tf + norm)
+        return scores
+
+    # --- filters ---------------------------------------------------------------
+
+    def _column(self, name):
+        if name not in self._columns:
+            if name in ("_id", "id"):
+                self._columns[name] = np.asarray(self.uuids, dtype=object)
+            else:
+                self._columns[name] = np.asarray([props.get(name) for props in self.rows], dtype=object)
+        return self._columns[name]
+
+    @staticmethod
+    def _matches(value, operator, expected):
+        values = value if isinstance(value, (list, tuple)) else [value]
+        if operator == "Equal":
+            return expected in values
+        if operator == "NotEqual":
+            return expected not in values
+        if operator == "ContainsAny":
+            return any(v in values for v in expected)
+        if operator == "ContainsAll":
+            return all(v in values for v in expected)
+        if operator == "ContainsNone":
+            return not any(v in values for v in expected)
+        if operator == "Like":
+            pattern = str(expected).lower()
+            return any(fnmatch.fnmatchcase(str(v).lower(), pattern) for v in values if v is not None)
+        if operator == "IsNull":
+            return (value is None) == bool(expected)
+        if value is None:
+            return False
+        if operator == "GreaterThan":
+            return value > expected
+        if operator == "GreaterThanEqual":
+            return value >= expected
+        if operator == "LessThan":
+            return value < expected
+        if operator == "LessThanEqual":
+            return value <= expected
+        raise ValueError(f"Unsupported filter operator for the local index: {operator}")
+
+    def filter_mask(self, filters):
+        """Boolean row mask for a weaviate Filter tree (None means no filtering)."""
+        if filters is None:
+            return None
+        kind = type(filters).__name__
+        if kind == "_FilterAnd":
+            masks = [self.filter_mask(f) for f in filters.filters]
+            return np.logical_and.reduce(masks)
+        if kind == "_FilterOr":
+            masks = [self.filter_mask(f) for f in filters.filters]
+            return np.logical_or.reduce(masks)
+        if kind == "_FilterNot":
+            inner = filters.filters if isinstance(filters.filters, list) else [filters.filters]
+            return ~np.logical_and.reduce([self.filter_mask(f) for f in inner])
+        target = filters.target if isinstance(filters.target, str) else getattr(filters.target, "target", None)
+        if not isinstance(target, str):
+            raise ValueError(f"Unsupported filter target for the local index: {filters.target!r}")
+        operator = getattr(filters.operator, "value", filters.operator)
+        expected = filters.value
+        if target in ("_id", "id"):
+            expected = [str(v) for v in expected] if isinstance(expected, (list, tuple)) else str(expected)
+        column = self._column(target)
+        return np.fromiter((self._matches(v, operator, expected) for v in column), dtype=bool, count=len(column))
+
+    # --- results ---------------------------------------------------------------
+
+    def _objects(self, rows, return_properties, distances=None, scores=None):
+        objects = []
+        for k, row in enumerate(rows):
+            props = self.rows[row]
+            if return_properties:
+                props = {name: props.get(name) for name in return_properties}
+            objects.append(LocalObject(
+                uuid=self.uuids[row],
+                properties=dict(props),
+                metadata=LocalMetadata(
+                    distance=float(distances[k]) if distances is not None else None,
+                    score=float(scores[k]) if scores is not None else None
+                )
+            ))
+        return LocalQueryReturn(objects=objects)
+
+    # --- WeaviateClient interface ----------------------------------------------
+
+    def query_near_vector(
+        self,
+        near_vector,
+        collection_name=WEAVIATE_COLLECTION_NAME,
+        limit=15,
+        target_vector=None,
+        return_metadata=None,
+        return_properties=None,
+        filters = None
+    ):
+        rows, distances = self._vector_search(near_vector, target_vector, limit, self.filter_mask(filters))
+        return self._objects(rows, return_properties, distances=distances)
+
+    def query_near_text(
+        self,
+        query_text,
+        collection_name=WEAVIATE_COLLECTION_NAME,
+        limit=15,
+        return_properties=None,
+        return_metadata=None,
+        target_vector=None,
+        filters = None
+    ):
+        return self.query_near_vector(
+            self.embedder.embed(query_text), collection_name, limit, target_vector,
+            return_metadata, return_properties, filters
+        )
+
+    def _hybrid(self, query_text, query_vector, limit, alpha, target_vector, filters, return_properties):
+        """Relative-score fusion of vector and BM25 results, as Weaviate's hybrid does."""
+        mask = self.filter_mask(filters)
+        pool = max(limit * 4, 50)
+        vector_rows, distances = self._vector_search(query_vector, target_vector, pool, mask)
+        keyword_scores = self._bm25(query_text)
+        if mask is not None:
+            keyword_scores[~mask] = 0.0
+        keyword_rows = np.argsort(-keyword_scores, kind="stable")[:pool]
+        keyword_rows = keyword_rows[keyword_scores[keyword_rows] > 0]
+
+        def normalized(values):
+            span = values.max() - values.min() if len(values) else 0.0
+            return (values - values.min()) / span if span > 0 else np.ones_like(values)
+
+        fused = {}
+        for row, value in zip(vector_rows, normalized(1.0 - distances)):
+            fused[int(row)] = fused.get(int(row), 0.0) + alpha * float(value)
+        for row, value in zip(keyword_rows, normalized(keyword_scores[keyword_rows])):
+            fused[int(row)] = fused.get(int(row), 0.0) + (1.0 - alpha) * float(value)
+        ranked = sorted(fused, key=lambda row: (-fused[row], row))[:limit]
+        return self._objects(ranked, return_properties, scores=np.asarray([fused[row] for row in ranked]))
+
+    def query_hybrid(
+        self,
+        query_text,
+        collection_name=WEAVIATE_COLLECTION_NAME,
+        limit=15,
+        alpha=0.5,
+        return_properties=None,
+        return_metadata=None,
+        target_vector=None,
+        filters = None
+    ):
+        return self._hybrid(query_text, self.embedder.embed(query_text), limit, alpha, target_vector, filters, return_properties)
+
+    def fetch_objects_by_ids(
+        self,
+        ids,
+        collection_name=WEAVIATE_COLLECTION_NAME,
+        include_vector=False,
+        return_properties=None,
+        return_metadata=None
+    ):
+        rows = [self.uuid_to_row[key] for key in map(str, ids) if key in self.uuid_to_row]
+        return self._objects(rows, return_properties)
+
+
+class AsyncLocalVectorIndex(LocalVectorIndex):
+    """LocalVectorIndex with the AsyncWeaviateClient interface; scans run in a worker thread."""
+
+    async def connect(self):
+        return self
+
+    async def close(self):
+        pass
+
+    async def query_near_vector(self, near_vector, collection_name=WEAVIATE_COLLECTION_NAME, limit=15,
+                                target_vector=None, return_metadata=None, return_properties=None, filters = None):
+        return await asyncio.to_thread(
+            LocalVectorIndex.query_near_vector, self, near_vector, collection_name, limit,
+            target_vector, return_metadata, return_properties, filters
+        )
+
+    async def query_near_text(self, query_text, collection_name=WEAVIATE_COLLECTION_NAME, limit=15,
+                              return_properties=None, return_metadata=None, target_vector=None, filters = None):
+        query_vector = await self.embedder.aembed(query_text)
+        return await self.query_near_vector(
+            query_vector, collection_name, limit, target_vector, return_metadata, return_properties, filters
+        )
+
+    async def query_hybrid(self, query_text, collection_name=WEAVIATE_COLLECTION_NAME, limit=15, alpha=0.5,
+                           return_properties=None, return_metadata=None, target_vector=None, filters = None):
+        query_vector = await self.embedder.aembed(query_text)
+        return await asyncio.to_thread(
+            self._hybrid, query_text, query_vector, limit, alpha, target_vector, filters, return_properties
+        )
+
+    async def fetch_objects_by_ids(self, ids, collection_name=WEAVIATE_COLLECTION_NAME, include_vector=False,
+                                   return_properties=None, return_metadata=None):
+        return LocalVectorIndex.fetch_objects_by_ids(
+            self, ids, collection_name, include_vector, return_properties, return_metadata
+        )
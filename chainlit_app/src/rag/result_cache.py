@@ -0,0 +1,163 @@
+"""
+Memoized search results for the Weaviate clients.
+
+Entries are keyed by query kind, collection, query text (or vector), target vector,
+canonically serialized filters, limit and the requested properties and metadata, so the
+suggested queries and rewritten vocabulary strings that recur across sessions are only
+searched once. Every write to a collection bumps its version token, a small file under
+COLLECTION_VERSION_DIR that the ingestion process and the app both read; a lookup that
+sees a new token drops the cached results. Hits are copies, so callers may mutate the
+result objects (hydration does) without touching the cache.
+"""
+import os
+import copy
+import json
+import uuid
+import hashlib
+import threading
+from app_config import COLLECTION_VERSION_DIR, RESULT_CACHE_SIZE, RESULT_CACHE_TTL
+from modules.cache import MemoryCache
+from modules.tracing import register_gauge
+
+# Operators whose value is a set: ["a", "b"] and ["b", "a"] filter the same objects
+SET_OPERATORS = {"ContainsAny", "ContainsAll", "ContainsNone"}
+
+
+def _version_path(collection_name):
+    return os.path.join(COLLECTION_VERSION_DIR, f"{collection_name}.version")
+
+
+def collection_version(collection_name):
+    """Token that changes on every write to the collection; None if it was never bumped."""
+    try:
+        with open(_version_path(collection_name), encoding="utf-8") as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def bump_collection_version(collection_name):
+    os.makedirs(COLLECTION_VERSION_DIR, exist_ok=True)
+    path = _version_path(collection_name)
+    token = uuid.uuid4().hex
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(token)
+    os.replace(tmp_path, path)
+    return token
+
+
+def _jsonable(value):
+    if value is None or isinstance(value, (str, int, float, bool)):
+        return value
+    if hasattr(value, "model_dump"):
+        return value.model_dump(mode="json")
+    if hasattr(value, "tolist"):
+        return value.tolist()
+    if isinstance(value, dict):
+        return {str(k): _jsonable(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple, set)):
+        return [_jsonable(v) for v in value]
+    return str(value)
+
+
+def _dumps(value):
+    return json.dumps(value, sort_keys=True, ensure_ascii=False)
+
+
+def canonical_filters(filters):
+    """JSON-able form of a weaviate Filter in which operand order and set-value order do not matter."""
+    if filters is None:
+        return None
+    operator = getattr(filters.operator, "value", str(filters.operator))
+    operands = getattr(filters, "filters", None)
+    if operands is not None:  # And / Or / Not
+        parts = []
+        for operand in operands:
+            part = canonical_filters(operand)
+            if operator in ("And", "Or") and part[0] == operator:
+                parts.extend(part[1])  # (a & b) & c == a & (b & c)
+            else:
+                parts.append(part)
+        return [operator, sorted(parts, key=_dumps)]
+    value = _jsonable(filters.value)
+    if operator in SET_OPERATORS and isinstance(value, list):
+        value = sorted(value, key=_dumps)
+    return [operator, _jsonable(filters.target), value]
+
+
+def _copy_response(response):
+    response = copy.copy(response)
+    objects = []
+    for obj in getattr(response, "objects", None) or []:
+        obj = copy.copy(obj)
+        if obj.properties is not None:
+            obj.properties = dict(obj.properties)
+        objects.append(obj)
+    response.objects = objects
+    return response
+
+
+class ResultCache:
+    """LRU+TTL cache of query responses, dropped whenever a queried collection's version changes."""
+
+    def __init__(self, maxsize=RESULT_CACHE_SIZE, ttl=RESULT_CACHE_TTL):
+        self.cache = MemoryCache(maxsize=maxsize, ttl=ttl)
+        self.invalidations = 0
+        self._versions = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(kind, collection_name, **params):
+        """Cache key of a query; ``params`` are its keyword arguments."""
+        canonical = {}
+        for name, value in params.items():
+            if name == "filters":
+                value = canonical_filters(value)
+            elif name == "return_properties" and isinstance(value, (list, tuple)):
+                value = sorted(value)
+            else:
+                value = _jsonable(value)
+            canonical[name] = value
+        return hashlib.sha256(_dumps([kind, collection_name, canonical]).encode("utf-8")).hexdigest()
+
+    def _check_version(self, collection_name):
+        version = collection_version(collection_name)
+        with self._lock:
+            if collection_name in self._versions and self._versions[collection_name] != version:
+                self.cache.clear()
+                self.invalidations += 1
+                print(f"Collection {collection_name} changed, search result cache cleared")
+            self._versions[collection_name] = version
+        return version
+
+    def get(self, collection_name, key):
+        self._check_version(collection_name)
+        response = self.cache.get(key)
+        return _copy_response(response) if response is not None else None
+
+    def set(self, collection_name, key, response):
+        # A write that landed while the query ran makes its response stale
+        if collection_version(collection_name) != self._versions.get(collection_name):
+            return
+        self.cache.set(key, _copy_response(response))
+
+    def invalidate(self, collection_name):
+        """Bump the collection's version so this and every other process drop their results."""
+        bump_collection_version(collection_name)
+        self._check_version(collection_name)
+
+    def metrics(self):
+        return {**self.cache.stats.to_dict(), "invalidations": self.invalidations, "entries": len(self.cache)}
+
+
+_result_cache = None
+
+
+def get_result_cache() -> ResultCache:
+    """Shared by the sync and async clients of a process."""
+    global _result_cache
+    if _result_cache is None:
+        _result_cache = ResultCache()
+        register_gauge("search_result_cache", _result_cache.metrics)
+    return _result_cache
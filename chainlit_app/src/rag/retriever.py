@@ -1,34 +1,152 @@
+import time
 import openai
 from weaviate.classes.query import MetadataQuery
+from modules.tracing import span
+from rag.hydration import Hydrator
+from app_config import INGEST_SEGMENT_SIZE, INGEST_BATCH_SIZE, INGEST_CONCURRENCY, INGEST_RETRIES
+
+
+def _count(response):
+    return len(getattr(response, "objects", None) or [])
+
 
 class Retriever:
-    def __init__(self, client, collection_name="dviz_c_structured_v3", return_properties=None, target_vector=None):
+    """
+    Named-vector and hybrid search over one collection.
+
+    With ``candidate_properties`` the searches return only those (two-phase retrieval);
+    ``hydrate`` then fetches the rest of ``return_properties`` for the objects that need them.
+    """
+
+    def __init__(self, client, collection_name="dviz_c_structured_v3", return_properties=None, target_vector=None,
+                 candidate_properties=None):
         self.client = client  # This is your WeaviateClient wrapper
         self.collection_name = collection_name
         self.return_properties = return_properties or ["image_url", "section_11_description"]
         self.target_vector = target_vector
-        
+        self.candidate_properties = candidate_properties
+        self.hydrator = Hydrator(
+            client, collection_name,
+            [name for name in self.return_properties if name not in (candidate_properties or [])]
+        )
+
+    @property
+    def query_properties(self):
+        return self.candidate_properties or self.return_properties
+
+    def hydrate(self, objects):
+        return self.hydrator.hydrate_sync(objects)
+
     def retrieve(self, query_text, limit=15, filters=None):
         # Call the wrapper method, not the direct client
-        return self.client.query_near_text(
-            query_text=query_text,
-            collection_name=self.collection_name,
-            limit=limit,
-            target_vector=self.target_vector,
-            return_metadata=MetadataQuery(distance=True),
-            return_properties=self.return_properties,
-            filters=filters
-        )
+        with span("retriever.retrieve", limit=limit, target_vector=self.target_vector) as trace:
+            response = self.client.query_near_text(
+                query_text=query_text,
+                collection_name=self.collection_name,
+                limit=limit,
+                target_vector=self.target_vector,
+                return_metadata=MetadataQuery(distance=True),
+                return_properties=self.query_properties,
+                filters=filters
+            )
+            trace.set_attribute("candidates", _count(response))
+            return response
 
     def hybrid_retrieve(self, query_text, limit=15, alpha=0.5, filters=None):
         # Call the wrapper method, not the direct client
-        return self.client.query_hybrid(
-            query_text=query_text,
-            collection_name=self.collection_name,
-            limit=limit,
-            alpha=alpha,
-            target_vector=self.target_vector,
-            return_metadata=MetadataQuery(score=True),
-            return_properties=self.return_properties,
-            filters=filters
-        )
\ No newline at end of file
+        with span("retriever.hybrid_retrieve", limit=limit, target_vector=self.target_vector) as trace:
+            response = self.client.query_hybrid(
+                query_text=query_text,
+                collection_name=self.collection_name,
+                limit=limit,
+                alpha=alpha,
+                target_vector=self.target_vector,
+                return_metadata=MetadataQuery(score=True),
+                return_properties=self.query_properties,
+                filters=filters
+            )
+            trace.set_attribute("candidates", _count(response))
+            return response
+
+    def index_documents(self, documents, segment_size=INGEST_SEGMENT_SIZE, batch_size=INGEST_BATCH_SIZE,
+                        concurrent_requests=INGEST_CONCURRENCY, retries=INGEST_RETRIES):
+        """
+        Write documents ({"uuid", "properties"} dicts) with the client's batch API, one
+        segment at a time. Objects that fail are retried with backoff; after each segment
+        ``documents.commit(segment, failed)`` is called when the stream supports it
+        (see rag.document_loader.DocumentStream), so an interrupted run can resume.
+        """
+        commit = getattr(documents, "commit", None)
+        stats = {"indexed": 0, "failed": 0}
+        start = time.perf_counter()
+        segment = []
+        for document in documents:
+            segment.append(document)
+            if len(segment) >= segment_size:
+                self._index_segment(segment, batch_size, concurrent_requests, retries, stats, commit)
+                segment = []
+                rate = stats["indexed"] / (time.perf_counter() - start)
+                print(f"Indexed {stats['indexed']} documents ({rate:.0f}/s), {stats['failed']} failed")
+        if segment:
+            self._index_segment(segment, batch_size, concurrent_requests, retries, stats, commit)
+        print(f"Indexing finished: {stats['indexed']} indexed, {stats['failed']} failed in {time.perf_counter() - start:.1f}s")
+        return stats
+
+    def _index_segment(self, segment, batch_size, concurrent_requests, retries, stats, commit):
+        with span("retriever.index_segment", documents=len(segment)) as trace:
+            pending = {document["uuid"]: document for document in segment}
+            for attempt in range(retries + 1):
+                failed = self.client.batch_insert(
+                    [(uuid, document["properties"]) for uuid, document in pending.items()],
+                    collection_name=self.collection_name,
+                    batch_size=batch_size,
+                    concurrent_requests=concurrent_requests
+                )
+                failed_ids = {object_uuid for object_uuid, _, _ in failed}
+                pending = {uuid: document for uuid, document in pending.items() if uuid in failed_ids}
+                if not pending:
+                    break
+                print(f"{len(pending)} objects failed (e.g. {failed[0][2]}), attempt {attempt + 1}/{retries + 1}")
+                if attempt < retries:
+                    time.sleep(min(30.0, 2.0 ** attempt))
+            stats["indexed"] += len(segment) - len(pending)
+            stats["failed"] += len(pending)
+            trace.set_attribute("failed", len(pending))
+            if commit is not None:
+                commit(segment, list(pending.values()))
+
+
+class AsyncRetriever(Retriever):
+    """Same queries as Retriever, awaited against an AsyncWeaviateClient."""
+
+    async def hydrate(self, objects):
+        return await self.hydrator.hydrate(objects)
+
+    async def retrieve(self, query_text, limit=15, filters=None):
+        with span("retriever.retrieve", limit=limit, target_vector=self.target_vector) as trace:
+            response = await self.client.query_near_text(
+                query_text=query_text,
+                collection_name=self.collection_name,
+                limit=limit,
+                target_vector=self.target_vector,
+                return_metadata=MetadataQuery(distance=True),
+                return_properties=self.query_properties,
+                filters=filters
+            )
+            trace.set_attribute("candidates", _count(response))
+            return response
+
+    async def hybrid_retrieve(self, query_text, limit=15, alpha=0.5, filters=None):
+        with span("retriever.hybrid_retrieve", limit=limit, target_vector=self.target_vector) as trace:
+            response = await self.client.query_hybrid(
+                query_text=query_text,
+                collection_name=self.collection_name,
+                limit=limit,
+                alpha=alpha,
+                target_vector=self.target_vector,
+                return_metadata=MetadataQuery(score=True),
+                return_properties=self.query_properties,
+                filters=filters
+            )
+            trace.set_attribute("candidates", _count(response))
+            return response
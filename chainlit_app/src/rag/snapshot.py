@@ -0,0 +1,273 @@
+"""
+Export the collection to a local snapshot: properties in Parquet, named vectors in .npy.
+
+Objects are streamed with the Weaviate cursor iterator and spilled to disk every
+``chunk_size`` objects, so memory stays bounded by one chunk regardless of the
+collection size. The chunks are then merged into the layout rag.local_index reads
+and swapped in place of the previous snapshot.
+
+Incremental runs list ids and last-update times only, re-fetch objects changed since
+the previous export (with their vectors), drop deleted ones and carry the rest over
+from the old snapshot.
+
+    cd src && python -m rag.snapshot --out data/index/dviz_c_structured_v3
+    cd src && python -m rag.snapshot --out data/index/dviz_c_structured_v3 --incremental
+"""
+import os
+import json
+import time
+import uuid
+import shutil
+import argparse
+import datetime
+import dataclasses
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+from weaviate.classes.query import MetadataQuery
+from app_config import WEAVIATE_COLLECTION_NAME, LOCAL_INDEX_DIR
+from rag.local_index import MANIFEST_FILE, PROPERTIES_FILE, VECTORS_DIR
+
+CHUNK_SIZE = 1000
+PARTS_DIR = "parts"
+
+
+def _plain(value):
+    """Convert client value types (UUID, GeoCoordinate, ...) into something Arrow can store."""
+    if isinstance(value, uuid.UUID):
+        return str(value)
+    if isinstance(value, dict):
+        return {k: _plain(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_plain(v) for v in value]
+    if dataclasses.is_dataclass(value):
+        return _plain(dataclasses.asdict(value))
+    if hasattr(value, "model_dump"):
+        return _plain(value.model_dump())
+    return value
+
+
+def _timestamp_ms(obj):
+    updated = getattr(getattr(obj, "metadata", None), "last_update_time", None)
+    if isinstance(updated, datetime.datetime):
+        return int(updated.timestamp() * 1000)
+    return 0
+
+
+def _conform(table, schema):
+    """Add missing columns as nulls and cast to the merged schema."""
+    columns = [
+        table.column(f.name).cast(f.type) if f.name in table.column_names else pa.nulls(table.num_rows, type=f.type)
+        for f in schema
+    ]
+    return pa.Table.from_arrays(columns, schema=schema)
+
+
+class _ChunkWriter:
+    """Buffers up to ``chunk_size`` objects and spills each chunk to a Parquet and .npy part."""
+
+    def __init__(self, parts_dir, chunk_size=CHUNK_SIZE):
+        self.parts_dir = parts_dir
+        self.chunk_size = chunk_size
+        self.parts = []  # (properties path, {vector name: path}, rows)
+        self.dims = {}
+        self.rows = 0
+        self.max_update_ms = 0
+        self._buffer = []
+        os.makedirs(parts_dir, exist_ok=True)
+
+    def add(self, obj):
+        self._buffer.append(obj)
+        self.max_update_ms = max(self.max_update_ms, _timestamp_ms(obj))
+        if len(self._buffer) >= self.chunk_size:
+            self.flush()
+
+    def flush(self):
+        if not self._buffer:
+            return
+        k = len(self.parts)
+        records = [{"uuid": str(obj.uuid), **_plain(dict(obj.properties or {}))} for obj in self._buffer]
+        properties_path = os.path.join(self.parts_dir, f"properties-{k:05d}.parquet")
+        pq.write_table(pa.Table.from_pylist(records), properties_path)
+
+        names = {name for obj in self._buffer for name in (obj.vector or {})}
+        vector_paths = {}
+        for name in sorted(names):
+            dim = self.dims.setdefault(name, len(next(obj.vector[name] for obj in self._buffer if name in (obj.vector or {}))))
+            array = np.zeros((len(self._buffer), dim), dtype=np.float32)
+            for i, obj in enumerate(self._buffer):
+                vector = (obj.vector or {}).get(name)
+                if vector is not None:
+                    array[i] = vector
+            vector_paths[name] = os.path.join(self.parts_dir, f"{name}-{k:05d}.npy")
+            np.save(vector_paths[name], array)
+
+        self.parts.append((properties_path, vector_paths, len(self._buffer)))
+        self.rows += len(self._buffer)
+        self._buffer = []
+
+
+def _load_manifest(snapshot_dir):
+    path = os.path.join(snapshot_dir, MANIFEST_FILE)
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def _merge(out_dir, staging_dir, writer, collection_name, old_manifest=None, keep=None, batch_size=CHUNK_SIZE):
+    """
+    Write the final snapshot into ``staging_dir``: rows of the old snapshot selected by
+    ``keep`` first, then every spilled chunk, one batch at a time.
+    """
+    old_properties = os.path.join(out_dir, PROPERTIES_FILE)
+    schemas = [pq.read_schema(path) for path, _, _ in writer.parts]
+    dims = dict(writer.dims)
+    if old_manifest is not None:
+        schemas.insert(0, pq.read_schema(old_properties))
+        for name, info in old_manifest.get("vectors", {}).items():
+            dims.setdefault(name, info["dim"])
+    schema = pa.unify_schemas(schemas, promote_options="permissive")
+    total = int(keep.sum() if keep is not None else 0) + writer.rows
+
+    os.makedirs(os.path.join(staging_dir, VECTORS_DIR), exist_ok=True)
+    vectors = {
+        name: np.lib.format.open_memmap(
+            os.path.join(staging_dir, VECTORS_DIR, f"{name}.npy"), mode="w+", dtype=np.float32, shape=(total, dim)
+        )
+        for name, dim in dims.items()
+    }
+    row = 0
+    with pq.ParquetWriter(os.path.join(staging_dir, PROPERTIES_FILE), schema) as properties:
+        if old_manifest is not None and keep is not None and keep.any():
+            old_vectors = {
+                name: np.load(os.path.join(out_dir, VECTORS_DIR, f"{name}.npy"), mmap_mode="r")
+                for name in old_manifest.get("vectors", {})
+            }
+            offset = 0
+            for batch in pq.ParquetFile(old_properties).iter_batches(batch_size=batch_size):
+                mask = keep[offset:offset + batch.num_rows]
+                n_kept = int(mask.sum())
+                if n_kept:
+                    properties.write_table(_conform(pa.Table.from_batches([batch]).filter(pa.array(mask)), schema))
+                    for name, array in old_vectors.items():
+                        vectors[name][row:row + n_kept] = array[offset:offset + batch.num_rows][mask]
+                    row += n_kept
+                offset += batch.num_rows
+
+        for properties_path, vector_paths, n_rows in writer.parts:
+            properties.write_table(_conform(pq.read_table(properties_path), schema))
+            for name, path in vector_paths.items():
+                vectors[name][row:row + n_rows] = np.load(path, mmap_mode="r")
+            row += n_rows
+
+    for array in vectors.values():
+        array.flush()
+
+    manifest = {
+        "collection": collection_name,
+        "count": total,
+        "vectors": {name: {"dim": dim} for name, dim in dims.items()},
+        "last_update_time": max(writer.max_update_ms, (old_manifest or {}).get("last_update_time", 0)),
+        "exported_at": int(time.time() * 1000),
+    }
+    with open(os.path.join(staging_dir, MANIFEST_FILE), "w") as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+
+def _swap(staging_dir, out_dir):
+    previous = f"{out_dir}.previous"
+    shutil.rmtree(previous, ignore_errors=True)
+    if os.path.exists(out_dir):
+        os.rename(out_dir, previous)
+    os.rename(staging_dir, out_dir)
+    shutil.rmtree(previous, ignore_errors=True)
+
+
+def export_snapshot(client, out_dir=LOCAL_INDEX_DIR, collection_name=WEAVIATE_COLLECTION_NAME,
+                    chunk_size=CHUNK_SIZE, incremental=False):
+    """
+    Export ``collection_name`` through a WeaviateClient into ``out_dir``.
+
+    With ``incremental`` and an existing snapshot, only objects updated since its
+    ``last_update_time`` are fetched again. Returns the new manifest.
+    """
+    out_dir = os.path.normpath(out_dir)
+    staging_dir = f"{out_dir}.staging"
+    shutil.rmtree(staging_dir, ignore_errors=True)
+    writer = _ChunkWriter(os.path.join(staging_dir, PARTS_DIR), chunk_size)
+    old_manifest = _load_manifest(out_dir) if incremental else None
+    keep = None
+    start = time.perf_counter()
+
+    try:
+        if old_manifest is None:
+            for obj in client.iterate_objects(
+                collection_name=collection_name,
+                include_vector=True,
+                return_metadata=MetadataQuery(last_update_time=True),
+                cache_size=chunk_size
+            ):
+                writer.add(obj)
+            writer.flush()
+        else:
+            since = old_manifest.get("last_update_time", 0)
+            current, changed = set(), []
+            for obj in client.iterate_objects(
+                collection_name=collection_name,
+                return_properties=[],
+                return_metadata=MetadataQuery(last_update_time=True),
+                cache_size=max(chunk_size, 1000)
+            ):
+                object_id = str(obj.uuid)
+                current.add(object_id)
+                if _timestamp_ms(obj) > since:
+                    changed.append(object_id)
+
+            old_ids = pq.read_table(os.path.join(out_dir, PROPERTIES_FILE), columns=["uuid"]).column("uuid").to_pylist()
+            changed_set = set(changed)
+            keep = np.fromiter((u in current and u not in changed_set for u in map(str, old_ids)), dtype=bool, count=len(old_ids))
+            deleted = len(old_ids) - len(current & set(map(str, old_ids)))
+            print(f"Incremental export: {len(changed)} changed, {deleted} deleted, {int(keep.sum())} unchanged")
+            if not changed and not deleted:
+                shutil.rmtree(staging_dir, ignore_errors=True)
+                return old_manifest
+
+            for k in range(0, len(changed), chunk_size):
+                response = client.fetch_objects_by_ids(
+                    changed[k:k + chunk_size],
+                    collection_name=collection_name,
+                    include_vector=True,
+                    return_metadata=MetadataQuery(last_update_time=True)
+                )
+                for obj in response.objects:
+                    writer.add(obj)
+            writer.flush()
+
+        manifest = _merge(out_dir, staging_dir, writer, collection_name, old_manifest, keep, batch_size=chunk_size)
+        shutil.rmtree(os.path.join(staging_dir, PARTS_DIR), ignore_errors=True)
+        _swap(staging_dir, out_dir)
+    except BaseException:
+        shutil.rmtree(staging_dir, ignore_errors=True)
+        raise
+
+    print(f"Exported {manifest['count']} objects to {out_dir} in {time.perf_counter() - start:.1f}s")
+    return manifest
+
+
+if __name__ == "__main__":
+    from rag.weaviate_client import WeaviateClient
+
+    parser = argparse.ArgumentParser(description="Export the Weaviate collection to a local snapshot.")
+    parser.add_argument("--out", default=LOCAL_INDEX_DIR)
+    parser.add_argument("--collection", default=WEAVIATE_COLLECTION_NAME)
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+    parser.add_argument("--incremental", action="store_true", help="only re-fetch objects updated since the last export")
+    args = parser.parse_args()
+
+    weaviate_client = WeaviateClient()
+    try:
+        export_snapshot(weaviate_client, args.out, args.collection, args.chunk_size, args.incremental)
+    finally:
+        weaviate_client.client.close()
@@ -4,8 +4,10 @@ import weaviate
 from dotenv import load_dotenv
 import re
 import urllib.parse
+from weaviate.classes.query import Filter
 load_dotenv()
-from app_config import WEAVIATE_CLOUD_URL, WEAVIATE_CLUSTER_API_KEY, WEAVIATE_COLLECTION_NAME, Mistral_API_KEY
+from app_config import WEAVIATE_CLOUD_URL, WEAVIATE_CLUSTER_API_KEY, WEAVIATE_COLLECTION_NAME, Mistral_API_KEY, RESULT_CACHE_ENABLED
+from rag.result_cache import get_result_cache, bump_collection_version
 
 class WeaviateClient:
     def __init__(self):
@@ -21,11 +23,22 @@ class WeaviateClient:
             auth_credentials=weaviate.AuthApiKey(weaviate_api_key),
             headers=headers
         )
+        self.result_cache = get_result_cache() if RESULT_CACHE_ENABLED else None
         print(f"Successfully connected to Weaviate at {weaviate_url}")
 
     def get_collection(self, collection_name=WEAVIATE_COLLECTION_NAME):
         return self.client.collections.get(collection_name)
 
+    def _cached(self, kind, collection_name, search, **params):
+        if self.result_cache is None:
+            return search(**params)
+        key = self.result_cache.key(kind, collection_name, **params)
+        response = self.result_cache.get(collection_name, key)
+        if response is None:
+            response = search(**params)
+            self.result_cache.set(collection_name, key, response)
+        return response
+
     def query_near_text(
         self,
         query_text,
@@ -37,7 +50,8 @@ class WeaviateClient:
         filters = None
     ):
         collection = self.get_collection(collection_name)
-        return collection.query.near_text(
+        return self._cached(
+            "near_text", collection_name, collection.query.near_text,
             query=query_text,
             limit=limit,
             return_properties=return_properties,
@@ -58,7 +72,8 @@ class WeaviateClient:
         filters = None
     ):
         collection = self.get_collection(collection_name)
-        return collection.query.hybrid(
+        return self._cached(
+            "hybrid", collection_name, collection.query.hybrid,
             query=query_text,
             limit=limit,
             alpha=alpha,
@@ -79,16 +94,202 @@ class WeaviateClient:
         filters = None
     ):
         collection = self.get_collection(collection_name)
-        return collection.query.near_vector(
+        return self._cached(
+            "near_vector", collection_name, collection.query.near_vector,
+            near_vector=near_vector,
+            limit=limit,
+            target_vector=target_vector,
+            return_metadata=return_metadata,
+            return_properties=return_properties,
+            filters=filters
+
+        )
+
+    def iterate_objects(
+        self,
+        collection_name=WEAVIATE_COLLECTION_NAME,
+        include_vector=False,
+        return_properties=None,
+        return_metadata=None,
+        cache_size=None
+    ):
+        """Stream every object of the collection with the server-side cursor, ``cache_size`` per page."""
+        collection = self.get_collection(collection_name)
+        return collection.iterator(
+            include_vector=include_vector,
+            return_properties=return_properties,
+            return_metadata=return_metadata,
+            cache_size=cache_size
+        )
+
+    def fetch_objects_by_ids(
+        self,
+        ids,
+        collection_name=WEAVIATE_COLLECTION_NAME,
+        include_vector=False,
+        return_properties=None,
+        return_metadata=None
+    ):
+        collection = self.get_collection(collection_name)
+        return collection.query.fetch_objects(
+            filters=Filter.by_id().contains_any(list(ids)),
+            limit=len(ids),
+            include_vector=include_vector,
+            return_properties=return_properties,
+            return_metadata=return_metadata
+        )
+
+    def batch_insert(self, objects, collection_name=WEAVIATE_COLLECTION_NAME, batch_size=None, concurrent_requests=2):
+        """
+        Insert (uuid, properties) pairs with the batch API: dynamic batching by default,
+        fixed-size batches sent ``concurrent_requests`` at a time when ``batch_size`` is set.
+        Returns the failed objects as (uuid, properties, message) tuples.
+        """
+        collection = self.get_collection(collection_name)
+        batcher = collection.batch.fixed_size(batch_size, concurrent_requests) if batch_size else collection.batch.dynamic()
+        with batcher as batch:
+            for object_uuid, properties in objects:
+                batch.add_object(properties=properties, uuid=object_uuid)
+        bump_collection_version(collection_name)
+        return [
+            (str(failed.object_.uuid), failed.object_.properties, failed.message)
+            for failed in collection.batch.failed_objects
+        ]
+
+    @property
+    def collections(self):
+        return self.client.collections
+
+class AsyncWeaviateClient:
+    """Async counterpart of WeaviateClient, backed by weaviate's WeaviateAsyncClient.
+
+    The connection is opened lazily by ``connect()``, which is safe to call on
+    every chat start.
+    """
+
+    def __init__(self):
+        weaviate_url = WEAVIATE_CLOUD_URL
+        weaviate_api_key = WEAVIATE_CLUSTER_API_KEY
+        headers = {}
+        if Mistral_API_KEY:
+            headers["X-Mistral-Api-Key"] = Mistral_API_KEY
+
+        self.client = weaviate.use_async_with_weaviate_cloud(
+            cluster_url=weaviate_url,
+            auth_credentials=weaviate.AuthApiKey(weaviate_api_key),
+            headers=headers
+        )
+        self._weaviate_url = weaviate_url
+        self.result_cache = get_result_cache() if RESULT_CACHE_ENABLED else None
+
+    async def connect(self):
+        if not self.client.is_connected():
+            await self.client.connect()
+            print(f"Successfully connected (async) to Weaviate at {self._weaviate_url}")
+        return self
+
+    async def close(self):
+        await self.client.close()
+
+    def get_collection(self, collection_name=WEAVIATE_COLLECTION_NAME):
+        return self.client.collections.get(collection_name)
+
+    async def _cached(self, kind, collection_name, search, **params):
+        if self.result_cache is None:
+            return await search(**params)
+        key = self.result_cache.key(kind, collection_name, **params)
+        response = self.result_cache.get(collection_name, key)
+        if response is None:
+            response = await search(**params)
+            self.result_cache.set(collection_name, key, response)
+        return response
+
+    async def query_near_text(
+        self,
+        query_text,
+        collection_name=WEAVIATE_COLLECTION_NAME,
+        limit=15,
+        return_properties=None,
+        return_metadata=None,
+        target_vector=None,
+        filters = None
+    ):
+        await self.connect()
+        collection = self.get_collection(collection_name)
+        return await self._cached(
+            "near_text", collection_name, collection.query.near_text,
+            query=query_text,
+            limit=limit,
+            return_properties=return_properties,
+            return_metadata=return_metadata,
+            target_vector=target_vector,
+            filters=filters
+        )
+
+    async def query_hybrid(
+        self,
+        query_text,
+        collection_name=WEAVIATE_COLLECTION_NAME,
+        limit=15,
+        alpha=0.5,
+        return_properties=None,
+        return_metadata=None,
+        target_vector=None,
+        filters = None
+    ):
+        await self.connect()
+        collection = self.get_collection(collection_name)
+        return await self._cached(
+            "hybrid", collection_name, collection.query.hybrid,
+            query=query_text,
+            limit=limit,
+            alpha=alpha,
+            return_properties=return_properties,
+            return_metadata=return_metadata,
+            target_vector=target_vector,
+            filters=filters
+        )
+
+    async def query_near_vector(
+        self,
+        near_vector,
+        collection_name=WEAVIATE_COLLECTION_NAME,
+        limit=15,
+        target_vector=None,
+        return_metadata=None,
+        return_properties=None,
+        filters = None
+    ):
+        await self.connect()
+        collection = self.get_collection(collection_name)
+        return await self._cached(
+            "near_vector", collection_name, collection.query.near_vector,
             near_vector=near_vector,
             limit=limit,
             target_vector=target_vector,
             return_metadata=return_metadata,
             return_properties=return_properties,
             filters=filters
+        )
 
+    async def fetch_objects_by_ids(
+        self,
+        ids,
+        collection_name=WEAVIATE_COLLECTION_NAME,
+        include_vector=False,
+        return_properties=None,
+        return_metadata=None
+    ):
+        await self.connect()
+        collection = self.get_collection(collection_name)
+        return await collection.query.fetch_objects(
+            filters=Filter.by_id().contains_any(list(ids)),
+            limit=len(ids),
+            include_vector=include_vector,
+            return_properties=return_properties,
+            return_metadata=return_metadata
         )
 
     @property
     def collections(self):
-        return self.client.collections
\ No newline at end of file
+        return self.client.collections
@@ -1,22 +1,37 @@
-import requests
 import json
-from openai import OpenAI
-from rag.weaviate_client import WeaviateClient
-from rag.retriever import Retriever
-from modules.image_utils import process_image_bytes, image_bytes_to_base64
+from openai import OpenAI, AsyncOpenAI
+from rag.weaviate_client import WeaviateClient, AsyncWeaviateClient
+from rag.retriever import Retriever, AsyncRetriever
+from rag.local_index import LocalVectorIndex, AsyncLocalVectorIndex
+from app_config import VECTOR_BACKEND
+from modules.image_utils import prepare_image_async, image_bytes_to_base64
+from modules.http_fetcher import fetch_image_bytes
 from prompts.image_prompts import IMAGE_PROMPT
 
 def get_openai_client(api_key, base_url):
     return OpenAI(api_key=api_key, base_url=base_url)
 
+def get_async_openai_client(api_key, base_url):
+    return AsyncOpenAI(api_key=api_key, base_url=base_url)
+
 def get_weaviate_client():
+    if VECTOR_BACKEND == "local":
+        return LocalVectorIndex()
     return WeaviateClient()
 
-def get_retriever(client, collection_name, properties, vector):
-    return Retriever(client=client, collection_name=collection_name, return_properties=properties, target_vector=vector)
+def get_async_weaviate_client():
+    if VECTOR_BACKEND == "local":
+        return AsyncLocalVectorIndex()
+    return AsyncWeaviateClient()
+
+def get_retriever(client, collection_name, properties, vector, candidate_properties=None):
+    return Retriever(client=client, collection_name=collection_name, return_properties=properties, target_vector=vector, candidate_properties=candidate_properties)
+
+def get_async_retriever(client, collection_name, properties, vector, candidate_properties=None):
+    return AsyncRetriever(client=client, collection_name=collection_name, return_properties=properties, target_vector=vector, candidate_properties=candidate_properties)
 
 async def analyze_image(client, img_base64: str, prompt: str, model: str = "moonshot-v1-8k-vision-preview"):
-    response = client.chat.completions.create(
+    response = await client.chat.completions.create(
         model=model,
         messages=[{
             "role": "user",
@@ -30,8 +45,8 @@ async def analyze_image(client, img_base64: str, prompt: str, model: str = "moon
 
 async def process_uploaded_image(client, image_file):
     try:
-        image_content = process_image_bytes(image_file.content)
-        img_base = image_bytes_to_base64(image_content)
+        prepared = await prepare_image_async(image_file.content)
+        img_base = image_bytes_to_base64(prepared.data)
         description = await analyze_image(client, img_base, IMAGE_PROMPT)
         return description
     except Exception as e:
@@ -40,12 +55,11 @@ async def process_uploaded_image(client, image_file):
 
 async def process_image_from_url(client, image_url: str):
     try:
-        response = requests.get(image_url, timeout=10)
-        response.raise_for_status()
-        image_content = process_image_bytes(response.content)
-        img_base = image_bytes_to_base64(image_content)
+        raw_bytes = await fetch_image_bytes(image_url)
+        prepared = await prepare_image_async(raw_bytes)
+        img_base = image_bytes_to_base64(prepared.data)
         description = await analyze_image(client, img_base, IMAGE_PROMPT)
         return description
     except Exception as e:
         print(f"Error processing image from URL: {e}")
-        return None
\ No newline at end of file
+        return None
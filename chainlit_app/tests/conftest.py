@@ -0,0 +1,8 @@
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+# On-disk caches and version tokens are created at import time; keep them out of the tree
+os.environ.setdefault("CACHE_DIR", tempfile.mkdtemp(prefix="chainlit_app_tests_"))
@@ -0,0 +1,77 @@
+import pytest
+from modules import cache as cache_module
+from modules.cache import MemoryCache, SqliteCache, make_cache
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(cache_module.time, "time", lambda: now[0])
+    return now
+
+
+def test_memory_cache_evicts_least_recently_used():
+    cache = MemoryCache(maxsize=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1  # "b" is now the oldest
+    cache.set("c", 3)
+    assert cache.get("b") is None
+    assert cache.get("a") == 1 and cache.get("c") == 3
+    assert cache.stats.evictions == 1
+
+
+def test_memory_cache_expires_entries(clock):
+    cache = MemoryCache(ttl=10)
+    cache.set("a", 1)
+    clock[0] += 9
+    assert cache.get("a") == 1
+    clock[0] += 2
+    assert cache.get("a", "gone") == "gone"
+    assert cache.stats.expirations == 1
+    assert len(cache) == 0
+
+
+def test_memory_cache_stats():
+    cache = MemoryCache()
+    cache.set("a", 1)
+    cache.get("a")
+    cache.get("b")
+    assert cache.stats.to_dict() == {"hits": 1, "misses": 1, "evictions": 0, "expirations": 0, "hit_rate": 0.5}
+
+
+def test_sqlite_cache_survives_reopen(tmp_path):
+    path = str(tmp_path / "cache.sqlite")
+    SqliteCache(path).set("a", {"rewrite": "scatter plot"})
+    assert SqliteCache(path).get("a") == {"rewrite": "scatter plot"}
+
+
+def test_sqlite_cache_evicts_least_recently_used(tmp_path, clock):
+    cache = SqliteCache(str(tmp_path / "cache.sqlite"), maxsize=2)
+    cache.set("a", 1)
+    clock[0] += 1
+    cache.set("b", 2)
+    clock[0] += 1
+    assert cache.get("a") == 1
+    clock[0] += 1
+    cache.set("c", 3)
+    assert cache.get("b") is None
+    assert cache.get("a") == 1 and cache.get("c") == 3
+    assert len(cache) == 2
+
+
+def test_sqlite_cache_expires_entries(tmp_path, clock):
+    cache = SqliteCache(str(tmp_path / "cache.sqlite"), ttl=10)
+    cache.set("a", 1)
+    clock[0] += 11
+    assert cache.get("a") is None
+    assert cache.stats.expirations == 1
+
+
+def test_make_cache_backends(tmp_path):
+    assert isinstance(make_cache("memory"), MemoryCache)
+    assert isinstance(make_cache("disk", path=str(tmp_path / "c.sqlite")), SqliteCache)
+    with pytest.raises(ValueError):
+        make_cache("disk")
+    with pytest.raises(ValueError):
+        make_cache("redis")
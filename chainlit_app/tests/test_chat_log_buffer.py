@@ -0,0 +1,85 @@
+import asyncio
+import pytest
+import db
+from db import ChatLogBuffer, DBClient
+
+
+@pytest.fixture
+def written(monkeypatch):
+    batches = []
+
+    async def run(fn):
+        fn(None)
+
+    monkeypatch.setattr(DBClient, "run", run)
+    monkeypatch.setattr(db, "_write_messages", lambda conn, batch: batches.append(list(batch)))
+    return batches
+
+
+def flat(batches):
+    return [message for batch in batches for message in batch]
+
+
+def test_batches_are_bounded_and_ordered(written):
+    async def main():
+        buffer = ChatLogBuffer(batch_size=2, flush_interval=0.01, max_size=10)
+        for i in range(5):
+            await buffer.put(i)
+        await buffer.close()
+
+    asyncio.run(main())
+    assert flat(written) == [0, 1, 2, 3, 4]
+    assert all(len(batch) <= 2 for batch in written)
+
+
+def test_drop_new_rejects_when_full(written):
+    async def main():
+        buffer = ChatLogBuffer(batch_size=10, flush_interval=0.01, max_size=2, policy="drop_new")
+        accepted = [await buffer.put(i) for i in range(3)]
+        await buffer.close()
+        return accepted
+
+    assert asyncio.run(main()) == [True, True, False]
+    assert flat(written) == [0, 1]
+
+
+def test_drop_oldest_keeps_the_newest(written):
+    async def main():
+        buffer = ChatLogBuffer(batch_size=10, flush_interval=0.01, max_size=2, policy="drop_oldest")
+        for i in range(3):
+            await buffer.put(i)
+        await buffer.close()
+
+    asyncio.run(main())
+    assert flat(written) == [1, 2]
+
+
+def test_block_waits_for_the_writer(written):
+    async def main():
+        buffer = ChatLogBuffer(batch_size=10, flush_interval=0.01, max_size=2, policy="block")
+        await asyncio.wait_for(asyncio.gather(*(buffer.put(i) for i in range(5))), timeout=5)
+        await buffer.close()
+
+    asyncio.run(main())
+    assert sorted(flat(written)) == [0, 1, 2, 3, 4]
+
+
+def test_flush_returns_after_a_failed_write(monkeypatch):
+    async def run(fn):
+        raise RuntimeError("database down")
+
+    monkeypatch.setattr(DBClient, "run", run)
+
+    async def main():
+        buffer = ChatLogBuffer(batch_size=10, flush_interval=0.01, max_size=10)
+        await buffer.put(0)
+        await asyncio.wait_for(buffer.flush(), timeout=5)
+        await buffer.close()
+        return buffer.qsize()
+
+    assert asyncio.run(main()) == 0
+
+
+def test_unknown_policy_is_rejected():
+    with pytest.raises(ValueError):
+        ChatLogBuffer(policy="drop_everything")
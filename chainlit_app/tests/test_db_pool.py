@@ -0,0 +1,90 @@
+import contextlib
+import psycopg2
+import pytest
+from db import DBClient, POSTGRES_POOL_MAX
+
+
+class FakeConnection:
+    closed = 0
+    autocommit = False
+
+    def __setattr__(self, name, value):
+        if name == "autocommit" and self.closed:
+            raise psycopg2.InterfaceError("connection already closed")
+        super().__setattr__(name, value)
+
+    def cursor(self):
+        return contextlib.nullcontext(type("Cursor", (), {"execute": lambda self, query: None})())
+
+
+class ClosedConnection(FakeConnection):
+    closed = 1
+
+
+class FakePool:
+    closed = False
+
+    def __init__(self):
+        self.pending = []
+        self.discarded = []
+
+    def getconn(self):
+        return self.pending.pop(0) if self.pending else FakeConnection()
+
+    def putconn(self, conn, close=False):
+        if close:
+            self.discarded.append(conn)
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    fake = FakePool()
+    monkeypatch.setattr(DBClient, "_connect_pool", classmethod(lambda cls: fake))
+    monkeypatch.setattr(DBClient, "_checkouts", 0)
+    monkeypatch.setattr(DBClient, "_returns", 0)
+    monkeypatch.setattr("db.time.sleep", lambda seconds: None)
+    return fake
+
+
+def test_every_checkout_is_returned(pool):
+    assert DBClient._execute(lambda conn: "ok") == "ok"
+    with pytest.raises(ZeroDivisionError):
+        DBClient._execute(lambda conn: 1 / 0)
+    assert DBClient.pool_stats() == {"in_use": 0, "checkouts": 2, "returns": 2, "max": POSTGRES_POOL_MAX}
+
+
+def test_broken_connections_are_returned_before_retrying(pool):
+    attempts = []
+
+    def flaky(conn):
+        attempts.append(conn)
+        if len(attempts) == 1:
+            raise psycopg2.OperationalError("server closed the connection")
+        return "ok"
+
+    assert DBClient._execute(flaky) == "ok"
+    stats = DBClient.pool_stats()
+    assert (stats["in_use"], stats["checkouts"], stats["returns"]) == (0, 2, 2)
+
+
+def test_in_use_counts_open_checkouts(pool):
+    seen = []
+    DBClient._execute(lambda conn: seen.append(DBClient.pool_stats()["in_use"]))
+    assert seen == [1]
+
+
+def test_closed_connections_are_replaced(pool):
+    closed = ClosedConnection()
+    pool.pending = [closed]
+    used = []
+    assert DBClient._execute(lambda conn: used.append(conn) or "ok") == "ok"
+    assert pool.discarded == [closed]
+    assert used[0] is not closed and used[0].autocommit is True
+    assert DBClient.pool_stats()["in_use"] == 0
+
+
+def test_closed_replacements_are_retried_not_used(pool):
+    pool.pending = [ClosedConnection() for _ in range(4)]
+    assert DBClient._execute(lambda conn: conn) not in pool.discarded
+    assert len(pool.discarded) == 4
+    assert DBClient.pool_stats()["in_use"] == 0
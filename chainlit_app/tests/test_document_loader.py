@@ -0,0 +1,52 @@
+import json
+import pyarrow as pa
+import pyarrow.parquet as pq
+from rag.document_loader import DocumentLoader
+
+
+def _write_jsonl(path, records):
+    path.write_text("".join(json.dumps(record) + "\n" for record in records), encoding="utf-8")
+
+
+def test_parsed_sections_become_collection_properties(tmp_path):
+    loader = DocumentLoader(str(tmp_path), checkpoint_path=None)
+    document = loader.preprocess_document({
+        "image_url": "https://example.com/a.png",
+        "post_title": None,
+        "Section_19_Description": "A map of Europe",
+        "Section_8_Grid_Arrangement": "single panel",
+        "Section_9_Layout__Legend_position": "right",
+        "Section_5_Theme__Background_type": " Dark ",
+    })
+    properties = document["properties"]
+    assert properties["section_11_description"] == "A map of Europe"
+    assert properties["section_5_layout_details"] == "single panel\nLegend position: right"
+    assert properties["background_type"] == "dark"
+    assert "post_title" not in properties and not any(key.startswith("Section_") for key in properties)
+    # The UUID follows the image, so re-ingesting a chart updates it in place
+    assert loader.preprocess_document({"image_url": "https://example.com/a.png"})["uuid"] == document["uuid"]
+
+
+def test_committed_documents_are_skipped_on_the_next_run(tmp_path):
+    data = tmp_path / "data"
+    data.mkdir()
+    _write_jsonl(data / "a.jsonl", [{"image_url": f"a{i}", "post_title": f"a{i}"} for i in range(3)])
+    pq.write_table(
+        pa.Table.from_pylist([{"image_url": f"b{i}", "post_title": f"b{i}"} for i in range(4)]),
+        data / "b.parquet", row_group_size=2
+    )
+    checkpoint = str(tmp_path / "ingest" / "checkpoint.json")
+
+    stream = DocumentLoader(str(data), checkpoint).load_documents()
+    documents = list(stream)
+    assert [d["properties"]["post_title"] for d in documents] == ["a0", "a1", "a2", "b0", "b1", "b2", "b3"]
+    stream.commit(documents[:4], failed=[documents[1]])
+
+    resumed = [d["properties"]["post_title"] for d in DocumentLoader(str(data), checkpoint).load_documents()]
+    assert resumed == ["b1", "b2", "b3"]
+    with open(tmp_path / "ingest" / "checkpoint.failed.jsonl") as f:
+        assert [json.loads(line)["post_title"] for line in f] == ["a1"]
+
+    loader = DocumentLoader(str(data), checkpoint)
+    loader.reset_checkpoint()
+    assert len(list(loader.load_documents())) == 7
@@ -0,0 +1,96 @@
+import threading
+import pytest
+from modules.facet_stats import FacetStats
+
+CHARTS = {
+    "a": {"background_type": "dark", "palette_type": "sequential"},
+    "b": {"background_type": "dark", "palette_type": "diverging"},
+    "c": {"background_type": "light", "palette_type": "sequential"},
+}
+
+
+@pytest.fixture
+def stats():
+    stats = FacetStats(["background_type", "palette_type"])
+    stats.sync(CHARTS.items(), version=1)
+    return stats
+
+
+class FakeStore:
+    def __init__(self, charts, version):
+        self.charts, self._version = charts, version
+
+    def version(self):
+        return self._version
+
+    def rows(self, columns):
+        return [(uuid, *(props.get(c) for c in columns)) for uuid, props in self.charts.items()]
+
+
+def test_counts_are_case_insensitive(stats):
+    assert stats.count("background_type", "Dark ") == 2
+    assert stats.pair_count(("palette_type", "sequential"), ("background_type", "light")) == 1
+    assert stats.pair_count(("background_type", "light"), ("palette_type", "diverging")) == 0
+    assert stats.pair_count(("background_type", "dark"), ("background_type", "light")) == 0
+    assert stats.estimate([("background_type", "dark"), ("palette_type", "sequential")]) == 1
+
+
+def test_update_and_remove_apply_deltas(stats):
+    stats.update("c", {"background_type": "dark", "palette_type": "sequential"})
+    assert stats.count("background_type", "light") == 0
+    assert stats.count("background_type", "dark") == 3
+    stats.remove("a")
+    assert stats.total == 2
+    assert stats.pair_count(("background_type", "dark"), ("palette_type", "sequential")) == 1
+
+
+def test_sync_reports_only_changes(stats):
+    charts = dict(CHARTS, c={"background_type": "dark", "palette_type": "sequential"})
+    del charts["b"]
+    assert stats.sync(charts.items(), version=2) == 2
+    assert stats.total == 2 and stats.version == 2
+
+
+def test_sync_waits_for_concurrent_updates(stats):
+    with stats._lock:  # an update in progress
+        worker = threading.Thread(target=stats.sync, args=([],), kwargs={"version": 2})
+        worker.start()
+        worker.join(timeout=0.1)
+        assert worker.is_alive() and stats.total == 3
+    worker.join()
+    assert stats.total == 0 and stats.version == 2
+
+
+def test_refresh_from_store_skips_unchanged_versions(stats):
+    assert stats.refresh_from_store(FakeStore(CHARTS, version=1)) == 0
+    store = FakeStore({"d": {"background_type": "light", "palette_type": "qualitative"}}, version=2)
+    assert stats.is_stale(store)
+    stats.refresh_from_store(store)
+    assert stats.total == 1 and stats.count("palette_type", "qualitative") == 1
+
+
+def test_prune_drops_unknown_values(stats):
+    kept, dropped = stats.prune([("background_type", "dark", 0.9), ("palette_type", "monochrome", 0.8)])
+    assert kept == [("background_type", "dark", 0.9)]
+    assert [hit[:3] for hit in dropped] == [("palette_type", "monochrome", 0.8)]
+
+
+def test_prune_drops_the_less_confident_side_of_a_conflict(stats):
+    kept, dropped = stats.prune([("background_type", "light", 0.6), ("palette_type", "diverging", 0.9)])
+    assert kept == [("palette_type", "diverging", 0.9)]
+    assert dropped[0][:3] == ("background_type", "light", 0.6)
+
+
+def test_prune_drops_the_filter_with_most_conflicts_first(stats):
+    filters = [("background_type", "light", 0.9), ("palette_type", "diverging", 0.9), ("palette_type", "sequential", 0.9)]
+    # diverging conflicts with both others; light and sequential match chart "c" together
+    kept, dropped = stats.prune(filters)
+    assert kept == [("background_type", "light", 0.9), ("palette_type", "sequential", 0.9)]
+    assert [hit[:2] for hit in dropped] == [("palette_type", "diverging")]
+
+
+def test_prune_keeps_untracked_fields_and_everything_without_stats(stats):
+    kept, dropped = stats.prune([("post_title", "anything", 0.5)])
+    assert kept == [("post_title", "anything", 0.5)] and dropped == []
+    empty = FacetStats(["background_type"])
+    assert empty.prune([("background_type", "dark", 0.9)]) == ([("background_type", "dark", 0.9)], [])
@@ -0,0 +1,79 @@
+import json
+import uuid
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+from weaviate.classes.query import Filter
+from rag.feature_store import FeatureStore, feature_row
+from rag.local_index import LocalVectorIndex, MANIFEST_FILE, PROPERTIES_FILE, VECTORS_DIR
+
+CHARTS = [
+    {"image_url": "a.png", "background_type": "dark", "palette_type": "sequential"},
+    {"image_url": "b.png", "background_type": "light", "palette_type": "diverging"},
+    {"image_url": "c.png", "background_type": "dark", "palette_type": "diverging"},
+    {"image_url": "d.png", "background_type": "dark", "palette_type": None},
+    {"image_url": "e.png", "background_type": None, "palette_type": "qualitative"},
+]
+
+
+@pytest.fixture(scope="module")
+def snapshot(tmp_path_factory):
+    snapshot = tmp_path_factory.mktemp("snapshot")
+    (snapshot / VECTORS_DIR).mkdir()
+    with open(snapshot / MANIFEST_FILE, "w") as f:
+        json.dump({"collection": "charts", "vectors": {"v": {"dim": 2}}}, f)
+    records = [{"uuid": str(uuid.UUID(int=i + 1)), **chart} for i, chart in enumerate(CHARTS)]
+    pq.write_table(pa.Table.from_pylist(records), snapshot / PROPERTIES_FILE)
+    np.save(snapshot / VECTORS_DIR / "v.npy", np.ones((len(CHARTS), 2), dtype=np.float32))
+    return snapshot
+
+
+@pytest.fixture(scope="module")
+def store(snapshot, tmp_path_factory):
+    store = FeatureStore(str(tmp_path_factory.mktemp("store") / "features.duckdb"))
+    assert store.build_from_snapshot(str(snapshot)) == len(CHARTS)
+    yield store
+    store.close()
+
+
+def _uuids(objects):
+    return sorted(str(obj.uuid) for obj in objects)
+
+
+@pytest.mark.parametrize("filters, weaviate_filter", [
+    ({"background_type": "dark"}, Filter.by_property("background_type").equal("dark")),
+    ({"background_type": "dark", "palette_type": "diverging"},
+     Filter.by_property("background_type").equal("dark") & Filter.by_property("palette_type").equal("diverging")),
+    ({"palette_type": ["sequential", "qualitative"]},
+     Filter.by_property("palette_type").contains_any(["sequential", "qualitative"])),
+])
+def test_filter_only_queries_match_the_local_index(store, snapshot, filters, weaviate_filter):
+    index = LocalVectorIndex(str(snapshot), embedder=object())
+    expected = sorted(index.uuids[i] for i in np.flatnonzero(index.filter_mask(weaviate_filter)))
+    assert _uuids(store.query(filters)) == expected
+    assert store.count(filters) == len(expected)
+
+
+def test_values_are_case_insensitive_and_unknown_values_match_nothing(store):
+    assert store.count({"background_type": "DARK "}) == 3
+    assert store.query({"background_type": "sepia"}) == []
+    assert store.facet_counts("background_type") == {"dark": 3, "light": 1}
+    assert store.facet_values("palette_type") == ["diverging", "qualitative", "sequential"]
+
+
+def test_query_returns_requested_properties(store):
+    (obj,) = store.query({"palette_type": "qualitative"}, return_properties=["image_url", "not_a_column"])
+    assert obj.properties == {"image_url": "e.png"}
+
+
+def test_feature_row_falls_back_to_parsed_sections():
+    parsed = {
+        "Section_5_Theme__Background_type": " Light",
+        "Section_2_Data_and_Variable_Types": {"gdp": ["quantitative"], "country": ["nominal", "Not implemented"]},
+        "Section_12_Typography": {"title": {"font_family": "Lato"}, "axis": {"font_family": "Unknown"}},
+    }
+    row = feature_row(None, {"image_url": "a.png"}, parsed)
+    assert row["background_type"] == "light"
+    assert row["variable_types"] == ["nominal", "quantitative"]
+    assert row["font_families"] == ["Lato"]
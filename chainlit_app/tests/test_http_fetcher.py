@@ -0,0 +1,45 @@
+import asyncio
+import httpx
+import pytest
+from modules.http_fetcher import ImageFetcher, ImageTooLargeError, canonicalize_url
+
+PNG = b"\x89PNG\r\n\x1a\n" + b"\x00" * 64
+
+
+def _fetcher(tmp_path, handler, **kwargs):
+    fetcher = ImageFetcher(cache_dir=str(tmp_path), **kwargs)
+    fetcher._client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    return fetcher
+
+
+def test_not_modified_reuses_the_cached_body(tmp_path):
+    seen = []
+
+    def handler(request):
+        seen.append(request.headers.get("If-None-Match"))
+        if request.headers.get("If-None-Match") == '"v1"':
+            return httpx.Response(304)
+        return httpx.Response(200, content=PNG, headers={"ETag": '"v1"'})
+
+    fetcher = _fetcher(tmp_path, handler)
+    assert asyncio.run(fetcher.fetch("https://example.com/chart.png")) == PNG
+    assert asyncio.run(fetcher.fetch("https://EXAMPLE.com/chart.png#zoom")) == PNG
+    assert seen == [None, '"v1"']
+
+
+def test_responses_without_validators_are_not_cached(tmp_path):
+    fetcher = _fetcher(tmp_path, lambda request: httpx.Response(200, content=PNG))
+    asyncio.run(fetcher.fetch("https://example.com/chart.png"))
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_downloads_past_the_limit_are_aborted(tmp_path):
+    fetcher = _fetcher(tmp_path, lambda request: httpx.Response(200, content=PNG), max_bytes=16)
+    with pytest.raises(ImageTooLargeError):
+        asyncio.run(fetcher.fetch("https://example.com/chart.png"))
+
+
+def test_github_blob_links_share_the_raw_cache_key():
+    assert canonicalize_url("https://github.com/a/b/blob/main/chart.png") == canonicalize_url(
+        "https://raw.githubusercontent.com/a/b/main/chart.png"
+    )
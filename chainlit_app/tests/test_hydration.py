@@ -0,0 +1,75 @@
+import asyncio
+from types import SimpleNamespace
+from llm_utils import LLM_RERANK_PROPERTY
+from modules.local_reranker import RERANK_FIELDS
+from rag.hydration import CANDIDATE_PROPERTIES, Hydrator
+from rag.result_cache import bump_collection_version
+
+STORED = {
+    "u1": {"image_url": "1.png", "post_title": "One"},
+    "u2": {"image_url": "2.png", "post_title": "Two"},
+}
+
+
+class FakeClient:
+    def __init__(self):
+        self.calls = []
+
+    def _fetch(self, ids, return_properties):
+        self.calls.append(list(ids))
+        return SimpleNamespace(objects=[
+            SimpleNamespace(uuid=u, properties={name: STORED[u].get(name) for name in return_properties})
+            for u in ids if u in STORED
+        ])
+
+    def fetch_objects_by_ids(self, ids, collection_name=None, return_properties=None):
+        return self._fetch(ids, return_properties)
+
+
+class FakeAsyncClient(FakeClient):
+    async def fetch_objects_by_ids(self, ids, collection_name=None, return_properties=None):
+        return self._fetch(ids, return_properties)
+
+
+def candidate(uuid):
+    return SimpleNamespace(uuid=uuid, properties={"section_11_description": "..."})
+
+
+def test_candidates_carry_everything_the_rerankers_read():
+    assert set(CANDIDATE_PROPERTIES) == {LLM_RERANK_PROPERTY, *RERANK_FIELDS}
+
+
+def test_hydrate_fills_missing_properties_and_caches_them():
+    client = FakeClient()
+    hydrator = Hydrator(client, "test_hydrate", ["image_url", "post_title"], batch_size=1)
+    objects = hydrator.hydrate_sync([candidate("u1"), candidate("u2"), candidate("u1")])
+    assert [obj.properties.get("post_title") for obj in objects] == ["One", "Two", "One"]
+    assert objects[0].properties["section_11_description"] == "..."
+    assert sorted(client.calls) == [["u1"], ["u2"]]
+
+    hydrator.hydrate_sync([candidate("u2")])
+    assert len(client.calls) == 2
+
+
+def test_hydrate_skips_complete_objects():
+    client = FakeClient()
+    hydrator = Hydrator(client, "test_hydrate", ["image_url"])
+    hydrator.hydrate_sync([SimpleNamespace(uuid="u1", properties={"image_url": "cached.png"})])
+    assert client.calls == []
+
+
+def test_collection_writes_drop_cached_properties():
+    client = FakeClient()
+    hydrator = Hydrator(client, "test_hydrate_version", ["image_url"])
+    hydrator.hydrate_sync([candidate("u1")])
+    bump_collection_version("test_hydrate_version")
+    hydrator.hydrate_sync([candidate("u1")])
+    assert client.calls == [["u1"], ["u1"]]
+
+
+def test_async_hydrate_batches_concurrently():
+    client = FakeAsyncClient()
+    hydrator = Hydrator(client, "test_hydrate", ["post_title"], batch_size=1)
+    objects = asyncio.run(hydrator.hydrate([candidate("u1"), candidate("u2"), candidate("missing")]))
+    assert [obj.properties.get("post_title") for obj in objects] == ["One", "Two", None]
+    assert len(client.calls) == 3
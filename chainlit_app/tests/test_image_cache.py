@@ -0,0 +1,49 @@
+import io
+from PIL import Image, ImageDraw
+from modules.image_cache import ImageDescriptionCache, dhash, hamming
+
+PROMPT = "Describe this chart"
+
+
+def _chart(bars):
+    image = Image.new("RGB", (320, 240), "white")
+    draw = ImageDraw.Draw(image)
+    for i, height in enumerate(bars):
+        draw.rectangle([20 + i * 60, 220 - height, 60 + i * 60, 220], fill=(40, 90, 160))
+    return image
+
+
+def _reencode(image, size, quality):
+    buffer = io.BytesIO()
+    image.resize(size).save(buffer, format="JPEG", quality=quality)
+    return Image.open(io.BytesIO(buffer.getvalue()))
+
+
+def test_near_duplicate_hits_and_a_different_chart_misses(tmp_path):
+    cache = ImageDescriptionCache(str(tmp_path / "descriptions.sqlite"), max_distance=4)
+    original = _chart([50, 120, 180, 90, 140])
+    cache.set(dhash(original), PROMPT, "A bar chart with five bars")
+
+    near_duplicate = _reencode(original, (640, 480), quality=60)
+    assert hamming(dhash(original), dhash(near_duplicate)) <= 4
+    assert cache.get(dhash(near_duplicate), PROMPT) == "A bar chart with five bars"
+
+    different = _chart([180, 40, 60, 170, 20])
+    assert hamming(dhash(original), dhash(different)) > 4
+    assert cache.get(dhash(different), PROMPT) is None
+    assert cache.get(dhash(original), "Another prompt") is None
+    assert (cache.stats.hits, cache.stats.misses) == (1, 2)
+
+
+def test_descriptions_survive_a_restart_and_are_bounded(tmp_path, monkeypatch):
+    clock = iter(range(100))
+    monkeypatch.setattr("modules.image_cache.time.time", lambda: next(clock))
+    path = str(tmp_path / "descriptions.sqlite")
+    cache = ImageDescriptionCache(path, max_entries=2)
+    for phash in (0x0F, 0xF0F0, 0xFF0000):
+        cache.set(phash, PROMPT, f"chart {phash:x}")
+    assert cache.stats.evictions == 1
+
+    reopened = ImageDescriptionCache(path, max_entries=2, max_distance=0)
+    assert reopened.get(0x0F, PROMPT) is None  # least recently used, evicted
+    assert reopened.get(0xFF0000, PROMPT) == "chart ff0000"
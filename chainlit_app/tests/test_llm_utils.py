@@ -0,0 +1,81 @@
+import asyncio
+from types import SimpleNamespace
+from llm_utils import (
+    normalize_query, query_rewrite_cache_key, make_windows, _parse_ranking, merge_window_rankings, llm_rerank_results
+)
+
+
+def test_normalize_query_ignores_case_punctuation_and_spacing():
+    assert normalize_query("  Scatter plot,  DARK background!") == "scatter plot dark background"
+
+
+def test_rewrite_cache_key_shares_trivial_variants():
+    assert query_rewrite_cache_key("Scatter plot!") == query_rewrite_cache_key("scatter   plot")
+
+
+def test_rewrite_cache_key_depends_on_history():
+    history = [{"role": "user", "content": "bar charts"}, {"role": "assistant", "content": "Here you go"}]
+    assert query_rewrite_cache_key("with a dark background", history) != query_rewrite_cache_key("with a dark background")
+
+
+def test_make_windows_overlap_and_reach_the_end():
+    windows = make_windows(10, window_size=4, overlap=1)
+    assert windows == [[0, 1, 2, 3], [3, 4, 5, 6], [6, 7, 8, 9]]
+    assert make_windows(11, window_size=4, overlap=1)[-1] == [7, 8, 9, 10]
+    assert make_windows(3, window_size=4, overlap=1) == [[0, 1, 2]]
+
+
+def test_parse_ranking_drops_invalid_and_repeated_ids():
+    assert _parse_ranking('```json\n[2, 0, 2, 7, "x", 1]\n```', n_items=3) == [2, 0, 1]
+    assert _parse_ranking("Most relevant: [1, 0]", n_items=2) == [1, 0]
+
+
+def test_merge_window_rankings_orders_by_mean_reciprocal_rank():
+    windows = [[0, 1, 2], [2, 3, 4]]
+    rankings = [[1, 2], [3, 2]]
+    # 1 and 3 lead their windows, 2 is second in both
+    assert merge_window_rankings(windows, rankings, k=0) == [1, 3, 2]
+
+
+def test_merge_window_rankings_does_not_favour_overlaps():
+    windows = [[0, 1], [1, 2]]
+    # 1 ranks first in one window and is judged irrelevant in the other
+    assert merge_window_rankings(windows, [[1], [2]], k=0) == [2, 1]
+
+
+def test_merge_window_rankings_breaks_ties_by_retrieval_order_and_skips_unselected():
+    windows = [[0, 1, 2], [3, 4, 5]]
+    assert merge_window_rankings(windows, [[2], [3]], k=0) == [2, 3]
+
+
+class FakeCompletions:
+    """Answers with a fixed ranking, failing any window that contains ``fail_on``."""
+
+    def __init__(self, fail_on):
+        self.fail_on = fail_on
+
+    async def create(self, messages, **kwargs):
+        if self.fail_on in messages[0]["content"]:
+            raise TimeoutError("window timed out")
+        message = SimpleNamespace(content="[1, 0]")
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)], usage=None)
+
+
+def _candidate(text, distance):
+    properties = {"section_11_description": text, "image_description": text, "section_9_searchable_keywords": ""}
+    return SimpleNamespace(properties=properties, metadata=SimpleNamespace(distance=distance))
+
+
+def test_failed_window_falls_back_to_its_distance_filtered_candidates():
+    client = SimpleNamespace(chat=SimpleNamespace(completions=FakeCompletions(fail_on="pie")))
+    objects = [_candidate("bar", 0.2), _candidate("line", 0.3), _candidate("pie", 0.1), _candidate("map", 0.9)]
+    ranked = asyncio.run(llm_rerank_results(client, "chart", objects, window_size=2, window_overlap=0))
+    assert objects[3] not in ranked  # too far from the query for relevance_threshold=0.5
+    assert {id(obj) for obj in ranked} == {id(obj) for obj in objects[:3]}
+    assert ranked.index(objects[1]) < ranked.index(objects[0])
+
+
+def test_all_windows_failing_still_applies_the_relevance_threshold():
+    client = SimpleNamespace(chat=SimpleNamespace(completions=FakeCompletions(fail_on="")))
+    objects = [_candidate("bar", 0.2), _candidate("map", 0.9)]
+    assert asyncio.run(llm_rerank_results(client, "chart", objects, window_size=1, window_overlap=0)) == [objects[0]]
@@ -0,0 +1,78 @@
+import json
+import uuid
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+from weaviate.classes.query import Filter
+from rag.local_index import LocalVectorIndex, MANIFEST_FILE, PROPERTIES_FILE, VECTORS_DIR
+
+CHARTS = [
+    {"background_type": "dark", "palette_type": "sequential", "year": 2019, "keywords": ["map", "europe"]},
+    {"background_type": "light", "palette_type": "diverging", "year": 2021, "keywords": ["bar", "europe"]},
+    {"background_type": "dark", "palette_type": "diverging", "year": 2023, "keywords": ["scatter"]},
+    {"background_type": None, "palette_type": "qualitative", "year": 2024, "keywords": []},
+]
+UUIDS = [str(uuid.UUID(int=i + 1)) for i in range(len(CHARTS))]
+
+
+@pytest.fixture(scope="module")
+def index(tmp_path_factory):
+    snapshot = tmp_path_factory.mktemp("snapshot")
+    (snapshot / VECTORS_DIR).mkdir()
+    with open(snapshot / MANIFEST_FILE, "w") as f:
+        json.dump({"collection": "charts", "vectors": {"v": 2}}, f)
+    pq.write_table(pa.Table.from_pylist([{"uuid": u, **chart} for u, chart in zip(UUIDS, CHARTS)]), snapshot / PROPERTIES_FILE)
+    np.save(snapshot / VECTORS_DIR / "v.npy", np.array([[1, 0], [0.9, 0.1], [0, 1], [-1, 0]], dtype=np.float32))
+    return LocalVectorIndex(str(snapshot), embedder=object())
+
+
+def rows(mask):
+    return [int(i) for i in np.flatnonzero(mask)]
+
+
+def test_no_filter_is_no_mask(index):
+    assert index.filter_mask(None) is None
+
+
+def test_equal_and_not_equal(index):
+    assert rows(index.filter_mask(Filter.by_property("background_type").equal("dark"))) == [0, 2]
+    assert rows(index.filter_mask(Filter.by_property("background_type").not_equal("dark"))) == [1, 3]
+
+
+def test_list_properties(index):
+    assert rows(index.filter_mask(Filter.by_property("keywords").equal("europe"))) == [0, 1]
+    assert rows(index.filter_mask(Filter.by_property("keywords").contains_any(["map", "scatter"]))) == [0, 2]
+    assert rows(index.filter_mask(Filter.by_property("keywords").contains_all(["bar", "europe"]))) == [1]
+    assert rows(index.filter_mask(Filter.by_property("keywords").contains_none(["europe"]))) == [2, 3]
+
+
+def test_ranges_skip_missing_values(index):
+    assert rows(index.filter_mask(Filter.by_property("year").greater_or_equal(2021))) == [1, 2, 3]
+    assert rows(index.filter_mask(Filter.by_property("year").less_than(2021))) == [0]
+    assert rows(index.filter_mask(Filter.by_property("background_type").is_none(True))) == [3]
+
+
+def test_like_is_case_insensitive(index):
+    assert rows(index.filter_mask(Filter.by_property("palette_type").like("DIV*"))) == [1, 2]
+
+
+def test_boolean_combinations(index):
+    dark = Filter.by_property("background_type").equal("dark")
+    diverging = Filter.by_property("palette_type").equal("diverging")
+    assert rows(index.filter_mask(dark & diverging)) == [2]
+    assert rows(index.filter_mask(dark | diverging)) == [0, 1, 2]
+    assert rows(index.filter_mask(Filter.not_(dark))) == [1, 3]
+
+
+def test_filter_by_id(index):
+    assert rows(index.filter_mask(Filter.by_id().contains_any([UUIDS[3], UUIDS[1]]))) == [1, 3]
+
+
+def test_filtered_vector_search(index):
+    response = index.query_near_vector(
+        [1.0, 0.0], target_vector="v", limit=2,
+        filters=Filter.by_property("background_type").equal("dark"), return_properties=["year"]
+    )
+    assert [obj.properties["year"] for obj in response.objects] == [2019, 2023]
+    assert response.objects[0].metadata.distance == pytest.approx(0.0, abs=1e-6)
@@ -0,0 +1,36 @@
+from types import SimpleNamespace
+import numpy as np
+from modules.local_reranker import tokenize, bm25_scores, local_rerank, KEYWORDS_PROPERTY
+
+
+def _result(description, distance, keywords=""):
+    properties = {"section_11_description": description, "image_description": "", KEYWORDS_PROPERTY: keywords}
+    return SimpleNamespace(properties=properties, metadata=SimpleNamespace(distance=distance, score=None))
+
+
+def test_tokenize_drops_stopwords_and_keeps_compounds():
+    assert tokenize("Show a Scatter-plot of the GDP per_capita") == ["scatter-plot", "gdp", "per_capita"]
+    assert tokenize(["Dark", "background"]) == ["dark", "background"]
+
+
+def test_bm25_prefers_documents_with_rarer_terms():
+    scores = bm25_scores(["violin", "bar"], [["bar", "bar"], ["violin", "bar"], ["line"]])
+    assert scores[1] > scores[0] > scores[2] == 0
+    assert np.array_equal(bm25_scores([], [["a"]]), np.zeros(1))
+
+
+def test_text_match_outranks_a_slightly_closer_vector_hit():
+    results = [
+        _result("line chart of temperature", 0.20),
+        _result("stacked area chart", 0.25, keywords=["choropleth", "map"]),
+        _result("pie chart of market share", 0.22),
+    ]
+    ranked = local_rerank("choropleth map", results)
+    assert ranked[0] is results[1]
+    assert ranked[1:] == [results[0], results[2]]  # no text match: vector similarity decides
+
+
+def test_ties_keep_retrieval_order():
+    results = [_result("bar chart", None), _result("bar chart", None)]
+    assert local_rerank("violin", results) == results
+    assert local_rerank("violin", []) == []
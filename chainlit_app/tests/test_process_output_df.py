@@ -0,0 +1,72 @@
+import re
+import json
+import pyarrow as pa
+from process_image_output.process_output_df import (
+    SAMPLE_OUTPUT, parse_llm_visualization_output, records_to_table, stream_outputs_to_parquet, open_parsed_dataset
+)
+
+
+def inline_headers(text):
+    """The older layout: a %%% line, then the header as the first line of its chunk."""
+    return re.sub(r"%%% (Section_\w+) %%%\n", r"%%%\n\1\n", text)
+
+
+def test_header_only_chunk_takes_the_following_body():
+    parsed = parse_llm_visualization_output(
+        "%%% Section_5_Theme %%%\nBackground type: dark * Grids: dashed\n"
+        "%%% Section_16_Data_Source %%%\nOur World in Data\n"
+    )
+    assert parsed == {
+        "Section_5_Theme__Background_type": "dark",
+        "Section_5_Theme__Grids": "dashed",
+        "Section_16_Data_Source": ["Our World in Data"],
+    }
+
+
+def test_both_layouts_parse_the_same():
+    parsed = parse_llm_visualization_output(SAMPLE_OUTPUT)
+    assert parse_llm_visualization_output(inline_headers(SAMPLE_OUTPUT)) == parsed
+    assert parsed["Section_5_Theme__Background_type"] == "light"
+    assert parsed["Section_4_Color_Encoding__Palette_type"] == "Sequential"
+
+
+def test_header_without_body_is_not_implemented():
+    parsed = parse_llm_visualization_output("%%% Section_13_Statistical_Analytical_Methods_Used %%%\n%%% Section_16_Data_Source %%%\nNASA\n")
+    assert parsed["Section_13_Statistical_Analytical_Methods_Used__extra"] == "Not implemented"
+    assert parsed["Section_16_Data_Source"] == ["NASA"]
+
+
+def test_structured_sections():
+    parsed = parse_llm_visualization_output(SAMPLE_OUTPUT)
+    assert parsed["Section_1_Plot_Type__Primary_Category"] == "Spatial & Geospatial"
+    assert parsed["Section_1_Plot_Type__unknown"] == "Annotated map"
+    assert parsed["Section_2_Data_and_Variable_Types"]["City location"] == ["Geolocation"]
+    assert parsed["Section_3_Variable_Mapping"]["Population size"] == "circle area"
+    assert parsed["Section_12_Typography"]["Title"] == {
+        "font_family": "Unknown", "font_type": "Sans-serif", "font_size": "Large", "alignment": "center", "style": "bold"
+    }
+    assert parsed["Section_17_Searchable_Keywords"][:2] == ["methamphetamine", "wastewater analysis"]
+
+
+def test_keywords_without_asterisks_split_on_commas():
+    parsed = parse_llm_visualization_output("%%% Section_17_Searchable_Keywords %%%\nmap, europe; drugs@health\n")
+    assert parsed["Section_17_Searchable_Keywords"] == ["map", "europe", "drugs", "health"]
+
+
+def test_records_to_table_types_nested_sections():
+    table = records_to_table([parse_llm_visualization_output(SAMPLE_OUTPUT), {"image_url": "x.png"}])
+    assert table.schema.field("Section_2_Data_and_Variable_Types").type == pa.map_(pa.string(), pa.list_(pa.string()))
+    assert table.schema.field("Section_17_Searchable_Keywords").type == pa.list_(pa.string())
+    assert table.column("image_url").to_pylist() == [None, "x.png"]
+
+
+def test_stream_outputs_to_parquet_in_process(tmp_path):
+    journal = tmp_path / "annotations.jsonl"
+    with open(journal, "w", encoding="utf-8") as f:
+        for i in range(5):
+            f.write(json.dumps({"image_url": f"{i}.png", "status": "ok", "output": SAMPLE_OUTPUT}) + "\n")
+        f.write(json.dumps({"image_url": "failed.png", "status": "error"}) + "\n")
+    stream_outputs_to_parquet(str(journal), str(tmp_path / "parsed"), chunk_size=2, workers=0)
+    table = open_parsed_dataset(str(tmp_path / "parsed")).to_table()
+    assert sorted(table.column("image_url").to_pylist()) == ["0.png", "1.png", "2.png", "3.png", "4.png"]
+    assert table.column("Section_5_Theme__Background_type").to_pylist() == ["light"] * 5
@@ -0,0 +1,25 @@
+from types import SimpleNamespace
+from modules.rank_fusion import reciprocal_rank_fusion, object_uuid
+
+
+def test_items_found_by_several_searches_rank_first():
+    fused = reciprocal_rank_fusion([["a", "b", "c"], ["c", "d"]], k=60)
+    assert fused[0] == "c"
+    assert sorted(fused) == ["a", "b", "c", "d"]
+
+
+def test_ties_keep_first_appearance_order():
+    assert reciprocal_rank_fusion([["a", "b"], ["c", "d"]]) == ["a", "c", "b", "d"]
+
+
+def test_weights_scale_each_ranking():
+    assert reciprocal_rank_fusion([["a"], ["b"]], weights=[1.0, 2.0]) == ["b", "a"]
+
+
+def test_objects_are_deduplicated_by_uuid_keeping_the_first():
+    first = SimpleNamespace(uuid="u1", properties={"rank": 1})
+    duplicate = SimpleNamespace(uuid="u1", properties={"rank": 2})
+    other = SimpleNamespace(uuid="u2", properties={})
+    fused = reciprocal_rank_fusion([[first, other], [duplicate]], key=object_uuid)
+    assert fused == [first, other]
+    assert fused[0] is first
@@ -0,0 +1,88 @@
+import uuid
+from types import SimpleNamespace
+from weaviate.classes.query import Filter, MetadataQuery
+from rag.result_cache import ResultCache, canonical_filters, bump_collection_version, collection_version
+
+dark = Filter.by_property("background_type").equal("dark")
+sequential = Filter.by_property("palette_type").equal("sequential")
+europe = Filter.by_property("keywords").contains_any(["map", "europe"])
+europe_reordered = Filter.by_property("keywords").contains_any(["europe", "map"])
+
+
+def response(*titles):
+    return SimpleNamespace(objects=[
+        SimpleNamespace(uuid=uuid.uuid4(), properties={"post_title": title}, metadata=None) for title in titles
+    ])
+
+
+def test_operand_order_does_not_matter():
+    assert canonical_filters(Filter.all_of([dark, sequential])) == canonical_filters(Filter.all_of([sequential, dark]))
+    assert canonical_filters(dark | sequential) == canonical_filters(sequential | dark)
+
+
+def test_nested_conjunctions_are_flattened():
+    assert canonical_filters((dark & sequential) & europe) == canonical_filters(dark & (europe & sequential))
+
+
+def test_set_values_are_unordered():
+    assert canonical_filters(europe) == canonical_filters(europe_reordered)
+
+
+def test_different_filters_stay_different():
+    assert canonical_filters(dark & sequential) != canonical_filters(dark | sequential)
+    assert canonical_filters(Filter.not_(dark)) != canonical_filters(dark)
+    assert canonical_filters(dark) != canonical_filters(Filter.by_property("background_type").equal("light"))
+    assert canonical_filters(Filter.by_property("year").equal(2020)) != canonical_filters(Filter.by_property("year").equal("2020"))
+    assert canonical_filters(None) is None
+
+
+def test_key_covers_every_query_argument():
+    base = dict(query="scatter", limit=10, target_vector="v", filters=dark & europe,
+                return_properties=["a", "b"], return_metadata=MetadataQuery(distance=True))
+    key = ResultCache.key("near_text", "charts", **base)
+    assert key == ResultCache.key("near_text", "charts", **dict(base, filters=europe_reordered & dark, return_properties=["b", "a"]))
+    for changed in (dict(query="bar"), dict(limit=20), dict(target_vector="w"), dict(filters=dark),
+                    dict(return_properties=["a"]), dict(return_metadata=MetadataQuery(score=True))):
+        assert ResultCache.key("near_text", "charts", **dict(base, **changed)) != key
+    assert ResultCache.key("hybrid", "charts", **base) != key
+    assert ResultCache.key("near_text", "other", **base) != key
+
+
+def test_hits_are_copies():
+    cache = ResultCache()
+    cache.set("test_copies", "k", response("One"))
+    hit = cache.get("test_copies", "k")
+    hit.objects[0].properties["image_url"] = "added.png"
+    hit.objects.pop()
+    again = cache.get("test_copies", "k")
+    assert again.objects[0].properties == {"post_title": "One"}
+
+
+def test_collection_writes_invalidate():
+    cache = ResultCache()
+    cache.get("test_invalidate", "k")
+    cache.set("test_invalidate", "k", response("One"))
+    assert cache.get("test_invalidate", "k") is not None
+    token = bump_collection_version("test_invalidate")
+    assert collection_version("test_invalidate") == token
+    assert cache.get("test_invalidate", "k") is None
+    assert cache.metrics()["invalidations"] == 1
+
+
+def test_responses_racing_a_write_are_not_cached():
+    cache = ResultCache()
+    assert cache.get("test_race", "k") is None
+    bump_collection_version("test_race")  # lands while the query runs
+    cache.set("test_race", "k", response("Stale"))
+    assert cache.get("test_race", "k") is None
+
+
+def test_lru_bound_and_metrics():
+    cache = ResultCache(maxsize=1)
+    cache.get("test_lru", "a")
+    cache.set("test_lru", "a", response("A"))
+    cache.set("test_lru", "b", response("B"))
+    assert cache.get("test_lru", "a") is None
+    assert cache.get("test_lru", "b").objects[0].properties["post_title"] == "B"
+    metrics = cache.metrics()
+    assert (metrics["hits"], metrics["evictions"], metrics["entries"]) == (1, 1, 1)
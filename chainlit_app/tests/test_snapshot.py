@@ -0,0 +1,74 @@
+import datetime
+from types import SimpleNamespace
+import numpy as np
+import pyarrow.parquet as pq
+from rag.local_index import LocalVectorIndex, PROPERTIES_FILE, VECTORS_DIR
+from rag.snapshot import export_snapshot
+
+
+def _chart(n, title, updated):
+    return SimpleNamespace(
+        uuid=f"00000000-0000-0000-0000-{n:012d}",
+        properties={"post_title": title},
+        vector={"v": [float(n), 1.0]},
+        metadata=SimpleNamespace(last_update_time=datetime.datetime.fromtimestamp(updated, datetime.timezone.utc)),
+    )
+
+
+class FakeCollection:
+    """WeaviateClient stand-in that records which objects were fetched with their vectors."""
+
+    def __init__(self, objects):
+        self.objects = {obj.uuid: obj for obj in objects}
+        self.fetched = []
+
+    def iterate_objects(self, collection_name, include_vector=False, return_properties=None, **kwargs):
+        for obj in self.objects.values():
+            if include_vector:
+                self.fetched.append(obj.uuid)
+            yield obj
+
+    def fetch_objects_by_ids(self, ids, collection_name, include_vector=False, **kwargs):
+        self.fetched.extend(ids)
+        return SimpleNamespace(objects=[self.objects[i] for i in ids])
+
+
+def _exported(out_dir):
+    titles = dict(zip(*pq.read_table(out_dir / PROPERTIES_FILE).to_pydict().values()))
+    vectors = np.load(out_dir / VECTORS_DIR / "v.npy")
+    return titles, vectors
+
+
+def test_full_export_spills_chunks_into_one_snapshot(tmp_path):
+    client = FakeCollection([_chart(n, f"chart {n}", updated=1000 + n) for n in range(1, 6)])
+    manifest = export_snapshot(client, tmp_path / "index", collection_name="charts", chunk_size=2)
+    assert manifest["count"] == 5 and manifest["vectors"] == {"v": {"dim": 2}}
+    titles, vectors = _exported(tmp_path / "index")
+    assert list(titles.values()) == [f"chart {n}" for n in range(1, 6)]
+    assert vectors[:, 0].tolist() == [1, 2, 3, 4, 5]
+    assert len(LocalVectorIndex(str(tmp_path / "index"), embedder=object()).uuids) == 5
+    assert not (tmp_path / "index.staging").exists()
+
+
+def test_incremental_export_refetches_only_changed_objects(tmp_path):
+    charts = [_chart(n, f"chart {n}", updated=1000 + n) for n in range(1, 5)]
+    client = FakeCollection(charts)
+    export_snapshot(client, tmp_path / "index", collection_name="charts", chunk_size=2)
+
+    client.objects.pop(charts[0].uuid)  # deleted
+    changed = _chart(2, "chart 2, revised", updated=2000)
+    added = _chart(9, "chart 9", updated=2001)
+    client.objects[changed.uuid] = changed
+    client.objects[added.uuid] = added
+    client.fetched = []
+
+    manifest = export_snapshot(client, tmp_path / "index", collection_name="charts", chunk_size=2, incremental=True)
+    assert sorted(client.fetched) == sorted([changed.uuid, added.uuid])
+    titles, vectors = _exported(tmp_path / "index")
+    assert sorted(titles.values()) == ["chart 2, revised", "chart 3", "chart 4", "chart 9"]
+    assert sorted(vectors[:, 0].tolist()) == [2, 3, 4, 9]
+    assert manifest["count"] == 4 and manifest["last_update_time"] == 2001 * 1000
+
+    client.fetched = []
+    assert export_snapshot(client, tmp_path / "index", collection_name="charts", incremental=True) == manifest
+    assert client.fetched == []
@@ -0,0 +1,67 @@
+import asyncio
+from types import SimpleNamespace
+from modules.speculation import speculative_retrieve, query_similarity
+
+
+class FakeRetriever:
+    """Returns one object per query; queries listed in ``slow`` wait until they are cancelled."""
+
+    def __init__(self, slow=()):
+        self.slow = set(slow)
+        self.queries = []
+        self.cancelled = []
+
+    async def retrieve(self, query, limit=10, filters=None):
+        self.queries.append(query)
+        try:
+            if query in self.slow:
+                await asyncio.sleep(3600)
+            else:
+                await asyncio.sleep(0)
+        except asyncio.CancelledError:
+            self.cancelled.append(query)
+            raise
+        return SimpleNamespace(objects=[SimpleNamespace(uuid=f"{query}:{i}") for i in range(2)])
+
+
+async def _rewrite(text):
+    await asyncio.sleep(0.01)
+    return text
+
+
+def _uuids(objects):
+    return [obj.uuid for obj in objects]
+
+
+def test_similarity_ignores_stopwords_and_case():
+    assert query_similarity("Show me a scatter plot", "scatter") == 1.0
+    assert query_similarity("dark bar chart", "light bar chart") == 1 / 3
+
+
+def test_equivalent_rewrite_reuses_the_speculative_result():
+    retriever = FakeRetriever()
+    seen = []
+
+    async def on_rewrite(rewritten):
+        seen.append(rewritten)
+
+    rewritten, objects = asyncio.run(speculative_retrieve(
+        retriever, "Scatter plot", _rewrite("a scatter chart"), on_rewrite=on_rewrite, threshold=0.6
+    ))
+    assert (rewritten, seen) == ("a scatter chart", ["a scatter chart"])
+    assert retriever.queries == ["Scatter plot"]
+    assert _uuids(objects) == ["Scatter plot:0", "Scatter plot:1"]
+
+
+def test_different_rewrite_discards_a_speculative_search_still_running():
+    retriever = FakeRetriever(slow={"maps"})
+    rewritten, objects = asyncio.run(speculative_retrieve(retriever, "maps", _rewrite("choropleth of europe")))
+    assert retriever.queries == ["maps", "choropleth of europe"]
+    assert retriever.cancelled == ["maps"]
+    assert _uuids(objects) == ["choropleth of europe:0", "choropleth of europe:1"]
+
+
+def test_different_rewrite_fuses_a_finished_speculative_result_below_it():
+    retriever = FakeRetriever()
+    _, objects = asyncio.run(speculative_retrieve(retriever, "maps", _rewrite("choropleth of europe"), limit=3))
+    assert _uuids(objects) == ["choropleth of europe:0", "choropleth of europe:1", "maps:0"]
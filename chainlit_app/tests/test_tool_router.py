@@ -0,0 +1,59 @@
+import pytest
+from modules.tool_router import KeywordAutomaton, ToolRouter, FILTER_CONFIDENCE, normalize_tokens
+
+FIELD_TOOLS = {
+    "plot_type": {"type": "vector", "keywords": ["scatter plot", "histogram"]},
+    "statistical_methods": {"type": "vector", "keywords": ["regression", "correlation"]},
+    "background_type": {"type": "filter"},
+    "palette_type": {"type": "filter"},
+}
+
+
+@pytest.fixture(scope="module")
+def router():
+    return ToolRouter(FIELD_TOOLS, extra_keywords={})
+
+
+def test_automaton_finds_overlapping_keywords():
+    automaton = KeywordAutomaton()
+    automaton.add(("grid", "line"), "grid line")
+    automaton.add(("line",), "line")
+    automaton.add(("line", "chart"), "line chart")
+    automaton.build()
+    found = sorted(automaton.search(["dashed", "grid", "line", "chart"]))
+    assert found == [(1, 3, "grid line"), (2, 3, "line"), (2, 4, "line chart")]
+
+
+def test_normalize_tokens_strips_plurals():
+    assert normalize_tokens("Scatter Plots, glass") == ["scatter", "plot", "glass"]
+
+
+def test_unambiguous_filter_value(router):
+    route = router.route("qualitative colors")
+    assert route.hits == [("palette_type", "qualitative", FILTER_CONFIDENCE)]
+
+
+def test_ambiguous_value_needs_a_cue(router):
+    assert router.route("dark background").hits == [("background_type", "dark", FILTER_CONFIDENCE)]
+    assert router.route("dark").hits == []
+
+
+def test_filter_words_are_not_sent_to_vector_search(router):
+    route = router.route("scatter plots with a dark background")
+    assert ("background_type", "dark", FILTER_CONFIDENCE) in route.hits
+    vector_hits = [hit for hit in route.hits if hit[0] == "plot_type"]
+    assert len(vector_hits) == 1
+    assert vector_hits[0][1] == "scatter"  # "plots" is a neutral word
+    assert route.confidence > 0.5
+
+
+def test_unrelated_words_lower_the_confidence(router):
+    focused = router.route("scatter plot")
+    diluted = router.route("scatter plot of penguin beak lengths by island")
+    assert focused.hits[0][0] == diluted.hits[0][0] == "plot_type"
+    assert diluted.confidence < focused.confidence
+
+
+def test_no_keywords_no_route(router):
+    route = router.route("something pretty")
+    assert route.hits == [] and route.confidence == 0.0
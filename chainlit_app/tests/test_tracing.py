@@ -0,0 +1,42 @@
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from modules.tracing import span, increment, register_gauge, snapshot, render_prometheus, install_metrics_endpoint
+
+
+def test_spans_feed_stage_histograms_and_count_errors():
+    with span("test_stage", candidates=3) as trace:
+        trace.set_attribute("windows", 1)
+    with pytest.raises(RuntimeError):
+        with span("test_stage"):
+            raise RuntimeError("boom")
+    stats = snapshot()["stages"]["test_stage"]
+    assert (stats["count"], stats["errors"]) == (2, 1)
+    assert 0 <= stats["p50"] <= stats["p99"]
+    assert trace.attributes == {"candidates": 3, "windows": 1} and trace.duration >= 0
+
+
+def test_prometheus_text_has_stages_counters_and_gauges():
+    with span("test_render"):
+        pass
+    increment("test_events", 2)
+    register_gauge("test_pool", lambda: {"in_use": 1})
+    register_gauge("test_broken", lambda: 1 / 0)  # a failing gauge is skipped, not fatal
+    text = render_prometheus()
+    assert 'search_stage_latency_seconds_count{stage="test_render"} 1' in text
+    assert "test_events_total 2" in text
+    assert 'test_pool{stat="in_use"} 1' in text
+    assert "test_broken" not in text
+
+
+def test_metrics_route_is_served_before_the_catch_all():
+    app = FastAPI()
+
+    @app.get("/{path:path}")
+    async def frontend(path: str):
+        return {"page": path}
+
+    install_metrics_endpoint(app)
+    response = TestClient(app).get("/metrics")
+    assert response.status_code == 200
+    assert "search_stage_latency_seconds" in response.text